@@ -33,6 +33,7 @@ export interface IReport extends Document {
   searchQuery: string;
   report: IReportContent;
   createdAt: Date;
+  updatedAt: Date;
 }
 
 const KeyPlayerSchema = new Schema<IKeyPlayer>({
@@ -73,6 +74,9 @@ const ReportSchema = new Schema<IReport>({
   searchQuery: { type: String, required: true },
   report: { type: ReportContentSchema, required: true },
   createdAt: { type: Date, default: Date.now },
-});
+}, { timestamps: true });
+
+// Incremental feature extraction reads reports changed since a high-water mark
+ReportSchema.index({ updatedAt: 1 });
 
 export default mongoose.models.Report || mongoose.model<IReport>('Report', ReportSchema);
@@ -3,7 +3,7 @@ import axios from "axios";
 const RAW = process.env.KNN_URL || process.env.KNN_SERVICE_URL || process.env.NEXT_PUBLIC_KNN_URL;
 const KNN_URL = RAW ? RAW.replace(/\/+$/, "") : "";
 
-export async function fetchRecommendationsFromPython(data: { features: number[] }) {
+export async function fetchRecommendationsFromPython(data: { features: (number | string)[]; top_k?: number; min_probability?: number }) {
   if (!KNN_URL) {
     // erro claro para não voltar 500 genérico
     throw new Error("KNN_URL não configurada. Defina KNN_URL no .env do backend.");
@@ -22,3 +22,22 @@ export async function fetchRecommendationsFromPython(data: { features: number[]
     throw e;
   }
 }
+
+export async function fetchBatchRecommendationsFromPython(data: { features: (number | string)[][]; top_k?: number; min_probability?: number }) {
+  if (!KNN_URL) {
+    throw new Error("KNN_URL não configurada. Defina KNN_URL no .env do backend.");
+  }
+  // uma única chamada para N perfis (ex.: reprocessar todos após um retreino)
+  const url = `${KNN_URL}/predict/batch`;
+  try {
+    const resp = await axios.post(url, data, { timeout: 60000 });
+    return resp.data;
+  } catch (err: any) {
+    const msg = err?.code === "ECONNREFUSED"
+      ? `Não foi possível conectar ao KNN em ${url}`
+      : err?.message || "Falha ao chamar o serviço KNN";
+    const e = new Error(msg);
+    (e as any).cause = err;
+    throw e;
+  }
+}
@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+"""
+Latency benchmarks for the Enhanced KNN serving path
+Each benchmark trains a small model in a temporary directory and reports
+per-call timings, so results are comparable between commits
+"""
+
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import logging
+from typing import Callable, Dict, List
+
+import joblib
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.feature_selection import SelectKBest, f_classif
+from sklearn.preprocessing import StandardScaler
+from sklearn.ensemble import BaggingClassifier
+from sklearn.neighbors import KNeighborsClassifier
+
+from enhanced_knn import EnhancedKNNService
+from import_report import import_report
+from neighbor_index import BruteForceIndex, SharedIndexBaggingClassifier, recall_latency_report
+from prediction_cache import PredictionCache
+from ranking import rank_classes
+from runtime_model import FusedTransform
+from report_features import KEYWORD_GROUPS, extract_features_batch
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def time_per_call(fn: Callable[[], object], n_calls: int = 200, warmup: int = 10) -> Dict[str, float]:
+    """Run fn repeatedly and return latency statistics in microseconds"""
+    for _ in range(warmup):
+        fn()
+
+    timings = np.empty(n_calls)
+    for i in range(n_calls):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+
+    timings *= 1e6
+    return {
+        'mean_us': float(timings.mean()),
+        'p50_us': float(np.percentile(timings, 50)),
+        'p99_us': float(np.percentile(timings, 99))
+    }
+
+def train_benchmark_service(workdir: str, n_samples: int = 2000, n_features: int = 6) -> EnhancedKNNService:
+    """Train a service on synthetic data with its artifacts stored in workdir"""
+    X, y = make_classification(
+        n_samples=n_samples,
+        n_features=n_features,
+        n_informative=max(2, n_features // 2),
+        n_classes=4,
+        n_clusters_per_class=1,
+        random_state=42
+    )
+    service = EnhancedKNNService(
+        model_path=os.path.join(workdir, "model.joblib"),
+        scaler_path=os.path.join(workdir, "scaler.joblib"),
+        feature_selector_path=os.path.join(workdir, "selector.joblib")
+    )
+    service.train_enhanced(X, y, use_grid_search=False)
+    return service
+
+def benchmark_preprocessing_cache(n_calls: int = 200) -> Dict[str, Dict[str, float]]:
+    """
+    Compare the resident preprocessing artifacts against re-reading the
+    scaler and selector joblib files on every prediction. Both variants
+    run the same scikit-learn transform and predict_proba; the resident
+    one pays only the model file stamp check of current_bundle().
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        service = train_benchmark_service(workdir)
+        service.load_model()
+        sample = np.random.default_rng(0).normal(size=(1, 6))
+
+        def predict(scaler, feature_selector):
+            X_processed = feature_selector.transform(scaler.transform(sample))
+            return service.model.predict_proba(X_processed)
+
+        def reload_every_call():
+            return predict(joblib.load(service.scaler_path), joblib.load(service.feature_selector_path))
+
+        def resident():
+            bundle = service.current_bundle()
+            return predict(bundle.scaler, bundle.feature_selector)
+
+        results = {
+            'reload_per_call': time_per_call(reload_every_call, n_calls),
+            'resident_artifacts': time_per_call(resident, n_calls)
+        }
+
+    saved = results['reload_per_call']['mean_us'] - results['resident_artifacts']['mean_us']
+    logger.info(f"Preprocessing cache saves {saved:.1f}us per prediction")
+    return results
+
+def benchmark_prediction_cache(n_calls: int = 200) -> Dict[str, Dict[str, float]]:
+    """A repeat /predict profile: fused inference vs a prediction cache hit"""
+    with tempfile.TemporaryDirectory() as workdir:
+        service = train_benchmark_service(workdir)
+        sample = np.random.default_rng(0).normal(size=(1, 6))
+        cache = PredictionCache(max_entries=1000, ttl_seconds=300)
+
+        def cached_infer():
+            version = service.current_bundle().version
+            key = cache.key(sample)
+            result = cache.get(key, version)
+            if result is None:
+                result = service.infer(sample)
+                cache.put(key, result.model_version, result)
+            return result
+
+        return {
+            'infer': time_per_call(lambda: service.infer(sample), n_calls),
+            'cache_hit': time_per_call(cached_infer, n_calls)
+        }
+
+def benchmark_top_k(n_rows: int = 1000, n_classes: int = 300, k: int = 5, n_calls: int = 20) -> Dict[str, Dict[str, float]]:
+    """
+    Top-k recommendations for a batch and for a single row: full argsort
+    and a per-row loop vs vectorized ranking (argpartition above
+    SORT_MAX_COLUMNS classes)
+    """
+    rng = np.random.default_rng(0)
+    probabilities = rng.dirichlet(np.ones(n_classes), n_rows)
+    classes = np.array([f"niche_{i}" for i in range(n_classes)])
+
+    def argsort_loop(probabilities):
+        rows = []
+        for prob_row in probabilities:
+            rows.append([
+                {"niche": str(classes[idx]), "probability": float(prob_row[idx]), "rank": rank}
+                for rank, idx in enumerate(np.argsort(prob_row)[-k:][::-1], 1)
+            ])
+        return rows
+
+    single = probabilities[:1]
+    return {
+        'argsort_loop': time_per_call(lambda: argsort_loop(probabilities), n_calls, warmup=1),
+        'rank_classes': time_per_call(lambda: rank_classes(probabilities, classes, k), n_calls, warmup=1),
+        'argsort_loop single': time_per_call(lambda: argsort_loop(single)),
+        'rank_classes single': time_per_call(lambda: rank_classes(single, classes, k))
+    }
+
+def benchmark_fused_transform(n_features: int = 10, n_rows: int = 1000, n_calls: int = 500) -> Dict[str, Dict[str, float]]:
+    """
+    Inference preprocessing: StandardScaler.transform then
+    SelectKBest.transform vs the fused operator, allocating its output or
+    writing into a reused buffer, for k='all' and a k=5 selection
+    """
+    X, y = make_classification(n_samples=2000, n_features=n_features, random_state=42)
+    scaler = StandardScaler().fit(X)
+    rng = np.random.default_rng(0)
+    single, batch = rng.normal(size=(1, n_features)), rng.normal(size=(n_rows, n_features))
+
+    results = {}
+    for k in ['all', 5]:
+        selector = SelectKBest(score_func=f_classif, k=k).fit(scaler.transform(X), y)
+        fused = FusedTransform.from_estimators(scaler, selector)
+        for rows, label in [(single, '1 row'), (batch, f'{n_rows} rows')]:
+            buffer = np.empty((len(rows), fused.n_features_out))
+            calls = n_calls if len(rows) == 1 else n_calls // 10
+            results[f'sklearn k={k} {label}'] = time_per_call(
+                lambda: selector.transform(scaler.transform(rows)), calls
+            )
+            results[f'fused k={k} {label}'] = time_per_call(lambda: fused(rows), calls)
+            results[f'fused+buffer k={k} {label}'] = time_per_call(lambda: fused(rows, out=buffer), calls)
+    return results
+
+def benchmark_cross_validation(n_samples: int = 3000, n_features: int = 10, n_calls: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Four-metric 5-fold cross-validation: one cross_val_score per metric
+    (20 fits) vs EnhancedKNNService.cross_validate (5 fits), serial and on
+    all CPUs
+    """
+    from sklearn.model_selection import cross_val_score
+
+    metrics = ['accuracy', 'precision_macro', 'recall_macro', 'f1_macro']
+    with tempfile.TemporaryDirectory() as workdir:
+        service = train_benchmark_service(workdir, n_samples, n_features)
+        X, y = make_classification(
+            n_samples=n_samples, n_features=n_features, n_informative=n_features // 2,
+            n_classes=4, n_clusters_per_class=1, random_state=42
+        )
+
+        def per_metric():
+            return {metric: cross_val_score(service.model, X, y, cv=5, scoring=metric) for metric in metrics}
+
+        return {
+            'cross_val_score per metric': time_per_call(per_metric, n_calls, warmup=1),
+            'cross_validate n_jobs=1': time_per_call(
+                lambda: service.cross_validate(X, y, cv=5, scoring=metrics, n_jobs=1), n_calls, warmup=1
+            ),
+            'cross_validate n_jobs=-1': time_per_call(
+                lambda: service.cross_validate(X, y, cv=5, scoring=metrics, n_jobs=-1), n_calls, warmup=1
+            )
+        }
+
+def benchmark_training_pipeline(n_samples: int = 2000, n_features: int = 10, n_calls: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    End-to-end trainer flow with grid search: train_enhanced with its own
+    split, then evaluate_detailed and cross_validate on top (as the trainer
+    used to) vs one train_enhanced call that is given the test split and
+    reads cross-validation from the tuning's neighbor graphs
+    """
+    from sklearn.model_selection import train_test_split
+
+    metrics = ['accuracy', 'precision_macro', 'recall_macro', 'f1_macro']
+    X, y = make_classification(
+        n_samples=n_samples, n_features=n_features, n_informative=n_features // 2,
+        n_classes=4, n_clusters_per_class=1, random_state=42
+    )
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        service = EnhancedKNNService(
+            model_path=os.path.join(workdir, "model.joblib"),
+            scaler_path=os.path.join(workdir, "scaler.joblib"),
+            feature_selector_path=os.path.join(workdir, "selector.joblib")
+        )
+
+        def separate_steps():
+            service.train_enhanced(X_train, y_train, persist=False)
+            service.evaluate_detailed(service.preprocess_data(X_test, fit=False), y_test)
+            service.cross_validate(service.preprocess_data(X_train, fit=False), y_train, cv=5, scoring=metrics)
+
+        def planned():
+            service.train_enhanced(
+                X_train, y_train, persist=False, validation_data=(X_test, y_test), cv_scoring=metrics
+            )
+
+        return {
+            'train + evaluate + cv': time_per_call(separate_steps, n_calls, warmup=1),
+            'planned train_enhanced': time_per_call(planned, n_calls, warmup=1)
+        }
+
+def synthetic_reports(n_reports: int, seed: int = 0) -> List[Dict]:
+    """Report documents shaped like the reports collection"""
+    rng = np.random.default_rng(seed)
+    words = np.array([kw for keywords in KEYWORD_GROUPS.values() for kw in keywords] + ['loja', 'online', 'local'])
+    reports = []
+    for _ in range(n_reports):
+        reports.append({
+            'title': ' '.join(rng.choice(words, 4)),
+            'searchQuery': ' '.join(rng.choice(words, 3)),
+            'report': {
+                'description': ' '.join(rng.choice(words, 40)),
+                'opportunities': ['o'] * int(rng.integers(0, 6)),
+                'customerSegments': ['c'] * int(rng.integers(0, 6)),
+                'targetAudience': list(rng.choice(['Jovens', 'jovens', 'Empresas'], int(rng.integers(0, 4)))),
+                'dataQuality': str(rng.choice(['verified', 'no_evidence']))
+            }
+        })
+    return reports
+
+def benchmark_report_features(n_calls: int = 20, n_reports: int = 5000) -> Dict[str, Dict[str, float]]:
+    """Extraction of n_reports reports one document at a time vs as one columnar batch"""
+    reports = synthetic_reports(n_reports)
+    return {
+        'per_document': time_per_call(lambda: [extract_features_batch([r]) for r in reports], n_calls, warmup=1),
+        'batched': time_per_call(lambda: extract_features_batch(reports), n_calls, warmup=1)
+    }
+
+def benchmark_ann_index(n_rows: int = 200000, n_features: int = 10, n_queries: int = 500) -> Dict[str, Dict[str, float]]:
+    """
+    Recall@10 and single-query latency of the IVF index at several n_probe
+    values, against exact search, on a standardized synthetic training set
+    """
+    X, _ = make_classification(
+        n_samples=n_rows + n_queries,
+        n_features=n_features,
+        n_informative=max(2, n_features // 2),
+        n_classes=5,
+        n_clusters_per_class=3,
+        random_state=0
+    )
+    X = (X - X.mean(axis=0)) / X.std(axis=0)
+    report = recall_latency_report(X[:n_rows], X[n_rows:], k=10)
+    return {row['index']: row for row in report}
+
+def benchmark_compact_index(n_rows: int = 200000, n_features: int = 10, n_queries: int = 200) -> Dict[str, Dict[str, float]]:
+    """
+    Latency (single queries and one batch of n_queries) and size of
+    brute-force search over float64 vs float32 training rows; recall is the
+    overlap with the float64 neighbors
+    """
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n_rows, n_features))
+    queries = rng.normal(size=(n_queries, n_features))
+    _, reference = BruteForceIndex().fit(X).kneighbors(queries, 10)
+
+    results = {}
+    for dtype in [np.float64, np.float32]:
+        index = BruteForceIndex().fit(X.astype(dtype))
+        found = index.kneighbors(queries, 10)[1]
+        query_rows = iter(np.tile(queries, (2, 1)))
+        results[np.dtype(dtype).name] = {
+            **time_per_call(lambda: index.kneighbors(next(query_rows)[None, :], 10), n_queries, warmup=n_queries),
+            'recall': float(np.mean([len(np.intersect1d(a, b)) / 10 for a, b in zip(found, reference)])),
+            'index_mb': index.vectors.nbytes / 2 ** 20
+        }
+        results[f'{np.dtype(dtype).name} batch'] = time_per_call(lambda: index.kneighbors(queries, 10), 5, warmup=1)
+    return results
+
+def benchmark_bagging_ensemble(n_rows: int = 50000, n_features: int = 10, n_queries: int = 200) -> Dict[str, Dict[str, float]]:
+    """
+    Single-query predict_proba latency and pickled size of a 10-bag KNN
+    ensemble: scikit-learn's BaggingClassifier (one fitted KNN per bag) vs
+    one shared index with bootstrap counts
+    """
+    X, y = make_classification(
+        n_samples=n_rows + n_queries,
+        n_features=n_features,
+        n_informative=max(2, n_features // 2),
+        n_classes=4,
+        random_state=0
+    )
+    X_train, y_train, queries = X[:n_rows], y[:n_rows], X[n_rows:]
+    models = {
+        'bagging_classifier': BaggingClassifier(KNeighborsClassifier(n_neighbors=5), n_estimators=10, random_state=42),
+        'shared_index': SharedIndexBaggingClassifier(n_neighbors=5, n_estimators=10)
+    }
+
+    results = {}
+    for name, model in models.items():
+        model.fit(X_train, y_train)
+        size = len(pickle.dumps(model)) + len(pickle.dumps(getattr(model, 'index_', None)))
+        query_rows = iter(np.tile(queries, (2, 1)))
+        results[name] = {
+            **time_per_call(lambda: model.predict_proba(next(query_rows)[None, :]), n_queries, warmup=n_queries),
+            'model_mb': size / 2 ** 20
+        }
+    return results
+
+# Run in a fresh interpreter: load the published model, predict once, report
+# the time that took and the process's anonymous (private) and file-backed
+# resident memory. Module imports are excluded; they are the same either way.
+_COLD_START_SCRIPT = """
+import json, sys, time
+import numpy as np
+from enhanced_knn import EnhancedKNNService
+start = time.perf_counter()
+workdir, mmap_mode = sys.argv[1], sys.argv[2] or None
+service = EnhancedKNNService(
+    model_path=workdir + "/model.joblib",
+    scaler_path=workdir + "/scaler.joblib",
+    feature_selector_path=workdir + "/selector.joblib",
+    mmap_mode=mmap_mode
+)
+service.load_model()
+service.predict_with_confidence(np.zeros((1, service.scaler.n_features_in_)))
+elapsed = time.perf_counter() - start
+status = dict(line.split(":", 1) for line in open("/proc/self/status"))
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_anon_kb": int(status["RssAnon"].split()[0]),
+    "rss_file_kb": int(status["RssFile"].split()[0])
+}))
+"""
+
+def benchmark_model_loading(n_samples: int = 400000, n_features: int = 10, n_runs: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Cold start (model load and first prediction) and resident memory of a fresh worker process, loading the model fully into memory vs
+    memory-mapping it. Private memory is what each extra worker costs; the
+    mapped training matrix is file-backed and shared through the page cache.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        train_benchmark_service(workdir, n_samples, n_features)
+        here = os.path.dirname(os.path.abspath(__file__))
+        for variant, mmap_mode in [('full_load', ''), ('mmap', 'r')]:
+            runs = [
+                json.loads(subprocess.run(
+                    [sys.executable, '-c', _COLD_START_SCRIPT, workdir, mmap_mode],
+                    cwd=here, capture_output=True, text=True, check=True
+                ).stdout)
+                for _ in range(n_runs)
+            ]
+            timings = np.array([run['seconds'] for run in runs]) * 1e6
+            results[variant] = {
+                'mean_us': float(timings.mean()),
+                'p50_us': float(np.percentile(timings, 50)),
+                'p99_us': float(np.percentile(timings, 99)),
+                'rss_anon_mb': float(np.mean([run['rss_anon_kb'] for run in runs]) / 1024),
+                'rss_file_mb': float(np.mean([run['rss_file_kb'] for run in runs]) / 1024)
+            }
+    return results
+
+def benchmark_import_time(n_runs: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Import time of the serving entry point in a fresh interpreter, as
+    shipped and with the plotting and dataframe stack it used to import
+    eagerly
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for variant, command in [
+        ('eager_plotting', 'import matplotlib.pyplot, seaborn, pandas, enhanced_main'),
+        ('enhanced_main', 'import enhanced_main')
+    ]:
+        timings = []
+        for _ in range(n_runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', command], cwd=here, capture_output=True, check=True)
+            timings.append((time.perf_counter() - start) * 1e6)
+        timings = np.array(timings)
+        results[variant] = {
+            'mean_us': float(timings.mean()),
+            'p50_us': float(np.percentile(timings, 50)),
+            'p99_us': float(np.percentile(timings, 99))
+        }
+
+    report = import_report('enhanced_main', cwd=here)
+    results['enhanced_main']['modules'] = report['modules_imported']
+    results['enhanced_main']['deferred_loaded'] = len(report['deferred_loaded'])
+    return results
+
+_RUNTIME_COLD_START_SCRIPT = """
+import time
+start = time.perf_counter()
+import json, sys
+import numpy as np
+workdir, variant = sys.argv[1], sys.argv[2]
+if variant == 'runtime_file':
+    from runtime_model import load_runtime_model
+    model = load_runtime_model(workdir + "/model.runtime.joblib", 'r')
+    model.predict_proba(np.zeros((1, model.preprocess.n_features)))
+else:
+    from enhanced_knn import EnhancedKNNService
+    service = EnhancedKNNService(
+        model_path=workdir + "/model.joblib",
+        scaler_path=workdir + "/scaler.joblib",
+        feature_selector_path=workdir + "/selector.joblib",
+        runtime_model=variant == 'runtime_model'
+    )
+    service.load_model()
+    service.infer(np.zeros((1, service.scaler.n_features_in_)))
+elapsed = time.perf_counter() - start
+status = dict(line.split(":", 1) for line in open("/proc/self/status"))
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_anon_kb": int(status["RssAnon"].split()[0]),
+    "rss_file_kb": int(status["RssFile"].split()[0])
+}))
+"""
+
+def benchmark_runtime_model(n_samples: int = 10000, n_features: int = 10, n_runs: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Serving from the scikit-learn bundle vs the NumPy-only runtime model:
+    per-call latency for one row and a batch of 100 (past RUNTIME_MAX_BATCH,
+    so both go through scikit-learn), and a fresh process that imports,
+    loads the model and predicts once. The service loads the scikit-learn
+    pickles either way; only a process reading the runtime file alone
+    ('runtime_file') avoids them.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        train_benchmark_service(workdir, n_samples, n_features)
+        rng = np.random.default_rng(0)
+        sample, batch = rng.normal(size=(1, n_features)), rng.normal(size=(100, n_features))
+
+        for variant, runtime_model in [('sklearn_bundle', False), ('runtime_model', True)]:
+            service = EnhancedKNNService(
+                model_path=os.path.join(workdir, "model.joblib"),
+                scaler_path=os.path.join(workdir, "scaler.joblib"),
+                feature_selector_path=os.path.join(workdir, "selector.joblib"),
+                runtime_model=runtime_model
+            )
+            service.load_model()
+            results[f'{variant} 1 row'] = time_per_call(lambda: service.infer(sample))
+            results[f'{variant} 100 rows'] = time_per_call(lambda: service.infer(batch), n_calls=50)
+
+        here = os.path.dirname(os.path.abspath(__file__))
+        for variant in ['sklearn_bundle', 'runtime_model', 'runtime_file']:
+            runs = [
+                json.loads(subprocess.run(
+                    [sys.executable, '-c', _RUNTIME_COLD_START_SCRIPT, workdir, variant],
+                    cwd=here, capture_output=True, text=True, check=True
+                ).stdout)
+                for _ in range(n_runs)
+            ]
+            timings = np.array([run['seconds'] for run in runs]) * 1e6
+            results[f'{variant} cold start'] = {
+                'mean_us': float(timings.mean()),
+                'p50_us': float(np.percentile(timings, 50)),
+                'p99_us': float(np.percentile(timings, 99)),
+                'rss_anon_mb': float(np.mean([run['rss_anon_kb'] for run in runs]) / 1024),
+                'rss_file_mb': float(np.mean([run['rss_file_kb'] for run in runs]) / 1024)
+            }
+    return results
+
+def main():
+    """Run all benchmarks and log a summary"""
+    logger.info("Enhanced KNN Serving Benchmarks")
+    logger.info("=" * 50)
+
+    benchmarks = {
+        'preprocessing_cache': benchmark_preprocessing_cache,
+        'prediction_cache': benchmark_prediction_cache,
+        'top_k': benchmark_top_k,
+        'fused_transform': benchmark_fused_transform,
+        'cross_validation': benchmark_cross_validation,
+        'training_pipeline': benchmark_training_pipeline,
+        'report_features': benchmark_report_features,
+        'ann_index': benchmark_ann_index,
+        'compact_index': benchmark_compact_index,
+        'bagging_ensemble': benchmark_bagging_ensemble,
+        'model_loading': benchmark_model_loading,
+        'runtime_model': benchmark_runtime_model,
+        'import_time': benchmark_import_time
+    }
+
+    for name, benchmark in benchmarks.items():
+        logger.info(f"\n{name}")
+        logger.info("-" * len(name))
+        for variant, stats in benchmark().items():
+            extras = "".join(
+                f" {key}={value:.3f}" for key, value in stats.items() if not key.endswith('_us')
+            )
+            logger.info(
+                f"  {variant:<28} mean={stats['mean_us']:9.1f}us "
+                f"p50={stats['p50_us']:9.1f}us p99={stats['p99_us']:9.1f}us{extras}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,73 @@
 import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
 import joblib
 import numpy as np
-import pandas as pd
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.model_selection import (
-    GridSearchCV,
-    cross_val_score,
-    StratifiedKFold,
-    train_test_split
-)
-from sklearn.metrics import (
-    accuracy_score,
-    precision_score,
-    recall_score,
-    f1_score,
-    classification_report,
-    confusion_matrix,
-    roc_auc_score
-)
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.pipeline import Pipeline
-from sklearn.ensemble import BaggingClassifier
-from sklearn.decomposition import PCA
+from sklearn.base import clone
+from sklearn.neighbors import KNeighborsClassifier, NearestNeighbors
+from sklearn.preprocessing import StandardScaler
 from sklearn.feature_selection import SelectKBest, f_classif
-import matplotlib.pyplot as plt
-import seaborn as sns
-from typing import Dict, List, Tuple, Optional, Any
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Tuple, Optional, Any
 import logging
 
+from feature_encoding import FeatureEncoder, as_feature_array
+from neighbor_index import IndexedKNeighborsClassifier, SharedIndexBaggingClassifier
+from ranking import top_k_indices
+from runtime_model import SUPPORTED_METRICS as RUNTIME_METRICS, FusedTransform, RuntimeKNNModel
+
+# Only what inference needs is imported at module load, so the serving
+# process starts quickly; tuning, evaluation and plotting dependencies
+# (model_selection, metrics, matplotlib, neighbor_graph_search) are
+# imported by the methods that use them
+if TYPE_CHECKING:
+    from neighbor_graph_search import NeighborGraphCache
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# A compact (float32) model may lose at most this much test accuracy
+# against the same model fitted on float64 rows
+COMPACT_ACCURACY_TOLERANCE = 0.005
+
+# Batches up to this many rows are served by the runtime model, whatever the
+# training set size (it searches large ones with the estimator's tree).
+# Its gain is scikit-learn's fixed per-call overhead, which larger batches
+# amortize
+RUNTIME_MAX_BATCH = 64
+
+class InvalidFeaturesError(ValueError):
+    """Raised when feature rows do not fit the published model"""
+
+class InferenceResult(NamedTuple):
+    """Everything the serving path needs, derived from a single neighbor query"""
+    predictions: np.ndarray
+    probabilities: np.ndarray
+    max_confidence: np.ndarray
+    top_indices: np.ndarray
+    classes: np.ndarray
+    model_version: int = 0
+
+class ModelBundle(NamedTuple):
+    """
+    Immutable snapshot of everything needed to serve predictions.
+    Serving code reads one bundle reference per request, so a retrain can
+    publish a complete new bundle with a single reference swap. When the
+    model is an exact single KNN, runtime holds the same model as plain
+    arrays and serving runs on it. transform is the scaler and the feature
+    selector fused into one operator.
+    """
+    model: Any
+    scaler: Optional[StandardScaler]
+    feature_selector: Optional[SelectKBest]
+    best_params: Optional[Dict[str, Any]] = None
+    version: int = 0
+    created_at: str = ""
+    encoder: Optional[FeatureEncoder] = None
+    runtime: Optional[RuntimeKNNModel] = None
+    transform: Optional[FusedTransform] = None
+
 class EnhancedKNNService:
     """
     Enhanced KNN Service with advanced features:
@@ -46,26 +83,58 @@ class EnhancedKNNService:
         self,
         model_path: str = "enhanced_knn_model.joblib",
         scaler_path: str = "knn_scaler.joblib",
-        feature_selector_path: str = "knn_feature_selector.joblib"
+        feature_selector_path: str = "knn_feature_selector.joblib",
+        encoder_path: str = "knn_encoder.json",
+        max_history: int = 3,
+        mmap_mode: Optional[str] = 'r',
+        runtime_model: bool = True
     ):
         self.model_path = model_path
         self.scaler_path = scaler_path
         self.feature_selector_path = feature_selector_path
+        self.encoder_path = encoder_path
+        # Approximate neighbor indexes are stored next to the model file
+        self.index_path = f"{os.path.splitext(model_path)[0]}.index.joblib"
+        # So is the NumPy-only runtime model (see export_runtime_model)
+        self.runtime_path = f"{os.path.splitext(model_path)[0]}.runtime.joblib"
+        self.runtime_model = runtime_model
+
+        # Model and index files are uncompressed joblib dumps whose arrays are
+        # raw aligned buffers; loading them with mmap_mode='r' maps the
+        # training matrix instead of copying it, so startup does not depend on
+        # its size and every worker process shares one copy in the page cache.
+        # None restores plain in-memory loading.
+        self.mmap_mode = mmap_mode
 
         self.model = None
         self.scaler = None
         self.feature_selector = None
+        self.encoder = None
         self.best_params = None
         self.cv_results = None
-
-        # Default hyperparameters for grid search
+        # Neighbor graphs of the last tuning run's folds, reused to
+        # cross-validate the winning parameters without another search
+        self.graph_cache: Optional['NeighborGraphCache'] = None
+
+        # Published serving snapshot plus previous ones kept for rollback
+        self.bundle: Optional[ModelBundle] = None
+        self._bundle_history = deque(maxlen=max_history)
+        self._bundle_version = 0
+        self._swap_lock = threading.Lock()
+
+        # (mtime_ns, size) of the model file backing the published bundle
+        self._model_file_stamp = None
+
+        # Default hyperparameters for grid search. Only settings that change
+        # predictions are searched: minkowski with p=1/p=2 is exactly
+        # manhattan/euclidean, and the search algorithm never changes exact
+        # KNN results, so it is picked afterwards by select_algorithm.
         self.param_grid = {
             'n_neighbors': [3, 5, 7, 9, 11, 13, 15],
             'weights': ['uniform', 'distance'],
-            'metric': ['euclidean', 'manhattan', 'minkowski'],
-            'p': [1, 2],  # Only used with minkowski
-            'algorithm': ['auto', 'ball_tree', 'kd_tree', 'brute']
+            'metric': ['euclidean', 'manhattan']
         }
+        self.algorithm_candidates = ['ball_tree', 'kd_tree', 'brute']
 
     def preprocess_data(
         self,
@@ -89,124 +158,529 @@ class EnhancedKNNService:
             else:
                 X_selected = self.feature_selector.fit_transform(X_scaled, np.zeros(X.shape[0]))
 
-            # Save preprocessing objects
-            joblib.dump(self.scaler, self.scaler_path)
-            joblib.dump(self.feature_selector, self.feature_selector_path)
-
         else:
-            # Load and transform
-            if os.path.exists(self.scaler_path):
-                self.scaler = joblib.load(self.scaler_path)
-            if os.path.exists(self.feature_selector_path):
-                self.feature_selector = joblib.load(self.feature_selector_path)
-
-            if self.scaler:
-                X_scaled = self.scaler.transform(X)
-                X_selected = self.feature_selector.transform(X_scaled) if self.feature_selector else X_scaled
+            # Transform with the published bundle, which stays resident in memory
+            bundle = self.current_bundle()
+            if bundle is not None:
+                X_selected = self._transform(X, bundle)
             else:
-                X_selected = X
+                X_selected = self._transform(X, ModelBundle(None, self.scaler, self.feature_selector))
 
         return X_selected
 
+    @staticmethod
+    def _transform(X: np.ndarray, bundle: ModelBundle) -> np.ndarray:
+        """Apply a bundle's scaler and feature selector"""
+        if bundle.scaler is None:
+            return X
+        if bundle.transform is not None:
+            return bundle.transform(X)
+        X_scaled = bundle.scaler.transform(X)
+        return bundle.feature_selector.transform(X_scaled) if bundle.feature_selector else X_scaled
+
+    @staticmethod
+    def _artifact_stamp(path: str) -> Optional[Tuple[int, int]]:
+        """Cheap change marker for an artifact file: (mtime_ns, size), or None if missing"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def current_bundle(self) -> Optional[ModelBundle]:
+        """
+        Published bundle, reloaded from disk only when another process wrote
+        new artifacts. The model file is written last by save_model, so its
+        stamp marks a complete artifact set.
+        """
+        bundle = self.bundle
+        if bundle is None or self._artifact_stamp(self.model_path) == self._model_file_stamp:
+            return bundle
+
+        with self._swap_lock:
+            stamp = self._artifact_stamp(self.model_path)
+            if stamp is not None and stamp != self._model_file_stamp:
+                self._publish_locked(self._read_bundle(), stamp)
+
+        return self.bundle
+
+    def publish(self, bundle: ModelBundle, persist: bool = False) -> ModelBundle:
+        """
+        Atomically make bundle the serving model. The previous bundle is kept
+        for rollback. With persist=True the artifacts are written to disk
+        before the swap so restarts and other workers pick up the same model.
+        Without it, the model file currently on disk counts as already seen:
+        only a later write by another process replaces the bundle.
+        """
+        bundle = self._prepare_bundle(bundle)
+        with self._swap_lock:
+            stamp = self.save_model(bundle) if persist else self._artifact_stamp(self.model_path)
+            return self._publish_locked(bundle, stamp)
+
+    def _publish_locked(
+        self,
+        bundle: ModelBundle,
+        stamp: Optional[Tuple[int, int]],
+        keep_previous: bool = True
+    ) -> ModelBundle:
+        self._bundle_version += 1
+        bundle = bundle._replace(version=self._bundle_version, created_at=datetime.now().isoformat())
+
+        if keep_previous and self.bundle is not None:
+            self._bundle_history.append(self.bundle)
+
+        # Single reference swap; in-flight requests keep the bundle they read
+        self.bundle = bundle
+        self._model_file_stamp = stamp
+
+        # Mirror onto the attributes used by training code and model info
+        self.model = bundle.model
+        self.scaler = bundle.scaler
+        self.feature_selector = bundle.feature_selector
+        self.best_params = bundle.best_params
+        self.encoder = bundle.encoder
+
+        logger.info(f"Published model bundle v{bundle.version}")
+        return bundle
+
+    def rollback(self) -> ModelBundle:
+        """Republish the previous bundle and persist it as the current model"""
+        with self._swap_lock:
+            if not self._bundle_history:
+                raise ValueError("No previous model bundle to roll back to")
+            previous = self._bundle_history.pop()
+            stamp = self.save_model(previous)
+            current = self.bundle
+            bundle = self._publish_locked(previous, stamp, keep_previous=False)
+            logger.info(f"Rolled back from bundle v{current.version} to v{bundle.version}")
+            return bundle
+
     def hyperparameter_tuning(
         self,
         X: np.ndarray,
         y: np.ndarray,
         cv: int = 5,
-        scoring: str = 'f1_macro'
+        scoring: str = 'f1_macro',
+        strategy: str = 'grid',
+        time_budget: Optional[float] = None,
+        patience: int = 10
     ) -> Dict[str, Any]:
         """
-        Perform grid search for hyperparameter optimization
+        Hyperparameter optimization over param_grid.
+        strategy:
+        - 'grid': exhaustive grid search on the full training set
+        - 'halving': successive halving on sample count, stopping early once
+          the leading candidate is stable across rounds
+        - 'random': candidates in random order until time_budget (seconds)
+          runs out or the leader survives `patience` challengers
         """
-        logger.info("Starting hyperparameter tuning...")
+        from sklearn.model_selection import StratifiedKFold
 
-        # Create base model
-        base_model = KNeighborsClassifier()
+        logger.info(f"Starting hyperparameter tuning ({strategy})...")
 
         # Stratified K-Fold for imbalanced datasets
         cv_strategy = StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
 
-        # Grid search
+        if strategy == 'grid':
+            search = self._grid_search(X, y, cv_strategy, scoring)
+        elif strategy == 'halving':
+            search = self._successive_halving_search(X, y, cv_strategy, scoring)
+        elif strategy == 'random':
+            search = self._randomized_search(X, y, cv_strategy, scoring, time_budget, patience)
+        else:
+            raise ValueError(f"Unknown search strategy: {strategy}")
+
+        self.best_params = dict(search['best_params'])
+        self.cv_results = search['cv_results']
+        self.graph_cache = search.get('graph_cache')
+
+        # Speed-only decision, made once for the winning parameters
+        self.best_params['algorithm'] = self.select_algorithm(X, self.best_params)
+        best_estimator = KNeighborsClassifier(**self.best_params).fit(X, y)
+
+        logger.info(f"Best parameters: {self.best_params}")
+        logger.info(f"Best cross-validation score: {search['best_score']:.4f}")
+
+        return {
+            'best_params': self.best_params,
+            'best_score': search['best_score'],
+            'cv_results': self.cv_results,
+            'best_estimator': best_estimator,
+            'search_strategy': strategy,
+            'candidates_evaluated': search['candidates_evaluated'],
+            'stopped_early': search['stopped_early']
+        }
+
+    def _grid_search(self, X: np.ndarray, y: np.ndarray, cv_strategy, scoring: str) -> Dict[str, Any]:
+        """
+        Exhaustive grid search over every candidate. KNN-only grids are scored
+        from one neighbor graph per (fold, metric); anything else falls back
+        to GridSearchCV.
+        """
+        import neighbor_graph_search
+        from sklearn.model_selection import GridSearchCV, ParameterGrid
+
+        if neighbor_graph_search.supports(list(ParameterGrid(self.param_grid)), scoring):
+            graph_search = neighbor_graph_search.NeighborGraphSearch(self.param_grid, cv_strategy, scoring).fit(X, y)
+            return {
+                'best_params': graph_search.best_params_,
+                'best_score': graph_search.best_score_,
+                'cv_results': graph_search.cv_results_,
+                'candidates_evaluated': len(graph_search.cv_results_['params']),
+                'stopped_early': False,
+                'graph_cache': graph_search.cache_
+            }
+
         grid_search = GridSearchCV(
-            estimator=base_model,
+            estimator=KNeighborsClassifier(),
             param_grid=self.param_grid,
             cv=cv_strategy,
             scoring=scoring,
             n_jobs=-1,
             verbose=1,
-            return_train_score=True
+            return_train_score=True,
+            refit=False
         )
-
-        # Fit grid search
         grid_search.fit(X, y)
 
-        self.best_params = grid_search.best_params_
-        self.cv_results = grid_search.cv_results_
+        return {
+            'best_params': grid_search.best_params_,
+            'best_score': grid_search.best_score_,
+            'cv_results': grid_search.cv_results_,
+            'candidates_evaluated': len(grid_search.cv_results_['params']),
+            'stopped_early': False
+        }
+
+    def _evaluate_candidates(
+        self,
+        candidates: List[Dict[str, Any]],
+        X: np.ndarray,
+        y: np.ndarray,
+        cv_strategy,
+        scoring: str,
+        cache: Optional['NeighborGraphCache'] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Mean and standard deviation of the CV score for each candidate.
+        Pass a cache to reuse neighbor graphs across calls on the same data.
+        """
+        import neighbor_graph_search
+        from sklearn.model_selection import cross_val_score
+
+        if neighbor_graph_search.supports(candidates, scoring):
+            if cache is None:
+                cache = neighbor_graph_search.NeighborGraphCache.from_cv(X, y, cv_strategy)
+            scores = neighbor_graph_search.score_candidates(cache, candidates, scoring)
+            return scores.mean(axis=1), scores.std(axis=1)
+
+        means = np.empty(len(candidates))
+        stds = np.empty(len(candidates))
+        for i, params in enumerate(candidates):
+            scores = cross_val_score(
+                KNeighborsClassifier(**params), X, y, cv=cv_strategy, scoring=scoring, n_jobs=-1
+            )
+            means[i] = scores.mean()
+            stds[i] = scores.std()
+        return means, stds
+
+    def _successive_halving_search(
+        self,
+        X: np.ndarray,
+        y: np.ndarray,
+        cv_strategy,
+        scoring: str,
+        factor: int = 3,
+        stable_rounds: int = 2
+    ) -> Dict[str, Any]:
+        """
+        Successive halving on sample count: score every candidate on a small
+        stratified subsample, keep the best 1/factor, grow the sample by
+        factor and repeat. Stops once the same candidate has led for
+        stable_rounds consecutive rounds after the first.
+        """
+        from sklearn.model_selection import ParameterGrid, train_test_split
+
+        candidates = list(ParameterGrid(self.param_grid))
+        n_samples = len(X)
+        n_classes = len(np.unique(y))
+
+        n_rounds = int(np.ceil(np.log(len(candidates)) / np.log(factor)))
+        min_resources = n_classes * cv_strategy.get_n_splits() * 2
+        resources = max(min_resources, n_samples // factor ** n_rounds)
+
+        cv_results = {'params': [], 'mean_test_score': [], 'std_test_score': [], 'n_resources': []}
+        evaluated = 0
+        leader, leader_rounds = None, 0
+        stopped_early = False
+
+        while True:
+            resources = min(resources, n_samples)
+            if resources < n_samples:
+                X_round, _, y_round, _ = train_test_split(
+                    X, y, train_size=resources, stratify=y, random_state=42
+                )
+            else:
+                X_round, y_round = X, y
 
-        logger.info(f"Best parameters: {self.best_params}")
-        logger.info(f"Best cross-validation score: {grid_search.best_score_:.4f}")
+            means, stds = self._evaluate_candidates(candidates, X_round, y_round, cv_strategy, scoring)
+            evaluated += len(candidates)
+
+            cv_results['params'].extend(candidates)
+            cv_results['mean_test_score'].extend(means)
+            cv_results['std_test_score'].extend(stds)
+            cv_results['n_resources'].extend([resources] * len(candidates))
+
+            order = np.argsort(-means, kind='stable')
+            best_params, best_score = candidates[order[0]], float(means[order[0]])
+            logger.info(
+                f"Halving round: {len(candidates)} candidates on {resources} samples, "
+                f"best {best_score:.4f}"
+            )
+
+            leader_rounds = leader_rounds + 1 if best_params == leader else 0
+            leader = best_params
+
+            if len(candidates) == 1 or resources == n_samples:
+                break
+            if leader_rounds >= stable_rounds:
+                stopped_early = True
+                logger.info("Candidate ranking stable, stopping halving early")
+                break
+
+            n_keep = max(1, int(np.ceil(len(candidates) / factor)))
+            candidates = [candidates[i] for i in order[:n_keep]]
+            resources *= factor
 
         return {
-            'best_params': self.best_params,
-            'best_score': grid_search.best_score_,
-            'cv_results': self.cv_results,
-            'best_estimator': grid_search.best_estimator_
+            'best_params': best_params,
+            'best_score': best_score,
+            'cv_results': {key: np.asarray(value) if key != 'params' else value
+                           for key, value in cv_results.items()},
+            'candidates_evaluated': evaluated,
+            'stopped_early': stopped_early
+        }
+
+    def _randomized_search(
+        self,
+        X: np.ndarray,
+        y: np.ndarray,
+        cv_strategy,
+        scoring: str,
+        time_budget: Optional[float],
+        patience: int
+    ) -> Dict[str, Any]:
+        """
+        Evaluate candidates in random order, stopping when the time budget is
+        spent or the leader has survived `patience` challengers in a row
+        """
+        import neighbor_graph_search
+        from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+        n_candidates = len(ParameterGrid(self.param_grid))
+        candidates = list(ParameterSampler(self.param_grid, n_iter=n_candidates, random_state=42))
+
+        cv_results = {'params': [], 'mean_test_score': [], 'std_test_score': []}
+        best_params, best_score = None, -np.inf
+        cache = neighbor_graph_search.NeighborGraphCache.from_cv(X, y, cv_strategy)
+        since_improvement = 0
+        stopped_early = False
+        start = time.perf_counter()
+
+        # One search per (fold, metric) at the largest sampled k; otherwise
+        # every larger n_neighbors drawn would rebuild the fold graphs
+        if neighbor_graph_search.supports(candidates, scoring):
+            neighbor_graph_search.warm_graphs(cache, candidates)
+
+        for params in candidates:
+            if best_params is not None and time_budget is not None and time.perf_counter() - start >= time_budget:
+                stopped_early = True
+                logger.info(f"Search time budget of {time_budget}s spent")
+                break
+
+            means, stds = self._evaluate_candidates([params], X, y, cv_strategy, scoring, cache)
+            cv_results['params'].append(params)
+            cv_results['mean_test_score'].append(means[0])
+            cv_results['std_test_score'].append(stds[0])
+
+            if means[0] > best_score:
+                best_params, best_score = params, float(means[0])
+                since_improvement = 0
+            else:
+                since_improvement += 1
+
+            if since_improvement >= patience and len(cv_results['params']) < n_candidates:
+                stopped_early = True
+                logger.info("Candidate ranking stable, stopping random search early")
+                break
+
+        return {
+            'best_params': best_params,
+            'best_score': best_score,
+            'cv_results': {key: np.asarray(value) if key != 'params' else value
+                           for key, value in cv_results.items()},
+            'candidates_evaluated': len(cv_results['params']),
+            'stopped_early': stopped_early,
+            'graph_cache': cache
         }
 
+    def select_algorithm(
+        self,
+        X: np.ndarray,
+        params: Dict[str, Any],
+        n_queries: int = 256
+    ) -> str:
+        """
+        Pick the fastest neighbor search structure for the given parameters
+        by timing a sample of queries against each candidate
+        """
+        rng = np.random.default_rng(42)
+        queries = X[rng.choice(len(X), size=min(n_queries, len(X)), replace=False)]
+        n_neighbors = min(params.get('n_neighbors', 5), len(X))
+
+        timings = {}
+        for algorithm in self.algorithm_candidates:
+            index = NearestNeighbors(
+                n_neighbors=n_neighbors,
+                metric=params.get('metric', 'minkowski'),
+                p=params.get('p', 2),
+                algorithm=algorithm
+            ).fit(X)
+            start = time.perf_counter()
+            index.kneighbors(queries)
+            timings[algorithm] = time.perf_counter() - start
+
+        fastest = min(timings, key=timings.get)
+        logger.info(f"Neighbor search algorithm: {fastest} ({timings[fastest] * 1000:.2f}ms per {len(queries)} queries)")
+        return fastest
+
     def train_enhanced(
         self,
         X: np.ndarray,
         y: np.ndarray,
         use_grid_search: bool = True,
         use_ensemble: bool = False,
-        cv_folds: int = 5
+        cv_folds: int = 5,
+        persist: bool = True,
+        search_strategy: str = 'grid',
+        search_time_budget: Optional[float] = None,
+        neighbor_index: str = 'exact',
+        index_params: Optional[Dict[str, Any]] = None,
+        compact: bool = False,
+        validation_data: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+        cv_scoring: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """
-        Enhanced training with preprocessing, hyperparameter tuning, and evaluation
+        Enhanced training with preprocessing, hyperparameter tuning, and evaluation.
+        search_strategy selects 'grid', 'halving' or 'random' tuning (see
+        hyperparameter_tuning); search_time_budget caps the random search.
+        neighbor_index selects the serving search: 'exact' (scikit-learn) or
+        an approximate backend from neighbor_index such as 'ivf', configured
+        with index_params. Tuning always uses exact neighbors.
+        Rows are cast to float64 first (the MongoDB loaders return float32),
+        so only compact=True produces a float32 model: it stores and searches
+        the training rows in float32 (exact search then uses the 'brute'
+        backend) after a parity check against float64; see _fit_compact.
+        Ensembles are compacted the same way, as their shared index.
+        validation_data=(X_test, y_test) evaluates on those raw rows instead
+        of holding out 20% of X, so a caller with its own test split gets
+        the evaluation without a second split or fit. cv_scoring adds a
+        'cross_validation' result ({metric: {mean, std, scores}}) for the
+        served parameters on the tuning folds, read from the tuning's
+        cached neighbor graphs when possible (see cross_validate_tuned).
+        The trained model is published as this service's serving bundle; with
+        persist=False nothing is written to disk.
         """
+        from sklearn.model_selection import train_test_split
+
         logger.info("Starting enhanced KNN training...")
 
+        # Encode string feature values deterministically; numeric input passes through
+        encoder = FeatureEncoder().fit(X)
+        self.encoder = None if encoder.is_identity else encoder
+        if self.encoder is not None:
+            X = self.encoder.transform(X)
+        X = np.asarray(X, dtype=np.float64)
+
         # Preprocess data
         X_processed = self.preprocess_data(X, y, fit=True)
 
-        # Split data for final evaluation
-        X_train, X_test, y_train, y_test = train_test_split(
-            X_processed, y, test_size=0.2, random_state=42, stratify=y
-        )
+        # Split data for final evaluation, unless the caller planned one
+        if validation_data is None:
+            X_train, X_test, y_train, y_test = train_test_split(
+                X_processed, y, test_size=0.2, random_state=42, stratify=y
+            )
+        else:
+            X_train, y_train = X_processed, y
+            X_test, y_test = validation_data
+            if self.encoder is not None:
+                X_test = self.encoder.transform(X_test)
+            X_test = np.asarray(X_test, dtype=np.float64)
+            X_test = self._transform(X_test, ModelBundle(None, self.scaler, self.feature_selector))
+
+        self.graph_cache = None
 
         # Hyperparameter tuning
+        search_summary = None
+        tuning_results = None
         if use_grid_search:
-            tuning_results = self.hyperparameter_tuning(X_train, y_train, cv=cv_folds)
+            tuning_results = self.hyperparameter_tuning(
+                X_train, y_train,
+                cv=cv_folds,
+                strategy=search_strategy,
+                time_budget=search_time_budget
+            )
+            search_summary = {
+                'strategy': search_strategy,
+                'best_score': tuning_results['best_score'],
+                'candidates_evaluated': tuning_results['candidates_evaluated'],
+                'stopped_early': tuning_results['stopped_early']
+            }
 
             # Create best model
-            if use_ensemble:
-                # Use bagging ensemble with best parameters
-                base_estimator = KNeighborsClassifier(**tuning_results['best_params'])
-                self.model = BaggingClassifier(
-                    base_estimator=base_estimator,
-                    n_estimators=10,
-                    random_state=42
-                )
-            else:
-                self.model = tuning_results['best_estimator']
+            self.model = tuning_results['best_estimator']
         else:
             # Use default parameters
             self.model = KNeighborsClassifier(n_neighbors=5)
-            if use_ensemble:
-                self.model = BaggingClassifier(
-                    base_estimator=self.model,
-                    n_estimators=10,
-                    random_state=42
-                )
 
-        # Train the model
-        self.model.fit(X_train, y_train)
+        if compact and neighbor_index == 'exact':
+            # scikit-learn's trees keep a float64 copy of the rows
+            neighbor_index = 'brute'
+
+        # Serve the tuned KNN from a NeighborIndex if requested; bagging
+        # ensembles always share one index across their bootstrap bags
+        if neighbor_index != 'exact' or use_ensemble:
+            params = self.model.get_params()
+            metric = params['metric']
+            if metric == 'minkowski':
+                metric = {1: 'manhattan', 2: 'euclidean'}.get(params['p'], metric)
+            if neighbor_index == 'exact' and index_params is None:
+                index_params = {'algorithm': params['algorithm']}
+
+            index_model = SharedIndexBaggingClassifier if use_ensemble else IndexedKNeighborsClassifier
+            self.model = index_model(
+                n_neighbors=params['n_neighbors'],
+                weights=params['weights'],
+                metric=metric,
+                index=neighbor_index,
+                index_params=index_params
+            )
+
+        # Train the model; the tuned estimator is already fitted on X_train
+        compact_summary = None
+        if compact:
+            compact_summary = self._fit_compact(X_train, y_train, X_test, y_test)
+        elif tuning_results is None or self.model is not tuning_results['best_estimator']:
+            self.model.fit(X_train, y_train)
 
         # Evaluate on test set
         evaluation_results = self.evaluate_detailed(X_test, y_test)
+        cv_results = self.cross_validate_tuned(X_train, y_train, cv=cv_folds, scoring=cv_scoring) if cv_scoring else None
 
-        # Save model
-        self.save_model()
+        # Publish (and save) the complete bundle in one step
+        self.publish(
+            ModelBundle(self.model, self.scaler, self.feature_selector, self.best_params, encoder=self.encoder),
+            persist=persist
+        )
 
         logger.info("Enhanced training completed successfully")
 
@@ -214,28 +688,70 @@ class EnhancedKNNService:
             'model': self.model,
             'evaluation': evaluation_results,
             'best_params': getattr(self, 'best_params', None),
+            'search': search_summary,
+            'compact': compact_summary,
+            'cross_validation': cv_results,
             'preprocessing': {
                 'scaler': self.scaler,
                 'feature_selector': self.feature_selector
             }
         }
 
+    def _fit_compact(
+        self,
+        X_train: np.ndarray,
+        y_train: np.ndarray,
+        X_test: np.ndarray,
+        y_test: np.ndarray
+    ) -> Dict[str, Any]:
+        """
+        Fit self.model on float32 rows, alongside the same model on float64
+        rows as a reference. The float32 model is kept only if its test
+        accuracy is within COMPACT_ACCURACY_TOLERANCE of the reference;
+        otherwise the float64 model is served.
+        """
+        from sklearn.metrics import accuracy_score
+
+        reference = clone(self.model).fit(X_train, y_train)
+        self.model.fit(X_train.astype(np.float32), y_train)
+
+        reference_predictions = reference.predict(X_test)
+        compact_predictions = self.model.predict(X_test)
+        summary = {
+            'accuracy_float64': accuracy_score(y_test, reference_predictions),
+            'accuracy_float32': accuracy_score(y_test, compact_predictions),
+            'prediction_agreement': float(np.mean(reference_predictions == compact_predictions))
+        }
+        summary['enabled'] = bool(
+            summary['accuracy_float32'] >= summary['accuracy_float64'] - COMPACT_ACCURACY_TOLERANCE
+        )
+
+        if summary['enabled']:
+            logger.info(f"float32 model passed the parity check: {summary}")
+        else:
+            logger.warning(f"float32 model failed the parity check, serving float64: {summary}")
+            self.model = reference
+        return summary
+
     def evaluate_detailed(self, X: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
         """
         Comprehensive model evaluation with multiple metrics
         """
+        from sklearn.metrics import (
+            accuracy_score,
+            precision_score,
+            recall_score,
+            f1_score,
+            classification_report,
+            confusion_matrix,
+            roc_auc_score
+        )
+
         if self.model is None:
             raise ValueError("Model not trained yet")
 
-        # Get predictions
-        y_pred = self.model.predict(X)
-
-        # Get prediction probabilities if available
-        try:
-            y_pred_proba = self.model.predict_proba(X)
-            has_proba = True
-        except:
-            has_proba = False
+        # Labels and probabilities from one neighbor query
+        y_pred, y_pred_proba, has_proba = self._predict_labels_and_proba(X)
 
         # Calculate metrics
         results = {
@@ -264,31 +780,80 @@ class EnhancedKNNService:
         X: np.ndarray,
         y: np.ndarray,
         cv: int = 5,
-        scoring: List[str] = ['accuracy', 'precision_macro', 'recall_macro', 'f1_macro']
+        scoring: List[str] = ['accuracy', 'precision_macro', 'recall_macro', 'f1_macro'],
+        n_jobs: Optional[int] = -1
     ) -> Dict[str, Any]:
         """
-        Perform cross-validation with multiple scoring metrics
+        Perform cross-validation with multiple scoring metrics.
+        Each fold is fitted and predicted once and every metric is scored
+        from those predictions; folds run in parallel on n_jobs workers.
+        Metrics that cannot be computed are logged and left out.
         """
+        from sklearn.metrics import get_scorer
+        from sklearn.model_selection import cross_validate
+
         if self.model is None:
             raise ValueError("Model not trained yet")
 
-        cv_results = {}
-
+        scorers = {}
         for metric in scoring:
             try:
-                scores = cross_val_score(
-                    self.model, X, y, cv=cv, scoring=metric
-                )
-                cv_results[metric] = {
-                    'mean': scores.mean(),
-                    'std': scores.std(),
-                    'scores': scores.tolist()
-                }
-            except Exception as e:
+                scorers[metric] = get_scorer(metric)
+            except ValueError as e:
                 logger.warning(f"Could not calculate {metric}: {e}")
+        if not scorers:
+            return {}
+
+        # A failing scorer yields NaN for its folds (scikit-learn warns with
+        # the traceback) instead of aborting the other metrics
+        results = cross_validate(self.model, X, y, cv=cv, scoring=scorers, n_jobs=n_jobs, error_score=np.nan)
+
+        cv_results = {}
+        for metric in scorers:
+            scores = results[f'test_{metric}']
+            if np.isnan(scores).any():
+                logger.warning(f"Could not calculate {metric}: failed on {int(np.isnan(scores).sum())} folds")
+                continue
+            cv_results[metric] = {
+                'mean': scores.mean(),
+                'std': scores.std(),
+                'scores': scores.tolist()
+            }
 
         return cv_results
 
+    def cross_validate_tuned(
+        self,
+        X: np.ndarray,
+        y: np.ndarray,
+        cv: int = 5,
+        scoring: List[str] = ['accuracy', 'precision_macro', 'recall_macro', 'f1_macro']
+    ) -> Dict[str, Any]:
+        """
+        Cross-validation of the tuned parameters on the tuning's folds. When
+        the last search ran on X through neighbor graphs and the model is a
+        plain KNN, every metric is read from those cached graphs; otherwise
+        the folds are refitted with cross_validate.
+        """
+        import neighbor_graph_search
+        from sklearn.model_selection import StratifiedKFold
+
+        cache = self.graph_cache
+        if (
+            cache is not None and cache.X is X
+            and type(self.model) is KNeighborsClassifier
+            and all(neighbor_graph_search.supports([self.best_params], metric) for metric in scoring)
+        ):
+            searches = cache.searches
+            fold_scores = neighbor_graph_search.cross_validation_scores(cache, self.best_params, scoring)
+            logger.info(f"Cross-validation from cached neighbor graphs ({cache.searches - searches} new searches)")
+            return {
+                metric: {'mean': scores.mean(), 'std': scores.std(), 'scores': scores.tolist()}
+                for metric, scores in fold_scores.items()
+            }
+
+        return self.cross_validate(X, y, cv=StratifiedKFold(n_splits=cv, shuffle=True, random_state=42), scoring=scoring)
+
     def predict_with_confidence(
         self,
         X: np.ndarray,
@@ -298,26 +863,87 @@ class EnhancedKNNService:
         Make predictions with confidence scores
         Returns: (predictions, probabilities, high_confidence_mask)
         """
-        if self.model is None:
+        result = self.infer(X)
+        high_confidence = result.max_confidence >= confidence_threshold
+
+        return result.predictions, result.probabilities, high_confidence
+
+    def infer(self, X: np.ndarray, top_k: int = 5) -> InferenceResult:
+        """
+        Fused inference: preprocess once, run the neighbor query once and
+        derive labels, probabilities, max confidence and top-k class indices.
+        Batches of up to RUNTIME_MAX_BATCH rows run on the bundle's runtime
+        model when it has one.
+        """
+        # One snapshot per call: a concurrent hot-swap never mixes bundles
+        bundle = self.current_bundle()
+        if bundle is None:
             raise ValueError("Model not trained yet")
+        X = as_feature_array(X)
+        self._check_features(X, bundle)
 
-        # Preprocess input
-        X_processed = self.preprocess_data(X, fit=False)
+        if bundle.runtime is not None and len(X) <= RUNTIME_MAX_BATCH:
+            probabilities = bundle.runtime.predict_proba(X)
+            predictions = bundle.runtime.classes[np.argmax(probabilities, axis=1)]
+        else:
+            if bundle.encoder is not None:
+                X = bundle.encoder.transform(X)
+            X_processed = self._transform(X, bundle)
+            predictions, probabilities, _ = self._predict_labels_and_proba(X_processed, bundle.model)
+
+        max_confidence = probabilities.max(axis=1)
+        top_indices = top_k_indices(probabilities, top_k)
+
+        return InferenceResult(
+            predictions=predictions,
+            probabilities=probabilities,
+            max_confidence=max_confidence,
+            top_indices=top_indices,
+            classes=bundle.model.classes_,
+            model_version=bundle.version
+        )
 
-        # Get predictions
-        predictions = self.model.predict(X_processed)
+    @staticmethod
+    def _check_features(X: np.ndarray, bundle: ModelBundle):
+        """
+        Raise InvalidFeaturesError unless X has the bundle's feature count
+        and every column without a categorical encoding is numeric
+        """
+        if bundle.encoder is not None:
+            n_features = bundle.encoder.n_features
+        elif bundle.transform is not None:
+            n_features = bundle.transform.n_features
+        else:
+            n_features = getattr(bundle.model, 'n_features_in_', None)
+        if X.ndim != 2 or (n_features is not None and X.shape[1] != n_features):
+            raise InvalidFeaturesError(f"Expected {n_features} features per row, got {X.shape[-1]}")
+
+        if X.dtype == object:
+            encoded = set(bundle.encoder.vocabularies) | set(bundle.encoder.hashed_columns) if bundle.encoder else set()
+            numeric = [column for column in range(X.shape[1]) if column not in encoded]
+            try:
+                X[:, numeric].astype(np.float64)
+            except (TypeError, ValueError):
+                raise InvalidFeaturesError("Non-numeric value in a numeric feature")
 
-        # Get probabilities if available
+    def _predict_labels_and_proba(self, X: np.ndarray, model: Any = None) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        Labels derived from predict_proba instead of a second predict() call.
+        For KNN and bagging, predict() is argmax(predict_proba) with ties going
+        to the lowest class index, so the labels are identical.
+        Returns: (predictions, probabilities, has_proba)
+        """
+        model = model if model is not None else self.model
         try:
-            probabilities = self.model.predict_proba(X_processed)
-            max_probs = np.max(probabilities, axis=1)
-            high_confidence = max_probs >= confidence_threshold
-        except:
-            # Fallback for models without predict_proba
-            probabilities = np.full((len(predictions), len(np.unique(predictions))), 0.5)
-            high_confidence = np.full(len(predictions), True)
+            probabilities = model.predict_proba(X)
+        except AttributeError:
+            # Fallback for models without predict_proba: one-hot of the labels
+            predictions = model.predict(X)
+            probabilities = (predictions[:, None] == model.classes_[None, :]).astype(float)
+            return predictions, probabilities, False
 
-        return predictions, probabilities, high_confidence
+        predictions = model.classes_[np.argmax(probabilities, axis=1)]
+        return predictions, probabilities, True
 
     def predict(self, X: np.ndarray) -> np.ndarray:
         """
@@ -326,25 +952,130 @@ class EnhancedKNNService:
         if self.model is None:
             self.load_model()
 
-        X_processed = self.preprocess_data(X, fit=False)
-        return self.model.predict(X_processed)
+        return self.infer(X).predictions
 
-    def save_model(self):
-        """Save the trained model and preprocessing objects"""
-        if self.model:
-            joblib.dump(self.model, self.model_path)
-            logger.info(f"Model saved to {self.model_path}")
+    def save_model(self, bundle: Optional[ModelBundle] = None) -> Optional[Tuple[int, int]]:
+        """
+        Save the trained model and preprocessing objects. Each file is
+        replaced atomically and the model file is written last, so readers
+        never pair a new scaler with an old model.
+        Returns the model file stamp.
+        """
+        if bundle is None:
+            bundle = ModelBundle(self.model, self.scaler, self.feature_selector, self.best_params, encoder=self.encoder)
+        if bundle.model is None:
+            return None
+
+        if bundle.scaler is not None:
+            self._dump_atomic(bundle.scaler, self.scaler_path)
+        if bundle.feature_selector is not None:
+            self._dump_atomic(bundle.feature_selector, self.feature_selector_path)
+        if bundle.encoder is not None:
+            tmp_path = f"{self.encoder_path}.tmp"
+            bundle.encoder.save(tmp_path)
+            os.replace(tmp_path, self.encoder_path)
+        elif os.path.exists(self.encoder_path):
+            # A stale encoder must not be paired with a model trained without one
+            os.remove(self.encoder_path)
+        if isinstance(bundle.model, IndexedKNeighborsClassifier):
+            tmp_path = f"{self.index_path}.tmp"
+            bundle.model.save_index(tmp_path)
+            os.replace(tmp_path, self.index_path)
+        elif os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        if bundle.runtime is not None:
+            tmp_path = f"{self.runtime_path}.tmp"
+            bundle.runtime.save(tmp_path)
+            os.replace(tmp_path, self.runtime_path)
+        elif os.path.exists(self.runtime_path):
+            os.remove(self.runtime_path)
+        self._dump_atomic(bundle.model, self.model_path)
+
+        logger.info(f"Model saved to {self.model_path}")
+        return self._artifact_stamp(self.model_path)
+
+    @staticmethod
+    def _dump_atomic(obj: Any, path: str):
+        tmp_path = f"{path}.tmp"
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, path)
+
+    def _read_bundle(self) -> ModelBundle:
+        """Read the artifact set from disk into an unpublished bundle"""
+        model = joblib.load(self.model_path, mmap_mode=self.mmap_mode)
+        if isinstance(model, IndexedKNeighborsClassifier):
+            model.load_index(self.index_path, self.mmap_mode)
+        scaler = joblib.load(self.scaler_path) if os.path.exists(self.scaler_path) else None
+        feature_selector = (
+            joblib.load(self.feature_selector_path) if os.path.exists(self.feature_selector_path) else None
+        )
+        encoder = FeatureEncoder.load(self.encoder_path) if os.path.exists(self.encoder_path) else None
+        bundle = ModelBundle(model, scaler, feature_selector, self.best_params, encoder=encoder)
+        # The runtime model is rebuilt over the loaded (memory-mapped) model
+        # arrays instead of reading <model>.runtime.joblib, so the training
+        # rows are mapped once; that file is for processes without scikit-learn
+        return self._prepare_bundle(bundle)
+
+    def _prepare_bundle(self, bundle: ModelBundle) -> ModelBundle:
+        """Precompute the fused transform and, if enabled, the runtime model of a bundle"""
+        if bundle.transform is None and bundle.scaler is not None:
+            bundle = bundle._replace(transform=FusedTransform.from_estimators(bundle.scaler, bundle.feature_selector))
+        if bundle.runtime is None and self.runtime_model:
+            bundle = bundle._replace(runtime=self.export_runtime_model(bundle))
+        return bundle
+
+    @staticmethod
+    def export_runtime_model(bundle: ModelBundle) -> Optional[RuntimeKNNModel]:
+        """
+        The bundle as a RuntimeKNNModel, with the scaler and the feature
+        selector folded into one transform. It shares the model's training
+        rows and KD/ball tree rather than copying them. None when the model
+        has no exact single-KNN equivalent: bagging ensembles, approximate
+        indexes, other metrics or callable weights.
+        """
+        model = bundle.model
+        tree = None
+        if isinstance(model, SharedIndexBaggingClassifier):
+            return None
+        if isinstance(model, IndexedKNeighborsClassifier):
+            if model.index_.name == 'brute':
+                vectors = model.index_.vectors
+            elif model.index_.name == 'exact':
+                search = model.index_._search
+                vectors = search._fit_X
+                tree = search._tree if search._fit_method in ('kd_tree', 'ball_tree') else None
+            else:
+                return None
+            y_codes, metric = model.y_codes_, model.metric
+        elif isinstance(model, KNeighborsClassifier):
+            if model._y.ndim != 1:
+                return None
+            vectors, y_codes, metric = model._fit_X, model._y, model.effective_metric_
+            tree = model._tree if model._fit_method in ('kd_tree', 'ball_tree') else None
+            if metric == 'minkowski':
+                metric = {1: 'manhattan', 2: 'euclidean'}.get(model.effective_metric_params_.get('p'), metric)
+        else:
+            return None
+        if metric not in RUNTIME_METRICS or model.weights not in ('uniform', 'distance'):
+            return None
+
+        # _transform applies the selector only after a scaler
+        preprocess = bundle.transform
+        if preprocess is None and bundle.scaler is not None:
+            preprocess = FusedTransform.from_estimators(bundle.scaler, bundle.feature_selector)
+
+        return RuntimeKNNModel(
+            vectors, y_codes, model.classes_, model.n_neighbors, model.weights, metric,
+            preprocess=preprocess, encoder=bundle.encoder, tree=tree
+        )
 
     def load_model(self):
         """Load the trained model and preprocessing objects"""
         if os.path.exists(self.model_path):
-            self.model = joblib.load(self.model_path)
-
-            # Load preprocessing objects
-            if os.path.exists(self.scaler_path):
-                self.scaler = joblib.load(self.scaler_path)
-            if os.path.exists(self.feature_selector_path):
-                self.feature_selector = joblib.load(self.feature_selector_path)
+            # Load everything once; predictions reuse the published bundle from memory
+            with self._swap_lock:
+                stamp = self._artifact_stamp(self.model_path)
+                self._publish_locked(self._read_bundle(), stamp)
 
             logger.info(f"Model loaded from {self.model_path}")
         else:
@@ -372,6 +1103,8 @@ class EnhancedKNNService:
         """
         Plot cross-validation results from grid search
         """
+        import matplotlib.pyplot as plt
+
         if self.cv_results is None:
             logger.warning("No CV results available. Run hyperparameter_tuning first.")
             return
@@ -380,7 +1113,7 @@ class EnhancedKNNService:
         fig, axes = plt.subplots(2, 2, figsize=(15, 10))
         fig.suptitle('Grid Search Cross-Validation Results')
 
-        metrics = ['mean_test_score', 'mean_train_score', 'std_test_score']
+        metrics = [m for m in ['mean_test_score', 'mean_train_score', 'std_test_score'] if m in self.cv_results]
 
         for i, metric in enumerate(metrics[:3]):
             ax = axes[i // 2, i % 2]
@@ -418,17 +1151,26 @@ class EnhancedKNNService:
 
         info = {
             "status": "trained",
+            "bundle_version": self.bundle.version if self.bundle else None,
+            "rollback_available": len(self._bundle_history),
             "model_type": type(self.model).__name__,
             "best_params": self.best_params,
             "has_scaler": self.scaler is not None,
             "has_feature_selector": self.feature_selector is not None,
+            "has_encoder": self.encoder is not None,
+            "neighbor_index": self.model.index if isinstance(self.model, IndexedKNeighborsClassifier) else "exact",
+            "compact": isinstance(self.model, IndexedKNeighborsClassifier) and self.model.index_.dtype == np.float32,
+            "runtime_model": self.bundle is not None and self.bundle.runtime is not None,
         }
 
         # Add ensemble info if applicable
-        if hasattr(self.model, 'base_estimator_'):
+        if isinstance(self.model, SharedIndexBaggingClassifier):
             info["ensemble"] = True
             info["n_estimators"] = self.model.n_estimators
-            info["base_estimator_params"] = self.model.base_estimator_.get_params()
+            info["base_estimator_params"] = {
+                name: value for name, value in self.model.get_params().items()
+                if name in ('n_neighbors', 'weights', 'metric')
+            }
         else:
             info["ensemble"] = False
 
@@ -1,18 +1,32 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional, Union
+import os
 import numpy as np
 import uvicorn
 import asyncio
 import logging
 from datetime import datetime
-from enhanced_knn import EnhancedKNNService
+from enhanced_knn import EnhancedKNNService, InvalidFeaturesError
+from feature_encoding import as_feature_array
+from import_report import DEFERRED_MODULES, loaded_modules
+from inference_pool import InferencePool, PoolSaturatedError
+from prediction_cache import PredictionCache
+from ranking import rank_classes
 from fastapi.middleware.cors import CORSMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Wall-clock cost of the imports above; `python import_report.py` breaks it
+# down per module
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
 app = FastAPI(
     title="Enhanced KNN Niche Recommendation Service",
     description="Advanced machine learning service for entrepreneurial niche recommendations",
@@ -37,29 +51,80 @@ app.add_middleware(
 enhanced_knn = EnhancedKNNService(
     model_path="enhanced_knn_model_v2.joblib",
     scaler_path="enhanced_knn_scaler_v2.joblib",
-    feature_selector_path="enhanced_knn_feature_selector_v2.joblib"
+    feature_selector_path="enhanced_knn_feature_selector_v2.joblib",
+    encoder_path="enhanced_knn_encoder_v2.json",
+    mmap_mode=os.getenv("KNN_MODEL_MMAP", "r") or None,
+    runtime_model=os.getenv("KNN_RUNTIME_MODEL", "1") != "0"
 )
 
+# Bounded worker pool so neighbor searches never block the event loop
+inference_pool = InferencePool()
+
+# Repeat /predict profiles are answered from memory until the model changes
+prediction_cache = PredictionCache()
+
+# Upper bound on rows accepted by /predict/batch in a single request
+MAX_BATCH_SIZE = int(os.getenv("KNN_MAX_BATCH_SIZE", "10000"))
+
 class FeatureInput(BaseModel):
-    features: List[float] = Field(..., description="List of numerical features for prediction")
+    features: List[Union[float, str]] = Field(
+        ..., description="Feature values for prediction; strings are encoded with the model's categorical encoder"
+    )
     confidence_threshold: Optional[float] = Field(0.6, description="Confidence threshold for predictions (0.0-1.0)")
+    top_k: int = Field(5, ge=1, description="Number of ranked niches returned")
+    min_probability: float = Field(0.0, ge=0.0, le=1.0, description="Leave out niches below this probability")
 
 class PredictionResponse(BaseModel):
     recommendations: List[Dict[str, Any]]
     metadata: Dict[str, Any]
     confidence_scores: List[float]
 
+class BatchFeatureInput(BaseModel):
+    features: List[List[Union[float, str]]] = Field(..., description="One list of feature values per row to predict")
+    confidence_threshold: Optional[float] = Field(0.6, description="Confidence threshold for predictions (0.0-1.0)")
+    top_k: int = Field(5, ge=1, description="Number of ranked niches returned per row")
+    min_probability: float = Field(0.0, ge=0.0, le=1.0, description="Leave out niches below this probability")
+
+class BatchPrediction(BaseModel):
+    recommendations: List[Dict[str, Any]]
+    confidence_scores: List[float]
+    high_confidence: bool
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[BatchPrediction]
+    metadata: Dict[str, Any]
+
 class TrainingRequest(BaseModel):
     use_grid_search: bool = Field(True, description="Whether to perform hyperparameter tuning")
     use_ensemble: bool = Field(False, description="Whether to use ensemble methods")
     cv_folds: int = Field(5, description="Number of cross-validation folds")
+    search_strategy: Literal["grid", "halving", "random"] = Field(
+        "grid", description="Hyperparameter search: exhaustive grid, successive halving or time-boxed random"
+    )
+    search_time_budget: Optional[float] = Field(
+        None, gt=0, description="Seconds allowed for the random search strategy"
+    )
+    neighbor_index: Literal["exact", "brute", "ivf"] = Field(
+        "exact", description="Neighbor search used for serving: exact, NumPy brute force, or approximate inverted-file index"
+    )
+    index_params: Optional[Dict[str, Any]] = Field(
+        None, description="Backend options, e.g. {\"n_probe\": 8} for ivf"
+    )
+    compact: bool = Field(
+        False, description="Store and search the training rows in float32, after a parity check against float64"
+    )
 
 class ModelInfo(BaseModel):
     status: str
+    bundle_version: Optional[int] = None
+    rollback_available: int = 0
     model_type: Optional[str]
     best_params: Optional[Dict[str, Any]]
     has_scaler: bool
     has_feature_selector: bool
+    has_encoder: bool = False
+    neighbor_index: str = "exact"
+    compact: bool = False
     ensemble: bool
     feature_importance: Optional[Dict[str, float]]
 
@@ -82,6 +147,9 @@ async def health_check():
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "model": model_info,
+            "inference_pool": inference_pool.metrics(),
+            "prediction_cache": prediction_cache.metrics(),
+            "startup": startup_report(),
             "service": "enhanced-knn"
         }
     except Exception as e:
@@ -100,37 +168,32 @@ async def predict_niche(input_data: FeatureInput):
         if len(input_data.features) < 2:
             raise HTTPException(status_code=400, detail="At least 2 features required")
 
-        # Convert to numpy array
-        features = np.array(input_data.features, dtype=float).reshape(1, -1)
+        # Convert to a (1, n_features) array; string values stay intact for the encoder
+        features = as_feature_array([input_data.features])
 
-        # Get predictions with confidence
-        predictions, probabilities, high_confidence = enhanced_knn.predict_with_confidence(
-            features,
-            input_data.confidence_threshold
-        )
+        # Repeat profiles are answered from the cache without touching the pool
+        bundle = enhanced_knn.current_bundle()
+        cache_key = prediction_cache.key(features), input_data.top_k
+        result = prediction_cache.get(cache_key, bundle.version) if bundle is not None else None
+        cached = result is not None
+        if not cached:
+            # Single neighbor query for labels, probabilities and ranking
+            result = await inference_pool.run(enhanced_knn.infer, features, top_k=input_data.top_k)
+            prediction_cache.put(cache_key, result.model_version, result)
+        high_confidence = result.max_confidence >= input_data.confidence_threshold
 
         # Prepare recommendations
-        recommendations = []
-        confidence_scores = []
-
-        for i, (pred, prob_row) in enumerate(zip(predictions, probabilities)):
-            # Get top predictions
-            top_indices = np.argsort(prob_row)[-5:][::-1]
-
-            for idx in top_indices:
-                confidence = float(prob_row[idx])
-                recommendations.append({
-                    "niche": str(enhanced_knn.model.classes_[idx]),
-                    "probability": confidence,
-                    "rank": len(recommendations) + 1
-                })
-                confidence_scores.append(confidence)
+        recommendations = rank_classes(
+            result.probabilities, result.classes, input_data.top_k, input_data.min_probability, result.top_indices
+        )[0]
+        confidence_scores = [recommendation["probability"] for recommendation in recommendations]
 
         # Metadata
         metadata = {
             "input_features_count": len(input_data.features),
             "confidence_threshold": input_data.confidence_threshold,
             "high_confidence_predictions": bool(high_confidence[0]),
+            "cached": cached,
             "model_version": "enhanced_v2",
             "timestamp": datetime.now().isoformat()
         }
@@ -143,10 +206,83 @@ async def predict_niche(input_data: FeatureInput):
             confidence_scores=confidence_scores
         )
 
+    except HTTPException:
+        raise
+    except InvalidFeaturesError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except PoolSaturatedError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail="Inference capacity exhausted, retry shortly")
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_niche_batch(input_data: BatchFeatureInput):
+    """
+    Get niche recommendations for many feature rows with one preprocessing
+    pass and one neighbor search over the whole matrix
+    """
+    try:
+        # Validate input
+        if not input_data.features:
+            raise HTTPException(status_code=400, detail="Features list cannot be empty")
+
+        if len(input_data.features) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"Batch size cannot exceed {MAX_BATCH_SIZE} rows")
+
+        row_lengths = {len(row) for row in input_data.features}
+        if len(row_lengths) != 1:
+            raise HTTPException(status_code=400, detail="All rows must have the same number of features")
+
+        features_count = row_lengths.pop()
+        if features_count < 2:
+            raise HTTPException(status_code=400, detail="At least 2 features required")
+
+        # Convert to a single (n_rows, n_features) matrix
+        features = as_feature_array(input_data.features)
+
+        # One neighbor query for every row at once
+        result = await inference_pool.run(enhanced_knn.infer, features, top_k=input_data.top_k)
+        high_confidence = result.max_confidence >= input_data.confidence_threshold
+
+        # Rankings for every row at once
+        ranked = rank_classes(
+            result.probabilities, result.classes, input_data.top_k, input_data.min_probability, result.top_indices
+        )
+        batch_predictions = [
+            BatchPrediction(
+                recommendations=recommendations,
+                confidence_scores=[recommendation["probability"] for recommendation in recommendations],
+                high_confidence=is_confident
+            )
+            for recommendations, is_confident in zip(ranked, high_confidence.tolist())
+        ]
+
+        metadata = {
+            "rows": len(batch_predictions),
+            "input_features_count": features_count,
+            "confidence_threshold": input_data.confidence_threshold,
+            "high_confidence_predictions": int(np.count_nonzero(high_confidence)),
+            "model_version": "enhanced_v2",
+            "timestamp": datetime.now().isoformat()
+        }
+
+        logger.info(f"Batch prediction completed for {len(batch_predictions)} rows")
+
+        return BatchPredictionResponse(predictions=batch_predictions, metadata=metadata)
+
+    except HTTPException:
+        raise
+    except InvalidFeaturesError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except PoolSaturatedError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail="Inference capacity exhausted, retry shortly")
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+
 @app.post("/retrain")
 async def retrain_model(
     background_tasks: BackgroundTasks,
@@ -159,16 +295,8 @@ async def retrain_model(
         training_config = TrainingRequest()
 
     try:
-        # Import training function
-        from train_from_db import train_model_from_db
-
         # Add retraining to background tasks
-        background_tasks.add_task(
-            retrain_model_background,
-            training_config.use_grid_search,
-            training_config.use_ensemble,
-            training_config.cv_folds
-        )
+        background_tasks.add_task(retrain_model_background, training_config)
 
         return {
             "message": "Model retraining started in background",
@@ -180,14 +308,45 @@ async def retrain_model(
         logger.error(f"Retraining request error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Retraining failed: {str(e)}")
 
-def retrain_model_background(use_grid_search: bool, use_ensemble: bool, cv_folds: int):
+def train_and_publish(X: np.ndarray, y: np.ndarray, training_config: TrainingRequest) -> Dict[str, Any]:
+    """
+    Train a fully independent model bundle, then publish it on the serving
+    instance with one reference swap. Requests in flight keep using the
+    bundle they started with; the previous one stays available for rollback.
+    """
+    candidate = EnhancedKNNService(
+        model_path=enhanced_knn.model_path,
+        scaler_path=enhanced_knn.scaler_path,
+        feature_selector_path=enhanced_knn.feature_selector_path,
+        encoder_path=enhanced_knn.encoder_path,
+        mmap_mode=enhanced_knn.mmap_mode,
+        runtime_model=enhanced_knn.runtime_model
+    )
+    training_results = candidate.train_enhanced(
+        X, y,
+        use_grid_search=training_config.use_grid_search,
+        use_ensemble=training_config.use_ensemble,
+        cv_folds=training_config.cv_folds,
+        persist=False,
+        search_strategy=training_config.search_strategy,
+        search_time_budget=training_config.search_time_budget,
+        neighbor_index=training_config.neighbor_index,
+        index_params=training_config.index_params,
+        compact=training_config.compact
+    )
+
+    bundle = enhanced_knn.publish(candidate.bundle, persist=True)
+    training_results['bundle_version'] = bundle.version
+    return training_results
+
+def retrain_model_background(training_config: TrainingRequest):
     """Background task for model retraining"""
     try:
         logger.info("Starting background model retraining...")
 
         # Get training data
-        from train_from_db import train_model_from_db
-        X, y = train_model_from_db()
+        from train_from_db import load_training_data
+        X, y = load_training_data()
 
         if len(X) == 0 or len(y) == 0:
             logger.error("No training data available")
@@ -195,13 +354,8 @@ def retrain_model_background(use_grid_search: bool, use_ensemble: bool, cv_folds
 
         logger.info(f"Training with {len(X)} samples and {X.shape[1]} features")
 
-        # Train enhanced model
-        training_results = enhanced_knn.train_enhanced(
-            X, y,
-            use_grid_search=use_grid_search,
-            use_ensemble=use_ensemble,
-            cv_folds=cv_folds
-        )
+        # Train enhanced model off to the side, then hot-swap it in
+        training_results = train_and_publish(X, y, training_config)
 
         # Log results
         logger.info("Model retraining completed successfully")
@@ -222,19 +376,14 @@ async def retrain_model_sync(training_config: TrainingRequest = None):
 
     try:
         # Get training data
-        from train_from_db import train_model_from_db
-        X, y = train_model_from_db()
+        from train_from_db import load_training_data
+        X, y = load_training_data()
 
         if len(X) == 0 or len(y) == 0:
             raise HTTPException(status_code=400, detail="No training data available")
 
-        # Train enhanced model
-        training_results = enhanced_knn.train_enhanced(
-            X, y,
-            use_grid_search=training_config.use_grid_search,
-            use_ensemble=training_config.use_ensemble,
-            cv_folds=training_config.cv_folds
-        )
+        # Train enhanced model off to the side, then hot-swap it in
+        training_results = train_and_publish(X, y, training_config)
 
         return {
             "message": "Model retrained successfully",
@@ -242,6 +391,9 @@ async def retrain_model_sync(training_config: TrainingRequest = None):
                 "accuracy": training_results["evaluation"]["accuracy"],
                 "f1_macro": training_results["evaluation"]["f1_macro"],
                 "best_params": training_results.get("best_params"),
+                "bundle_version": training_results.get("bundle_version"),
+                "search": training_results.get("search"),
+                "compact": training_results.get("compact"),
                 "training_time": "completed"
             }
         }
@@ -250,6 +402,32 @@ async def retrain_model_sync(training_config: TrainingRequest = None):
         logger.error(f"Synchronous retraining failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Retraining failed: {str(e)}")
 
+@app.post("/model/rollback")
+async def rollback_model():
+    """Swap back to the previously published model bundle"""
+    try:
+        # rollback() persists the previous bundle; keep that disk I/O off the event loop
+        bundle = await run_in_threadpool(enhanced_knn.rollback)
+        return {
+            "message": "Model rolled back successfully",
+            "bundle_version": bundle.version,
+            "rollback_available": enhanced_knn.get_model_info().get("rollback_available", 0)
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Rollback failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Rollback failed: {str(e)}")
+
+@app.get("/metrics")
+async def get_metrics():
+    """Inference pool queue depth, wait times and rejection counters, prediction cache hit rate"""
+    return {
+        "inference_pool": inference_pool.metrics(),
+        "prediction_cache": prediction_cache.metrics(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.get("/model-info", response_model=ModelInfo)
 async def get_model_info():
     """Get detailed information about the current model"""
@@ -290,9 +468,20 @@ async def get_model_performance():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not get performance metrics: {str(e)}")
 
+def startup_report() -> Dict[str, Any]:
+    """Import time of this entry point and any deferred modules loaded since"""
+    return {
+        "import_seconds": IMPORT_SECONDS,
+        "deferred_modules_loaded": loaded_modules(DEFERRED_MODULES)
+    }
+
 @app.on_event("startup")
 async def startup_event():
     """Load model on startup"""
+    report = startup_report()
+    logger.info(f"Imports took {report['import_seconds'] * 1000:.0f}ms")
+    if report["deferred_modules_loaded"]:
+        logger.warning(f"Serving imported training-only modules: {report['deferred_modules_loaded']}")
     try:
         enhanced_knn.load_model()
         logger.info("Enhanced KNN model loaded successfully on startup")
@@ -304,6 +493,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
+    inference_pool.shutdown(wait=False)
     logger.info("Enhanced KNN service shutting down")
 
 if __name__ == "__main__":
@@ -314,6 +504,7 @@ if __name__ == "__main__":
     logger.info("  ✓ Feature scaling and selection")
     logger.info("  ✓ Ensemble methods support")
     logger.info("  ✓ Confidence score predictions")
+    logger.info("  ✓ Batch predictions")
     logger.info("  ✓ Background model retraining")
     logger.info("  ✓ Comprehensive API endpoints")
 
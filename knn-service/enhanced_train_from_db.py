@@ -8,10 +8,12 @@ import os
 import sys
 import logging
 from datetime import datetime
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, List
 import numpy as np
 import pandas as pd
+from bson.raw_bson import RawBSONDocument
 from pymongo import MongoClient
+from bson.codec_options import CodecOptions
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
 import matplotlib.pyplot as plt
@@ -21,6 +23,13 @@ import seaborn as sns
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from enhanced_knn import EnhancedKNNService
+from feature_store import ReportFeatureStore
+from mongo_loader import DEFAULT_BATCH_SIZE, stream_batches
+from parallel_features import default_workers, extract_features_parallel
+from report_features import FEATURE_NAMES, REPORT_PROJECTION, extract_features_batch, synthetic_labels
+
+# Cross-validation metrics reported next to the test evaluation
+CV_METRICS = ['accuracy', 'precision_macro', 'recall_macro', 'f1_macro']
 
 # Configure logging
 logging.basicConfig(
@@ -36,8 +45,12 @@ logger = logging.getLogger(__name__)
 class EnhancedKNNTrainer:
     """Enhanced trainer for KNN model with MongoDB integration"""
 
-    def __init__(self, mongo_uri: str = None):
+    def __init__(self, mongo_uri: str = None, feature_workers: int = None, feature_store_dir: str = None):
         self.mongo_uri = mongo_uri or os.getenv('MONGODB_URI', 'mongodb://localhost:27017/compath')
+        self.feature_workers = feature_workers or default_workers()
+        # Set KNN_FEATURE_STORE_DIR to an empty string to always re-extract every report
+        self.feature_store_dir = feature_store_dir if feature_store_dir is not None \
+            else os.getenv('KNN_FEATURE_STORE_DIR', 'feature_store')
         self.client = None
         self.db = None
         self.collection = None
@@ -65,143 +78,87 @@ class EnhancedKNNTrainer:
 
     def extract_features_from_report(self, report: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Extract numerical features from a report document
+        Extract numerical features from a single report document.
+        Bulk callers should use report_features.extract_features_batch.
         """
-        features = {}
-
-        try:
-            # Basic text features
-            title = report.get('title', '')
-            search_query = report.get('searchQuery', '')
-            description = report.get('report', {}).get('description', '')
-
-            # Length features
-            features['title_length'] = len(str(title))
-            features['query_length'] = len(str(search_query))
-            features['description_length'] = len(str(description))
-
-            # Content analysis features
-            full_text = f"{title} {search_query} {description}".lower()
-
-            # Keyword density features
-            business_keywords = ['empresa', 'negócio', 'mercado', 'cliente', 'produto', 'serviço']
-            tech_keywords = ['tecnologia', 'digital', 'software', 'app', 'web']
-            finance_keywords = ['financeiro', 'investimento', 'lucro', 'custo']
-
-            features['business_keyword_density'] = sum(1 for kw in business_keywords if kw in full_text)
-            features['tech_keyword_density'] = sum(1 for kw in tech_keywords if kw in full_text)
-            features['finance_keyword_density'] = sum(1 for kw in finance_keywords if kw in full_text)
-
-            # Report structure features
-            report_data = report.get('report', {})
-
-            # Opportunities and challenges
-            opportunities = report_data.get('opportunities', [])
-            challenges = report_data.get('challenges', [])
-            recommendations = report_data.get('recommendations', [])
-
-            features['opportunities_count'] = len(opportunities) if isinstance(opportunities, list) else 0
-            features['challenges_count'] = len(challenges) if isinstance(challenges, list) else 0
-            features['recommendations_count'] = len(recommendations) if isinstance(recommendations, list) else 0
-
-            # Market analysis features
-            customer_segments = report_data.get('customerSegments', [])
-            key_players = report_data.get('keyPlayers', [])
-
-            features['customer_segments_count'] = len(customer_segments) if isinstance(customer_segments, list) else 0
-            features['key_players_count'] = len(key_players) if isinstance(key_players, list) else 0
-
-            # Target audience features
-            target_audience = report_data.get('targetAudience', [])
-            if isinstance(target_audience, list):
-                features['target_audience_size'] = len(target_audience)
-                features['target_audience_diversity'] = len(set(str(ta).lower() for ta in target_audience))
-            else:
-                features['target_audience_size'] = 0
-                features['target_audience_diversity'] = 0
-
-            # Competitive analysis
-            strengths = report_data.get('strengths', [])
-            weaknesses = report_data.get('weaknesses', [])
-
-            features['strengths_count'] = len(strengths) if isinstance(strengths, list) else 0
-            features['weaknesses_count'] = len(weaknesses) if isinstance(weaknesses, list) else 0
+        row = extract_features_batch([report])[0]
+        return {name: float(value) for name, value in zip(FEATURE_NAMES, row)}
 
-            # Data quality score
-            data_quality = report_data.get('dataQuality', 'no_evidence')
-            features['data_quality_score'] = 1 if data_quality == 'verified' else 0
+    @staticmethod
+    def extract_batch(reports: List[Dict[str, Any]], out: np.ndarray) -> np.ndarray:
+        """Write a batch's columnar features into out and return its synthetic labels"""
+        return synthetic_labels(extract_features_batch(reports, out=out))
 
-            # Sources count
-            sources = report_data.get('sources', [])
-            features['sources_count'] = len(sources) if isinstance(sources, list) else 0
-
-        except Exception as e:
-            logger.warning(f"Error extracting features from report: {e}")
-            # Return default features
-            features = {f'feature_{i}': 0 for i in range(20)}
-
-        return features
-
-    def collect_training_data(self, limit: int = None) -> Tuple[np.ndarray, np.ndarray, list]:
+    def collect_training_data(
+        self,
+        limit: int = None,
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Tuple[np.ndarray, np.ndarray, list]:
         """
-        Collect and preprocess training data from MongoDB
+        Collect and preprocess training data from MongoDB.
+        Reports are streamed with a projection and extracted column-wise,
+        batch by batch, into a preallocated float32 matrix. With more than
+        one feature worker and more than one batch of reports, batches are
+        extracted by a process pool from raw BSON.
+        Without a limit, rows come from the incremental feature store, which
+        only extracts reports changed since its last refresh.
         """
         logger.info("Collecting training data from MongoDB...")
 
         try:
+            if self.feature_store_dir and not limit:
+                store = ReportFeatureStore(self.feature_store_dir)
+                store.refresh(self.collection, self.feature_workers, batch_size)
+                if len(store) == 0:
+                    raise ValueError("No reports found in database")
+
+                X = store.features
+                y = synthetic_labels(X)
+                unique_labels = np.unique(y).tolist()
+
+                logger.info(f"Loaded {X.shape[0]} samples with {X.shape[1]} features from the feature store")
+                logger.info(f"Label distribution: {pd.Series(y).value_counts().to_dict()}")
+                return X, y, unique_labels
+
             # Query reports with labels (this assumes reports have some classification)
             # In a real scenario, you'd have labeled data or use clustering
-            cursor = self.collection.find({})
+            query = {}
+            expected_rows = self.collection.count_documents(query, limit=limit) if limit \
+                else self.collection.count_documents(query)
+            logger.info(f"Found {expected_rows} reports in database")
 
-            if limit:
-                cursor = cursor.limit(limit)
+            if expected_rows == 0:
+                raise ValueError("No reports found in database")
 
-            reports = list(cursor)
-            logger.info(f"Found {len(reports)} reports in database")
+            parallel = self.feature_workers > 1 and expected_rows > batch_size
+            collection = self.collection
+            if parallel:
+                # Leave BSON decoding to the workers
+                collection = collection.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
 
-            if len(reports) == 0:
-                raise ValueError("No reports found in database")
+            cursor = collection.find(query, projection=REPORT_PROJECTION, batch_size=batch_size)
+            if limit:
+                cursor = cursor.limit(limit)
 
             # Extract features and create synthetic labels for demonstration
             # In production, you'd have real labels from user feedback or expert classification
-            feature_data = []
-            labels = []
-
-            for i, report in enumerate(reports):
-                features = self.extract_features_from_report(report)
-
-                # Convert features to numerical values
-                feature_vector = []
-                for key in sorted(features.keys()):
-                    value = features[key]
-                    if isinstance(value, (int, float)):
-                        feature_vector.append(float(value))
-                    else:
-                        # Convert strings to hash-like numerical values
-                        feature_vector.append(hash(str(value)) % 1000 / 1000.0)
-
-                feature_data.append(feature_vector)
-
-                # Create synthetic labels based on content analysis
-                # This is a simplified approach - in production use real labels
-                if features.get('tech_keyword_density', 0) > features.get('business_keyword_density', 0):
-                    labels.append('technology')
-                elif features.get('finance_keyword_density', 0) > 1:
-                    labels.append('finance')
-                elif features.get('customer_segments_count', 0) > 2:
-                    labels.append('b2b')
-                else:
-                    labels.append('general')
-
-            # Convert to numpy arrays
-            X = np.array(feature_data)
-            y = np.array(labels)
+            if parallel:
+                X = extract_features_parallel(cursor, self.feature_workers, expected_rows, batch_size)
+                y = synthetic_labels(X)
+            else:
+                X, y = stream_batches(
+                    cursor,
+                    self.extract_batch,
+                    n_features=len(FEATURE_NAMES),
+                    expected_rows=expected_rows,
+                    batch_size=batch_size
+                )
 
             # Get unique labels for reference
-            unique_labels = list(set(labels))
+            unique_labels = np.unique(y).tolist()
 
             logger.info(f"Extracted {X.shape[0]} samples with {X.shape[1]} features")
-            logger.info(f"Label distribution: {pd.Series(labels).value_counts().to_dict()}")
+            logger.info(f"Label distribution: {pd.Series(y).value_counts().to_dict()}")
 
             return X, y, unique_labels
 
@@ -278,7 +235,8 @@ class EnhancedKNNTrainer:
                 for issue in data_validation['data_quality_issues']:
                     logger.warning(f"  - {issue}")
 
-            # Split data
+            # Split data once; training evaluates on this test set and
+            # cross-validates on the tuning folds
             X_train, X_test, y_train, y_test = train_test_split(
                 X, y, test_size=test_size, random_state=random_state, stratify=y
             )
@@ -289,19 +247,18 @@ class EnhancedKNNTrainer:
             # Initialize enhanced KNN
             knn_service = EnhancedKNNService()
 
-            # Train the model
+            # Train, evaluate and cross-validate (also saves the model)
             training_results = knn_service.train_enhanced(
                 X_train, y_train,
                 use_grid_search=use_grid_search,
                 use_ensemble=use_ensemble,
-                cv_folds=5
+                cv_folds=5,
+                validation_data=(X_test, y_test),
+                cv_scoring=CV_METRICS
             )
-
-            # Evaluate on test set
-            test_evaluation = knn_service.evaluate_detailed(X_test, y_test)
-
-            # Cross-validation on full training set
-            cv_results = knn_service.cross_validate(X_train, y_train, cv=5)
+            test_evaluation = training_results['evaluation']
+            cv_results = training_results['cross_validation']
+            cv_means = {metric: scores['mean'] for metric, scores in cv_results.items()}
 
             # Compile comprehensive results
             results = {
@@ -317,8 +274,8 @@ class EnhancedKNNTrainer:
                 'data_validation': data_validation,
                 'model_training': {
                     'best_params': training_results.get('best_params'),
-                    'training_accuracy': training_results['evaluation']['accuracy'],
-                    'training_f1_macro': training_results['evaluation']['f1_macro'],
+                    'training_accuracy': cv_means.get('accuracy'),
+                    'training_f1_macro': cv_means.get('f1_macro'),
                     'use_grid_search': use_grid_search,
                     'use_ensemble': use_ensemble
                 },
@@ -328,13 +285,10 @@ class EnhancedKNNTrainer:
                 'feature_importance': knn_service.get_feature_importance()
             }
 
-            # Save model
-            knn_service.save_model()
-
             # Generate evaluation plots
             self.generate_evaluation_plots(
                 test_evaluation,
-                training_results.get('evaluation', {}),
+                cv_means,
                 f"evaluation_plots_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
             )
 
@@ -430,9 +384,9 @@ def main():
         print("=" * 50)
         print(f"Samples: {results['data_info']['total_samples']}")
         print(f"Features: {results['data_info']['features_count']}")
-        print(f"Labels: {results['data_info']['unique_labels']}")
-        print(".4f")
-        print(".4f")
+        print(f"Labels: {len(results['data_info']['label_classes'])}")
+        print(f"Test Accuracy: {results['test_evaluation']['accuracy']:.4f}")
+        print(f"Test F1-Score: {results['test_evaluation']['f1_macro']:.4f}")
         print(f"Best Params: {results['model_training']['best_params']}")
         print("=" * 50)
 
@@ -0,0 +1,140 @@
+"""
+Deterministic encoding of non-numeric feature values
+Python's hash() of a string is salted per process, so hash-based feature
+values differ between the trainer and the serving process. Here string
+values are dictionary-encoded against vocabularies learned at training time
+or, for high-cardinality columns, bucketed with CRC-32, which is stable
+across processes and platforms. The fitted encoder is plain data saved next
+to the model, and it encodes a column at a time, so single rows and large
+batches go through the same code.
+"""
+
+import json
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+HASH_BUCKETS = 1000
+MAX_CATEGORIES = 1000
+
+def stable_hash(values: Any, n_buckets: int = HASH_BUCKETS) -> np.ndarray:
+    """Deterministic bucket of str(value) for every value, scaled to [0, 1)"""
+    uniques, inverse = np.unique(np.array([str(value) for value in values], dtype=object), return_inverse=True)
+    buckets = np.fromiter(
+        (zlib.crc32(value.encode('utf-8')) % n_buckets for value in uniques),
+        dtype=np.float64, count=len(uniques)
+    )
+    return buckets[inverse] / n_buckets
+
+def as_feature_array(rows: Any) -> np.ndarray:
+    """
+    2-D float array when every value is numeric, otherwise an object array
+    that keeps strings intact for FeatureEncoder
+    """
+    if isinstance(rows, np.ndarray) and rows.dtype.kind in 'biuf':
+        return np.atleast_2d(rows)
+
+    array = np.atleast_2d(np.array(rows, dtype=object))
+    if any(isinstance(value, str) for value in array.flat):
+        return array
+    return array.astype(np.float64)
+
+class FeatureEncoder:
+    """
+    Maps feature rows that may contain strings to a float matrix.
+    Numeric columns pass through; string columns become vocabulary codes
+    (unseen values share the code len(vocabulary)) or stable hash buckets.
+    """
+
+    def __init__(self, n_buckets: int = HASH_BUCKETS, max_categories: int = MAX_CATEGORIES):
+        self.n_buckets = n_buckets
+        self.max_categories = max_categories
+        self.n_features: Optional[int] = None
+        self.vocabularies: Dict[int, List[str]] = {}
+        self.hashed_columns: List[int] = []
+        self._codes: Dict[int, Dict[str, int]] = {}
+
+    @property
+    def is_identity(self) -> bool:
+        """True when no column needs encoding"""
+        return not self.vocabularies and not self.hashed_columns
+
+    def fit(self, X: Any) -> 'FeatureEncoder':
+        X = as_feature_array(X)
+        self.n_features = X.shape[1]
+        self.vocabularies, self.hashed_columns = {}, []
+
+        if X.dtype == object:
+            for column in range(X.shape[1]):
+                values = X[:, column]
+                if not any(isinstance(value, str) for value in values):
+                    continue
+                vocabulary = sorted({str(value) for value in values})
+                if len(vocabulary) > self.max_categories:
+                    self.hashed_columns.append(column)
+                else:
+                    self.vocabularies[column] = vocabulary
+
+        self._build_codes()
+        return self
+
+    def _build_codes(self):
+        self._codes = {
+            column: {value: code for code, value in enumerate(vocabulary)}
+            for column, vocabulary in self.vocabularies.items()
+        }
+
+    def transform(self, X: Any) -> np.ndarray:
+        X = as_feature_array(X)
+        if self.n_features is not None and X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        if self.is_identity:
+            return X.astype(np.float64, copy=False)
+
+        encoded = np.empty(X.shape, dtype=np.float64)
+        for column in range(X.shape[1]):
+            values = X[:, column]
+            if column in self._codes:
+                codes = self._codes[column]
+                uniques, inverse = np.unique(np.array([str(value) for value in values], dtype=object),
+                                             return_inverse=True)
+                unique_codes = np.fromiter(
+                    (codes.get(value, len(codes)) for value in uniques), dtype=np.float64, count=len(uniques)
+                )
+                encoded[:, column] = unique_codes[inverse]
+            elif column in self.hashed_columns:
+                encoded[:, column] = stable_hash(values, self.n_buckets)
+            else:
+                encoded[:, column] = values.astype(np.float64)
+        return encoded
+
+    def fit_transform(self, X: Any) -> np.ndarray:
+        return self.fit(X).transform(X)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'n_features': self.n_features,
+            'n_buckets': self.n_buckets,
+            'max_categories': self.max_categories,
+            'vocabularies': {str(column): vocabulary for column, vocabulary in self.vocabularies.items()},
+            'hashed_columns': self.hashed_columns
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FeatureEncoder':
+        encoder = cls(data['n_buckets'], data['max_categories'])
+        encoder.n_features = data['n_features']
+        encoder.vocabularies = {int(column): vocabulary for column, vocabulary in data['vocabularies'].items()}
+        encoder.hashed_columns = list(data['hashed_columns'])
+        encoder._build_codes()
+        return encoder
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> 'FeatureEncoder':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,203 @@
+"""
+Incremental on-disk store of report feature rows
+Rows are keyed by report _id and versioned by updatedAt. Each refresh only
+reads reports changed since the stored high-water mark, extracts their
+features and upserts them, so retraining cost follows the delta instead of
+the whole reports history. The store is columnar: ids.npy, versions.npy and
+features.npy, plus meta.json, which is written last and marks a complete
+set of files.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from mongo_loader import DEFAULT_BATCH_SIZE
+from parallel_features import extract_keyed_block, iter_feature_blocks
+from report_features import FEATURE_NAMES, REPORT_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT_VERSION = 1
+
+# Feature fields plus the store key and version
+STORE_PROJECTION = {**REPORT_PROJECTION, '_id': 1, 'updatedAt': 1, 'createdAt': 1}
+
+# Changes are re-read from a little before the high-water mark, so writes
+# that commit out of timestamp order are not missed; upserts are idempotent
+DEFAULT_OVERLAP = timedelta(minutes=1)
+
+def _dedupe_last(ids: np.ndarray) -> np.ndarray:
+    """Indices of the last occurrence of every id, in stream order"""
+    _, reversed_index = np.unique(ids[::-1], return_index=True)
+    return np.sort(len(ids) - 1 - reversed_index)
+
+class ReportFeatureStore:
+    """Columnar report feature rows persisted in a directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.ids = np.empty(0, dtype='S24')
+        self.versions = np.empty(0, dtype='datetime64[ms]')
+        self.features = np.empty((0, len(FEATURE_NAMES)), dtype=np.float32)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def high_water_mark(self) -> Optional[datetime]:
+        """Latest report version in the store"""
+        versions = self.versions[~np.isnat(self.versions)]
+        if not len(versions):
+            return None
+        return versions.max().astype(datetime)
+
+    def load(self) -> bool:
+        """
+        Read the stored columns. A missing store, or one written with another
+        format or feature schema, loads as empty and is rebuilt on refresh.
+        """
+        try:
+            with open(self._path('meta.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return False
+
+        if meta.get('format_version') != STORE_FORMAT_VERSION or meta.get('feature_names') != FEATURE_NAMES:
+            logger.info("Feature store schema changed, rebuilding")
+            return False
+
+        ids = np.load(self._path('ids.npy'))
+        versions = np.load(self._path('versions.npy'))
+        features = np.load(self._path('features.npy'))
+        if not len(ids) == len(versions) == len(features) == meta.get('rows'):
+            logger.warning("Feature store files are inconsistent, rebuilding")
+            return False
+
+        self.ids, self.versions, self.features = ids, versions, features
+        return True
+
+    def save(self):
+        """Write each column atomically, then meta.json"""
+        os.makedirs(self.directory, exist_ok=True)
+        for name, array in [('ids', self.ids), ('versions', self.versions), ('features', self.features)]:
+            tmp_path = self._path(f'{name}.tmp.npy')
+            np.save(tmp_path, array)
+            os.replace(tmp_path, self._path(f'{name}.npy'))
+
+        high_water_mark = self.high_water_mark
+        meta = {
+            'format_version': STORE_FORMAT_VERSION,
+            'feature_names': FEATURE_NAMES,
+            'rows': len(self),
+            'high_water_mark': high_water_mark.isoformat() if high_water_mark else None,
+            'saved_at': datetime.now().isoformat()
+        }
+        tmp_path = self._path('meta.tmp.json')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, self._path('meta.json'))
+
+    def delta_query(self, overlap: timedelta = DEFAULT_OVERLAP) -> Dict[str, Any]:
+        """Query for reports changed since the high-water mark (all reports when empty)"""
+        high_water_mark = self.high_water_mark
+        if high_water_mark is None:
+            return {}
+
+        since = high_water_mark - overlap
+        return {'$or': [
+            {'updatedAt': {'$gte': since}},
+            {'updatedAt': {'$exists': False}, 'createdAt': {'$gte': since}}
+        ]}
+
+    def upsert(self, ids: np.ndarray, versions: np.ndarray, features: np.ndarray) -> Tuple[int, int]:
+        """
+        Replace rows whose id is stored with an older version and append the
+        rest. Returns (added, updated).
+        """
+        if not len(ids):
+            return 0, 0
+
+        keep = _dedupe_last(ids)
+        ids, versions, features = ids[keep], versions[keep], features[keep]
+
+        found = np.zeros(len(ids), dtype=bool)
+        updated = 0
+        if len(self):
+            order = np.argsort(self.ids, kind='stable')
+            sorted_ids = self.ids[order]
+            positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+            found = sorted_ids[positions] == ids
+            rows = order[positions[found]]
+
+            # Rows re-read from the overlap window are unchanged
+            changed = self.versions[rows] != versions[found]
+            updated = int(changed.sum())
+            self.versions[rows[changed]] = versions[found][changed]
+            self.features[rows[changed]] = features[found][changed]
+
+        new = ~found
+        self.ids = np.concatenate([self.ids, ids[new]])
+        self.versions = np.concatenate([self.versions, versions[new]])
+        self.features = np.concatenate([self.features, features[new]])
+        return int(new.sum()), updated
+
+    def remove_missing(self, live_ids: np.ndarray) -> int:
+        """Drop rows whose report no longer exists. Returns the number removed."""
+        keep = np.isin(self.ids, live_ids)
+        removed = int((~keep).sum())
+        if removed:
+            self.ids, self.versions, self.features = self.ids[keep], self.versions[keep], self.features[keep]
+        return removed
+
+    def refresh(
+        self,
+        collection,
+        n_workers: Optional[int] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        overlap: timedelta = DEFAULT_OVERLAP
+    ) -> Dict[str, int]:
+        """
+        Bring the store up to date with a reports collection and persist it.
+        Only reports changed since the high-water mark are read and
+        extracted; deletions are detected by comparing row counts, and only
+        then are the live ids listed.
+        """
+        loaded = self.load()
+        query = self.delta_query(overlap)
+        raw_collection = collection.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+        cursor = raw_collection.find(query, projection=STORE_PROJECTION, batch_size=batch_size)
+
+        blocks = list(iter_feature_blocks(cursor, n_workers, batch_size, block_fn=extract_keyed_block))
+        read = sum(len(ids) for ids, _, _ in blocks)
+        added = updated = 0
+        if blocks:
+            added, updated = self.upsert(
+                np.concatenate([ids for ids, _, _ in blocks]),
+                np.concatenate([versions for _, versions, _ in blocks]),
+                np.concatenate([features for _, _, features in blocks])
+            )
+
+        removed = 0
+        if collection.count_documents({}) != len(self):
+            live_ids = np.array(
+                [str(document['_id']).encode() for document in collection.find({}, projection={'_id': 1})],
+                dtype=bytes
+            )
+            removed = self.remove_missing(live_ids)
+
+        if added or updated or removed or not loaded:
+            self.save()
+
+        stats = {'read': read, 'added': added, 'updated': updated, 'removed': removed, 'rows': len(self)}
+        logger.info(f"Feature store refreshed: {stats}")
+        return stats
@@ -0,0 +1,90 @@
+"""
+Import-time startup report
+Imports a module in a fresh interpreter under `python -X importtime` and
+summarizes the output: total import time, the slowest direct imports by
+cumulative time, and which modules that should stay off the serving path
+(plotting, dataframes, tuning) were pulled in anyway. Run as a script to
+print the report for the serving entry point:
+
+    python import_report.py [module] [top]
+"""
+
+import logging
+import os
+import re
+import subprocess
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Loaded on first use by training, evaluation and plotting code; the
+# serving process should never import them at startup
+DEFERRED_MODULES = ('matplotlib', 'seaborn', 'pandas', 'neighbor_graph_search')
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """
+    One {"module", "self_us", "cumulative_us", "depth"} entry per line of
+    -X importtime output, in the order modules finished importing
+    """
+    entries = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append({
+                'module': module,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                'depth': (len(indent) - 1) // 2
+            })
+    return entries
+
+def loaded_modules(names: Iterable[str] = DEFERRED_MODULES, modules: Optional[Iterable[str]] = None) -> List[str]:
+    """The given top-level names that are imported (sys.modules by default)"""
+    loaded = {module.split('.')[0] for module in (sys.modules if modules is None else modules)}
+    return [name for name in names if name in loaded]
+
+def import_report(module: str = 'enhanced_main', top: int = 10, cwd: Optional[str] = None) -> Dict[str, Any]:
+    """Import module in a fresh interpreter with -X importtime and summarize it"""
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, capture_output=True, text=True, check=True
+    )
+    entries = parse_importtime(completed.stderr)
+    imported = [entry['module'] for entry in entries]
+    roots = [entry for entry in entries if entry['depth'] == 0]
+    # The module itself and what it imports directly
+    direct = [entry for entry in entries if entry['depth'] <= 1]
+
+    return {
+        'module': module,
+        'total_us': sum(entry['cumulative_us'] for entry in roots),
+        'modules_imported': len(entries),
+        'slowest': sorted(direct, key=lambda entry: entry['cumulative_us'], reverse=True)[:top],
+        'deferred_loaded': loaded_modules(DEFERRED_MODULES, imported)
+    }
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"Import of {report['module']}: {report['total_us'] / 1000:.1f}ms, "
+        f"{report['modules_imported']} modules",
+        f"{'cumulative_us':>14} | {'self_us':>8} | module"
+    ]
+    lines += [
+        f"{entry['cumulative_us']:>14} | {entry['self_us']:>8} | {entry['module']}"
+        for entry in report['slowest']
+    ]
+    lines.append(f"Deferred modules imported: {', '.join(report['deferred_loaded']) or 'none'}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    report = import_report(
+        sys.argv[1] if len(sys.argv) > 1 else 'enhanced_main',
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    )
+    logger.info(format_report(report))
@@ -0,0 +1,108 @@
+"""
+Bounded worker pool for CPU-bound inference
+Keeps neighbor searches off the asyncio event loop and rejects work fast
+when the pool is saturated instead of letting requests pile up
+"""
+
+import os
+import asyncio
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class PoolSaturatedError(Exception):
+    """Raised when the pool has no free worker and its queue is full"""
+
+class InferencePool:
+    """
+    Thread pool with a bounded queue and basic metrics.
+    NumPy and scikit-learn release the GIL inside their distance kernels,
+    so threads give real parallelism while sharing the loaded model.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_workers = max_workers or int(
+            os.getenv("KNN_INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1)))
+        )
+        self.max_queue = max_queue if max_queue is not None else int(
+            os.getenv("KNN_INFERENCE_QUEUE_SIZE", "64")
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="knn-inference"
+        )
+
+        self._lock = threading.Lock()
+        self._pending = 0  # submitted and not finished (queued + running)
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) on a worker thread and await its result.
+        Raises PoolSaturatedError immediately when the queue is full.
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                raise PoolSaturatedError(
+                    f"Inference pool saturated ({self._pending} pending, capacity {self.capacity})"
+                )
+            self._pending += 1
+
+        submitted_at = time.perf_counter()
+
+        def timed_call():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                wait = started_at - submitted_at
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._total_run += time.perf_counter() - started_at
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, timed_call)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of queue depth, wait time and throughput counters"""
+        with self._lock:
+            completed = self._completed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": max(0, self._pending - self._running),
+                "completed": completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": (self._total_wait / completed * 1000) if completed else 0.0,
+                "max_wait_ms": self._max_wait * 1000,
+                "avg_run_ms": (self._total_run / completed * 1000) if completed else 0.0
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and release the worker threads"""
+        self._executor.shutdown(wait=wait)
+        logger.info("Inference pool shut down")
@@ -0,0 +1,53 @@
+"""
+NumPy-only KNN voting
+Turns a neighbor graph (distances + neighbor label codes) into class
+probabilities exactly like scikit-learn's KNeighborsClassifier.predict_proba
+"""
+
+import numpy as np
+
+def neighbor_weights(distances: np.ndarray, weights: str = 'uniform') -> np.ndarray:
+    """
+    Vote weight of every neighbor. 'distance' uses 1/d; a query with an exact
+    match (d == 0) gives its whole vote to the matching neighbors.
+    """
+    if weights == 'uniform':
+        return np.ones_like(distances)
+    if weights != 'distance':
+        raise ValueError(f"Unsupported weights: {weights}")
+
+    with np.errstate(divide='ignore'):
+        inverse = 1.0 / distances
+    inf_mask = np.isinf(inverse)
+    inf_rows = inf_mask.any(axis=1)
+    inverse[inf_rows] = inf_mask[inf_rows]
+    return inverse
+
+def vote_proba(neighbor_labels: np.ndarray, vote_weights: np.ndarray, n_classes: int) -> np.ndarray:
+    """
+    Weighted class votes per query, normalized to probabilities.
+    neighbor_labels holds class codes in [0, n_classes), shape (n_queries, k).
+    """
+    n_queries = neighbor_labels.shape[0]
+    flat_index = (np.arange(n_queries)[:, None] * n_classes + neighbor_labels).ravel()
+    proba = np.bincount(
+        flat_index,
+        weights=vote_weights.ravel(),
+        minlength=n_queries * n_classes
+    ).reshape(n_queries, n_classes)
+
+    normalizer = proba.sum(axis=1, keepdims=True)
+    normalizer[normalizer == 0.0] = 1.0
+    proba /= normalizer
+    return proba
+
+def knn_proba(
+    distances: np.ndarray,
+    neighbor_labels: np.ndarray,
+    n_classes: int,
+    n_neighbors: int,
+    weights: str = 'uniform'
+) -> np.ndarray:
+    """Probabilities from the first n_neighbors columns of a sorted neighbor graph"""
+    distances = distances[:, :n_neighbors]
+    return vote_proba(neighbor_labels[:, :n_neighbors], neighbor_weights(distances, weights), n_classes)
@@ -3,6 +3,7 @@ from pydantic import BaseModel
 import numpy as np
 import uvicorn
 from knn_service import knn_service
+from ranking import rank_classes
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI()
@@ -39,18 +40,10 @@ async def predict_niche(input_data: FeatureInput):
             knn_service.load_model()
 
         # Get prediction probabilities from the model
-        probs = knn_service.model.predict_proba(features)[0]
+        probs = knn_service.model.predict_proba(features)
 
-        # Get the indices of the top 5 highest probabilities
-        top5_indices = np.argsort(probs)[-5:][::-1]
-
-        # Prepare the top 5 recommendations with their probabilities
-        recommendations = []
-        for idx in top5_indices:
-            recommendations.append({
-                "niche": knn_service.model.classes_[idx],
-                "probability": float(probs[idx])
-            })
+        # Top 5 recommendations with their probabilities
+        recommendations = rank_classes(probs, knn_service.model.classes_, 5)[0]
 
         # Return the recommendations as a JSON response
         return {"recommendations": recommendations}
@@ -61,9 +54,9 @@ async def predict_niche(input_data: FeatureInput):
 
 @app.post("/retrain")
 async def retrain_model():
-    from train_from_db import train_model_from_db
+    from train_from_db import load_training_data
     try:
-        X, y = train_model_from_db()
+        X, y = load_training_data()
         accuracy = knn_service.train(X, y)
         return {"message": "Modelo treinado com sucesso!", "accuracy": accuracy}
     except Exception as e:
@@ -0,0 +1,156 @@
+"""
+Streaming MongoDB readers for training data
+Documents are read with a projection and a cursor batch size and written
+chunk by chunk into a preallocated float32 matrix, so memory stays bounded
+by the matrix itself instead of every document plus Python lists of lists.
+
+dtype contract: every loader returns float32 features unless dtype is
+given. Values are rounded to float32 precision (about 7 significant
+digits); integer features up to 2**24 are exact. Callers that need float64
+arithmetic cast the matrix or pass dtype=np.float64, which reproduces
+np.array(list_of_rows) exactly.
+"""
+
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+class ChunkedMatrixBuilder:
+    """Preallocated (n_rows, n_features) matrix filled in row chunks"""
+
+    def __init__(self, n_features: int, expected_rows: int = 0, dtype=np.float32):
+        self.n_features = n_features
+        self.dtype = dtype
+        self._matrix = np.empty((max(expected_rows, 1), n_features), dtype=dtype)
+        self._rows = 0
+
+    def reserve(self, n_rows: int) -> np.ndarray:
+        """
+        Writable view of the next n_rows rows, growing geometrically if the
+        estimate was low. The rows count once committed with commit(n_rows).
+        """
+        end = self._rows + n_rows
+        if end > len(self._matrix):
+            grown = np.empty((max(end, 2 * len(self._matrix)), self.n_features), dtype=self.dtype)
+            grown[:self._rows] = self._matrix[:self._rows]
+            self._matrix = grown
+        return self._matrix[self._rows:end]
+
+    def commit(self, n_rows: int):
+        self._rows += n_rows
+
+    def append(self, rows: Sequence[Sequence[float]]):
+        """Copy a chunk of rows in"""
+        if not len(rows):
+            return
+        chunk = np.asarray(rows, dtype=self.dtype)
+        if chunk.ndim != 2 or chunk.shape[1] != self.n_features:
+            raise ValueError(f"Expected rows with {self.n_features} features, got shape {chunk.shape}")
+
+        self.reserve(len(chunk))[:] = chunk
+        self.commit(len(chunk))
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def result(self) -> np.ndarray:
+        """The filled rows (a view when the estimate was exact)"""
+        return self._matrix[:self._rows]
+
+def stream_rows(
+    documents: Iterable[Dict[str, Any]],
+    row_fn: Callable[[Dict[str, Any]], Tuple[Sequence[float], Any]],
+    n_features: Optional[int] = None,
+    expected_rows: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    dtype=np.float32
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turn a document stream into (X, y). row_fn maps one document to
+    (feature_row, label); rows are buffered batch_size at a time.
+    n_features defaults to the width of the first row.
+    """
+    builder: Optional[ChunkedMatrixBuilder] = None
+    labels: List[Any] = []
+    chunk: List[Sequence[float]] = []
+
+    for document in documents:
+        row, label = row_fn(document)
+        if builder is None:
+            builder = ChunkedMatrixBuilder(n_features or len(row), expected_rows, dtype)
+        chunk.append(row)
+        labels.append(label)
+
+        if len(chunk) >= batch_size:
+            builder.append(chunk)
+            chunk = []
+
+    if builder is None:
+        return np.empty((0, n_features or 0), dtype=dtype), np.array([])
+
+    builder.append(chunk)
+    return builder.result(), np.array(labels)
+
+def stream_batches(
+    documents: Iterable[Dict[str, Any]],
+    batch_fn: Callable[[List[Dict[str, Any]], np.ndarray], np.ndarray],
+    n_features: int,
+    expected_rows: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    dtype=np.float32
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Like stream_rows, for columnar extractors: batch_fn(documents, out)
+    writes the batch's features directly into `out`, a view of the
+    preallocated matrix, and returns the batch's labels
+    """
+    builder = ChunkedMatrixBuilder(n_features, expected_rows, dtype)
+    label_blocks: List[np.ndarray] = []
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        label_blocks.append(batch_fn(batch, builder.reserve(len(batch))))
+        builder.commit(len(batch))
+
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+
+    y = np.concatenate(label_blocks) if label_blocks else np.array([])
+    return builder.result(), y
+
+def _training_row(document: Dict[str, Any]) -> Tuple[Sequence[float], Any]:
+    if "features" not in document or "label" not in document:
+        raise ValueError("Alguns documentos não possuem 'features' ou 'label'.")
+    return document["features"], document["label"]
+
+def load_training_matrix(
+    collection,
+    query: Optional[Dict[str, Any]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    limit: Optional[int] = None,
+    dtype=np.float32
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stream a `training_data` collection ({features, label} documents) into a
+    feature matrix of the given dtype (float32 by default) and a label array
+    """
+    query = query or {}
+    expected_rows = collection.count_documents(query, limit=limit) if limit else collection.count_documents(query)
+
+    cursor = collection.find(query, projection={"features": 1, "label": 1, "_id": 0}, batch_size=batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    X, y = stream_rows(cursor, _training_row, expected_rows=expected_rows, batch_size=batch_size, dtype=dtype)
+    logger.info(f"Streamed {len(X)} training rows ({X.nbytes / 1e6:.1f} MB)")
+    return X, y
@@ -0,0 +1,218 @@
+"""
+Neighbor-graph hyperparameter search for KNN
+For every CV fold and distance metric the neighbor graph is computed once
+at the largest k in the grid; every smaller k and both weighting schemes are
+then scored by slicing that graph. Tuning cost becomes one neighbor search
+per (fold, metric) instead of one per (fold, candidate).
+"""
+
+import logging
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.metrics import (
+    accuracy_score,
+    balanced_accuracy_score,
+    f1_score,
+    precision_score,
+    recall_score
+)
+from sklearn.model_selection import ParameterGrid
+from sklearn.neighbors import NearestNeighbors
+
+from knn_voting import knn_proba
+
+logger = logging.getLogger(__name__)
+
+# Metric functions equivalent to scikit-learn's scorer strings
+SCORING_FUNCTIONS: Dict[str, Callable[[np.ndarray, np.ndarray], float]] = {
+    'accuracy': accuracy_score,
+    'balanced_accuracy': balanced_accuracy_score,
+    'f1_macro': partial(f1_score, average='macro'),
+    'f1_micro': partial(f1_score, average='micro'),
+    'f1_weighted': partial(f1_score, average='weighted'),
+    'precision_macro': partial(precision_score, average='macro'),
+    'precision_micro': partial(precision_score, average='micro'),
+    'precision_weighted': partial(precision_score, average='weighted'),
+    'recall_macro': partial(recall_score, average='macro'),
+    'recall_micro': partial(recall_score, average='micro'),
+    'recall_weighted': partial(recall_score, average='weighted')
+}
+
+# Parameters that define the neighbor graph; n_neighbors and weights only
+# change how the graph is read, algorithm/leaf_size never change results
+GRAPH_PARAMS = ('metric', 'p', 'metric_params')
+VOTE_PARAMS = ('n_neighbors', 'weights')
+SPEED_PARAMS = ('algorithm', 'leaf_size', 'n_jobs')
+
+def graph_key(params: Dict[str, Any]) -> Tuple:
+    """Hashable identity of the neighbor graph a candidate needs"""
+    metric_params = params.get('metric_params')
+    return (
+        params.get('metric', 'minkowski'),
+        params.get('p', 2),
+        tuple(sorted(metric_params.items())) if metric_params else None
+    )
+
+def supports(candidates: List[Dict[str, Any]], scoring: str) -> bool:
+    """True if every candidate and the scoring can be served from neighbor graphs"""
+    known = set(GRAPH_PARAMS + VOTE_PARAMS + SPEED_PARAMS)
+    return scoring in SCORING_FUNCTIONS and all(set(params) <= known for params in candidates)
+
+class NeighborGraphCache:
+    """
+    Sorted neighbor graphs of each fold's test rows against its train rows,
+    one per graph key, grown on demand to the largest k requested
+    """
+
+    def __init__(self, X: np.ndarray, y: np.ndarray, folds: List[Tuple[np.ndarray, np.ndarray]]):
+        self.X = X
+        self.classes, self.y_codes = np.unique(y, return_inverse=True)
+        self.folds = folds
+        self._graphs: Dict[Tuple[int, Tuple], Tuple[np.ndarray, np.ndarray]] = {}
+        self.searches = 0
+
+    @classmethod
+    def from_cv(cls, X: np.ndarray, y: np.ndarray, cv_strategy) -> 'NeighborGraphCache':
+        return cls(X, y, list(cv_strategy.split(X, y)))
+
+    @property
+    def n_classes(self) -> int:
+        return len(self.classes)
+
+    def graph(self, fold: int, key: Tuple, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(distances, neighbor label codes) with at least k columns when available"""
+        train_idx, test_idx = self.folds[fold]
+        k = min(k, len(train_idx))
+
+        cached = self._graphs.get((fold, key))
+        if cached is None or cached[0].shape[1] < k:
+            metric, p, metric_params = key
+            index = NearestNeighbors(
+                n_neighbors=k,
+                metric=metric,
+                p=p,
+                metric_params=dict(metric_params) if metric_params else None
+            ).fit(self.X[train_idx])
+            distances, indices = index.kneighbors(self.X[test_idx])
+            cached = (distances, self.y_codes[train_idx][indices])
+            self._graphs[(fold, key)] = cached
+            self.searches += 1
+
+        return cached
+
+    def fold_proba(self, fold: int, params: Dict[str, Any]) -> np.ndarray:
+        """Class probabilities for a fold's test rows under one candidate"""
+        n_neighbors = params.get('n_neighbors', 5)
+        distances, labels = self.graph(fold, graph_key(params), n_neighbors)
+        return knn_proba(distances, labels, self.n_classes, n_neighbors, params.get('weights', 'uniform'))
+
+    def fold_predictions(self, fold: int, params: Dict[str, Any]) -> np.ndarray:
+        """Predicted class codes for a fold's test rows (ties go to the lowest code)"""
+        return np.argmax(self.fold_proba(fold, params), axis=1)
+
+    def test_labels(self, fold: int) -> np.ndarray:
+        return self.y_codes[self.folds[fold][1]]
+
+def warm_graphs(cache: NeighborGraphCache, candidates: List[Dict[str, Any]]):
+    """
+    Build each fold's graph once at the largest k any candidate will ask
+    for, so candidates scored later (even one at a time) only slice it
+    """
+    max_k: Dict[Tuple, int] = {}
+    for params in candidates:
+        key = graph_key(params)
+        max_k[key] = max(max_k.get(key, 0), params.get('n_neighbors', 5))
+    for fold in range(len(cache.folds)):
+        for key, k in max_k.items():
+            cache.graph(fold, key, k)
+
+def score_candidates(
+    cache: NeighborGraphCache,
+    candidates: List[Dict[str, Any]],
+    scoring: str
+) -> np.ndarray:
+    """Per-fold scores, shape (n_candidates, n_folds)"""
+    score_fn = SCORING_FUNCTIONS[scoring]
+    warm_graphs(cache, candidates)
+
+    scores = np.empty((len(candidates), len(cache.folds)))
+    for fold in range(len(cache.folds)):
+        y_true = cache.test_labels(fold)
+        for i, params in enumerate(candidates):
+            scores[i, fold] = score_fn(y_true, cache.fold_predictions(fold, params))
+    return scores
+
+def cross_validation_scores(
+    cache: NeighborGraphCache,
+    params: Dict[str, Any],
+    scoring: List[str]
+) -> Dict[str, np.ndarray]:
+    """
+    Per-fold scores of one candidate for several metrics, all computed from
+    the same fold predictions; no neighbor search if the graphs are cached
+    """
+    scores = {metric: np.empty(len(cache.folds)) for metric in scoring}
+    for fold in range(len(cache.folds)):
+        y_true = cache.test_labels(fold)
+        y_pred = cache.fold_predictions(fold, params)
+        for metric in scoring:
+            scores[metric][fold] = SCORING_FUNCTIONS[metric](y_true, y_pred)
+    return scores
+
+class NeighborGraphSearch:
+    """
+    Drop-in replacement for GridSearchCV(KNeighborsClassifier) when every
+    grid parameter is a KNN parameter and scoring is a known metric
+    """
+
+    def __init__(self, param_grid, cv_strategy, scoring: str = 'f1_macro'):
+        self.param_grid = param_grid
+        self.cv_strategy = cv_strategy
+        self.scoring = scoring
+
+        self.best_params_: Optional[Dict[str, Any]] = None
+        self.best_score_: Optional[float] = None
+        self.cv_results_: Optional[Dict[str, Any]] = None
+        self.cache_: Optional[NeighborGraphCache] = None
+
+    def fit(
+        self,
+        X: np.ndarray,
+        y: np.ndarray,
+        cache: Optional[NeighborGraphCache] = None
+    ) -> 'NeighborGraphSearch':
+        candidates = list(ParameterGrid(self.param_grid))
+        self.cache_ = cache if cache is not None else NeighborGraphCache.from_cv(X, y, self.cv_strategy)
+
+        scores = score_candidates(self.cache_, candidates, self.scoring)
+        means = scores.mean(axis=1)
+        stds = scores.std(axis=1)
+
+        # Same rank convention as GridSearchCV: ties share the lowest rank
+        order = np.argsort(-means, kind='stable')
+        ranks = np.empty(len(candidates), dtype=np.int32)
+        ranks[order] = np.arange(1, len(candidates) + 1)
+        for i in range(1, len(order)):
+            if means[order[i]] == means[order[i - 1]]:
+                ranks[order[i]] = ranks[order[i - 1]]
+
+        self.cv_results_ = {
+            'params': candidates,
+            'mean_test_score': means,
+            'std_test_score': stds,
+            'rank_test_score': ranks
+        }
+        for fold in range(scores.shape[1]):
+            self.cv_results_[f'split{fold}_test_score'] = scores[:, fold]
+
+        best = int(order[0])
+        self.best_params_ = candidates[best]
+        self.best_score_ = float(means[best])
+
+        logger.info(
+            f"Scored {len(candidates)} candidates x {scores.shape[1]} folds "
+            f"with {self.cache_.searches} neighbor searches"
+        )
+        return self
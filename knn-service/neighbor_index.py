@@ -0,0 +1,393 @@
+"""
+Pluggable neighbor indexes for KNN serving
+An index answers "k nearest training rows" queries. 'exact' wraps
+scikit-learn's NearestNeighbors; 'brute' is exact search as blocked matrix
+products in NumPy, in the dtype of the training rows (float32 for compact
+models); 'ivf' is an approximate inverted-file index in pure NumPy: training
+rows are partitioned by k-means into lists, and a query only scans the
+n_probe lists whose centroids are closest, so query cost stays flat as the
+training set grows. IndexedKNeighborsClassifier votes
+over any index exactly like KNeighborsClassifier does over its own search.
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+import joblib
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.neighbors import NearestNeighbors
+
+from knn_voting import knn_proba, neighbor_weights, vote_proba
+from runtime_model import BLOCK_ELEMENTS, SUPPORTED_METRICS, brute_kneighbors, row_distances
+
+logger = logging.getLogger(__name__)
+
+def _nearest_centroids(X: np.ndarray, centroids: np.ndarray, n_nearest: int = 1) -> np.ndarray:
+    """Indices of the n_nearest centroids (squared euclidean) for every row, computed in blocks"""
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    block = max(1, BLOCK_ELEMENTS // max(len(centroids), 1))
+    nearest = np.empty((len(X), n_nearest), dtype=np.intp)
+    for start in range(0, len(X), block):
+        chunk = X[start:start + block]
+        scores = centroid_norms - 2.0 * (chunk @ centroids.T)
+        if n_nearest == 1:
+            nearest[start:start + block, 0] = np.argmin(scores, axis=1)
+        else:
+            part = np.argpartition(scores, n_nearest - 1, axis=1)[:, :n_nearest]
+            order = np.argsort(np.take_along_axis(scores, part, axis=1), axis=1)
+            nearest[start:start + block] = np.take_along_axis(part, order, axis=1)
+    return nearest
+
+def kmeans(X: np.ndarray, n_clusters: int, n_iter: int = 10, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means centroids; empty clusters are reseeded from random rows"""
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), n_clusters, replace=False)].astype(np.float64)
+    for _ in range(n_iter):
+        assignment = _nearest_centroids(X, centroids)[:, 0]
+        counts = np.bincount(assignment, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        for column in range(X.shape[1]):
+            sums[:, column] = np.bincount(assignment, weights=X[:, column], minlength=n_clusters)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        centroids[empty] = X[rng.choice(len(X), int(empty.sum()))]
+    return centroids
+
+class NeighborIndex:
+    """Base class: fit on training rows, query sorted k nearest neighbors"""
+
+    name = 'base'
+
+    def __init__(self, metric: str = 'euclidean'):
+        if metric not in SUPPORTED_METRICS:
+            raise ValueError(f"Unsupported metric for neighbor index: {metric}")
+        self.metric = metric
+
+    def fit(self, X: np.ndarray) -> 'NeighborIndex':
+        raise NotImplementedError
+
+    @property
+    def dtype(self) -> np.dtype:
+        """dtype the training rows are stored and searched in"""
+        return self.vectors.dtype
+
+    def kneighbors(self, Q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(distances, indices), shape (len(Q), k), sorted by distance"""
+        raise NotImplementedError
+
+    def save(self, path: str):
+        """
+        Uncompressed joblib dump: every array is stored as a raw, aligned
+        buffer, so load_index can memory-map it
+        """
+        joblib.dump(self, path)
+
+def load_index(path: str, mmap_mode: Optional[str] = None) -> NeighborIndex:
+    """Load an index; with mmap_mode='r' its arrays are mapped, not copied"""
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+class ExactIndex(NeighborIndex):
+    """Exact search with scikit-learn's NearestNeighbors"""
+
+    name = 'exact'
+
+    def __init__(self, metric: str = 'euclidean', algorithm: str = 'auto'):
+        super().__init__(metric)
+        self.algorithm = algorithm
+        self._search: Optional[NearestNeighbors] = None
+
+    def fit(self, X: np.ndarray) -> 'ExactIndex':
+        self._search = NearestNeighbors(metric=self.metric, algorithm=self.algorithm).fit(X)
+        return self
+
+    def kneighbors(self, Q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self._search.kneighbors(Q, n_neighbors=min(k, self._search.n_samples_fit_))
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._search._fit_X.dtype
+
+class BruteForceIndex(NeighborIndex):
+    """
+    Exact search that ranks every training row with one matrix product per
+    block of queries. Rows keep the dtype they were fitted with, and queries
+    are cast to it, so float32 rows halve memory and bandwidth. Euclidean
+    ranking uses precomputed squared norms; the k winners are reported with
+    exact distances (see runtime_model.brute_kneighbors).
+    """
+
+    name = 'brute'
+
+    def __init__(self, metric: str = 'euclidean'):
+        super().__init__(metric)
+        self.vectors: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+
+    def fit(self, X: np.ndarray) -> 'BruteForceIndex':
+        self.vectors = np.ascontiguousarray(X)
+        if self.metric == 'euclidean':
+            self._norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        return self
+
+    def kneighbors(self, Q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return brute_kneighbors(self.vectors, Q, k, self.metric, self._norms)
+
+class IVFIndex(NeighborIndex):
+    """
+    Approximate inverted-file index. n_lists defaults to sqrt(n_rows);
+    n_probe trades recall for latency and can be changed after fitting.
+    Every row in the probed lists is ranked; the k winners are reported
+    with exact distances.
+    """
+
+    name = 'ivf'
+
+    def __init__(
+        self,
+        metric: str = 'euclidean',
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        n_iter: int = 10,
+        training_sample: int = 64,
+        seed: int = 0
+    ):
+        super().__init__(metric)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.training_sample = training_sample
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.vectors: Optional[np.ndarray] = None   # training rows grouped by list
+        self.ids: Optional[np.ndarray] = None       # original row index of each vector
+        self.offsets: Optional[np.ndarray] = None   # list i is vectors[offsets[i]:offsets[i + 1]]
+        self._norms: Optional[np.ndarray] = None    # squared norms of vectors, for euclidean scans
+
+    def fit(self, X: np.ndarray) -> 'IVFIndex':
+        X = np.asarray(X)
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(len(X)))), len(X))
+
+        # Centroids are learned on a sample of training_sample rows per list
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(X), n_lists * self.training_sample)
+        sample = X[rng.choice(len(X), sample_size, replace=False)] if sample_size < len(X) else X
+        self.centroids = kmeans(sample, n_lists, self.n_iter, self.seed)
+
+        assignment = _nearest_centroids(X, self.centroids)[:, 0]
+        self.ids = np.argsort(assignment, kind='stable')
+        self.vectors = X[self.ids]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        self.n_lists = n_lists
+        if self.metric == 'euclidean':
+            self._norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        return self
+
+    def _scan(self, query: np.ndarray, lists: np.ndarray, out: np.ndarray):
+        """
+        Ranking distances of the rows in each list to query, written to out.
+        Lists are contiguous, so each is scanned as a view without copying;
+        euclidean uses squared distances from precomputed norms.
+        """
+        position = 0
+        for list_id in lists:
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            block = self.vectors[start:end]
+            if self.metric == 'euclidean':
+                out[position:position + end - start] = self._norms[start:end] - 2.0 * (block @ query)
+            else:
+                out[position:position + end - start] = np.abs(block - query).sum(axis=1)
+            position += end - start
+
+    def kneighbors(self, Q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        Q = np.asarray(Q, dtype=self.vectors.dtype)
+        k = min(k, len(self.vectors))
+        n_probe = min(self.n_probe, self.n_lists)
+        probes = _nearest_centroids(Q, self.centroids, n_probe)
+        sizes = np.diff(self.offsets)
+
+        distances = np.empty((len(Q), k))
+        indices = np.empty((len(Q), k), dtype=np.intp)
+        for row, (query, lists) in enumerate(zip(Q, probes)):
+            if sizes[lists].sum() < k:
+                # Probed lists are too small: widen to the closest lists holding k rows
+                lists = _nearest_centroids(query[None, :], self.centroids, self.n_lists)[0]
+                lists = lists[:np.searchsorted(np.cumsum(sizes[lists]), k) + 1]
+
+            starts, lengths = self.offsets[lists], sizes[lists]
+            candidates = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            scores = np.empty(len(candidates))
+            self._scan(query, lists, scores)
+
+            nearest = np.argpartition(scores, k - 1)[:k] if len(candidates) > k else np.arange(len(candidates))
+            nearest = candidates[nearest]
+
+            # Exact distances for the k winners only
+            nearest_distances = row_distances(self.vectors[nearest], query, self.metric)
+            order = np.argsort(nearest_distances, kind='stable')
+            distances[row] = nearest_distances[order]
+            indices[row] = self.ids[nearest[order]]
+        return distances, indices
+
+INDEX_BACKENDS: Dict[str, Type[NeighborIndex]] = {
+    ExactIndex.name: ExactIndex,
+    BruteForceIndex.name: BruteForceIndex,
+    IVFIndex.name: IVFIndex
+}
+
+def make_index(backend: str, metric: str = 'euclidean', **params) -> NeighborIndex:
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown neighbor index backend: {backend}. Choose from {sorted(INDEX_BACKENDS)}")
+    return INDEX_BACKENDS[backend](metric=metric, **params)
+
+class IndexedKNeighborsClassifier(ClassifierMixin, BaseEstimator):
+    """
+    KNN classifier over a pluggable NeighborIndex. Voting matches
+    KNeighborsClassifier, so with the 'exact' backend predictions are the
+    same. The fitted index is not pickled with the estimator; persist it
+    with save_index/load_index (EnhancedKNNService does this next to the
+    model file, and memory-maps it on load).
+    """
+
+    def __init__(
+        self,
+        n_neighbors: int = 5,
+        weights: str = 'uniform',
+        metric: str = 'euclidean',
+        index: str = 'ivf',
+        index_params: Optional[Dict[str, Any]] = None
+    ):
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+        self.metric = metric
+        self.index = index
+        self.index_params = index_params
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> 'IndexedKNeighborsClassifier':
+        self.classes_, self.y_codes_ = np.unique(y, return_inverse=True)
+        self.index_ = make_index(self.index, self.metric, **(self.index_params or {})).fit(X)
+        return self
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        distances, indices = self.index_.kneighbors(X, self.n_neighbors)
+        return knn_proba(distances, self.y_codes_[indices], len(self.classes_), self.n_neighbors, self.weights)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def save_index(self, path: str):
+        self.index_.save(path)
+
+    def load_index(self, path: str, mmap_mode: Optional[str] = None):
+        self.index_ = load_index(path, mmap_mode)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('index_', None)
+        return state
+
+class SharedIndexBaggingClassifier(IndexedKNeighborsClassifier):
+    """
+    Bagging ensemble of KNN classifiers that share one index over the full
+    training set. Each bag is a bootstrap sample, stored as a count per
+    training row (n_estimators x n_rows bytes). Prediction runs one k_max
+    neighbor query and lets every bag vote with the first n_neighbors
+    copies of its own rows among those neighbors, which is what a KNN
+    fitted on the bag would find, so memory and query cost stay at about
+    one KNN. k_max (default 3 * n_neighbors + 10) makes it very unlikely
+    that a bag has fewer than n_neighbors copies among the shared neighbors.
+    """
+
+    def __init__(
+        self,
+        n_neighbors: int = 5,
+        weights: str = 'uniform',
+        metric: str = 'euclidean',
+        index: str = 'exact',
+        index_params: Optional[Dict[str, Any]] = None,
+        n_estimators: int = 10,
+        k_max: Optional[int] = None,
+        random_state: int = 42
+    ):
+        super().__init__(n_neighbors, weights, metric, index, index_params)
+        self.n_estimators = n_estimators
+        self.k_max = k_max
+        self.random_state = random_state
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> 'SharedIndexBaggingClassifier':
+        super().fit(X, y)
+        n_rows = len(self.y_codes_)
+        rng = np.random.default_rng(self.random_state)
+        counts = np.stack([
+            np.bincount(rng.integers(0, n_rows, n_rows), minlength=n_rows)
+            for _ in range(self.n_estimators)
+        ])
+        self.bootstrap_counts_ = np.minimum(counts, 255).astype(np.uint8)
+        return self
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        k_max = min(self.k_max or 3 * self.n_neighbors + 10, len(self.y_codes_))
+        distances, indices = self.index_.kneighbors(X, k_max)
+        labels = self.y_codes_[indices]
+
+        proba = np.zeros((len(distances), len(self.classes_)))
+        for counts in self.bootstrap_counts_:
+            # Copies of each neighbor in this bag, cut off after n_neighbors in total
+            copies = counts[indices].astype(np.intp)
+            before = np.cumsum(copies, axis=1) - copies
+            taken = np.minimum(copies, np.maximum(self.n_neighbors - before, 0))
+
+            bag_distances = np.where(taken > 0, distances, np.inf)
+            proba += vote_proba(labels, neighbor_weights(bag_distances, self.weights) * taken, len(self.classes_))
+        return proba / self.n_estimators
+
+def recall_latency_report(
+    X: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    metric: str = 'euclidean',
+    n_probes: Sequence[int] = (1, 2, 4, 8, 16, 32),
+    index_params: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, float]]:
+    """
+    Recall@k against exact search and per-query latency (one query per
+    call, as /predict issues them) for an IVF index at several n_probe values
+    """
+    exact = ExactIndex(metric).fit(X)
+    _, true_indices = exact.kneighbors(queries, k)
+
+    index = IVFIndex(metric, **(index_params or {})).fit(X)
+    rows = [_report_row('exact', exact, queries, k, true_indices)]
+    for n_probe in n_probes:
+        if n_probe > index.n_lists:
+            break
+        index.n_probe = n_probe
+        rows.append(_report_row(f'ivf n_probe={n_probe}', index, queries, k, true_indices))
+    return rows
+
+def _report_row(
+    name: str,
+    index: NeighborIndex,
+    queries: np.ndarray,
+    k: int,
+    true_indices: np.ndarray
+) -> Dict[str, Any]:
+    timings = np.empty(len(queries))
+    found = np.empty((len(queries), k), dtype=np.intp)
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        found[i] = index.kneighbors(queries[i:i + 1], k)[1][0]
+        timings[i] = time.perf_counter() - start
+
+    hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, true_indices))
+    timings *= 1e6
+    return {
+        'index': name,
+        'recall': hits / true_indices.size,
+        'mean_us': float(timings.mean()),
+        'p50_us': float(np.percentile(timings, 50)),
+        'p99_us': float(np.percentile(timings, 99))
+    }
@@ -0,0 +1,106 @@
+"""
+Parallel report feature extraction
+The report stream is cut into batches that are extracted by a process pool.
+Batches travel to the workers as raw BSON bytes (decoded in the worker, not
+in the reading process) and come back as compact float32 blocks, which are
+reassembled in input order into one preallocated matrix
+"""
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+
+import bson
+import numpy as np
+
+from mongo_loader import DEFAULT_BATCH_SIZE, ChunkedMatrixBuilder
+from report_features import FEATURE_NAMES, extract_features_batch
+
+logger = logging.getLogger(__name__)
+
+def default_workers() -> int:
+    """KNN_FEATURE_WORKERS, or one worker per CPU"""
+    return int(os.getenv("KNN_FEATURE_WORKERS", str(os.cpu_count() or 1)))
+
+def _batch_payload(batch: List[Any]) -> Any:
+    """Raw BSON documents are shipped as one bytes object, dicts as they are"""
+    if batch and hasattr(batch[0], 'raw'):
+        return b''.join(document.raw for document in batch)
+    return batch
+
+def extract_block(payload: Any) -> np.ndarray:
+    """Worker entry point: feature block for one batch payload"""
+    reports = bson.decode_all(payload) if isinstance(payload, bytes) else payload
+    return extract_features_batch(reports)
+
+def extract_keyed_block(payload: Any) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Worker entry point returning (ids, versions, features) for one batch.
+    ids are str(_id) bytes; versions are updatedAt (createdAt for
+    documents never updated) as datetime64[ms], NaT when missing.
+    """
+    reports = bson.decode_all(payload) if isinstance(payload, bytes) else payload
+    ids = np.array([str(report['_id']).encode() for report in reports], dtype=bytes)
+    versions = np.array(
+        [report.get('updatedAt') or report.get('createdAt') for report in reports],
+        dtype='datetime64[ms]'
+    )
+    return ids, versions, extract_features_batch(reports)
+
+def _batches(documents: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    batch: List[Any] = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_feature_blocks(
+    documents: Iterable[Any],
+    n_workers: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_pending: Optional[int] = None,
+    block_fn: Callable[[Any], Any] = extract_block
+) -> Iterator[Any]:
+    """
+    block_fn results (feature blocks by default) for consecutive batches of
+    documents, in input order. At most max_pending batches (default 2 per
+    worker) are in flight, so memory stays bounded however long the stream
+    is. block_fn must be a module-level function so workers can import it.
+    """
+    n_workers = n_workers or default_workers()
+    if n_workers <= 1:
+        for batch in _batches(documents, batch_size):
+            yield block_fn(_batch_payload(batch))
+        return
+
+    max_pending = max_pending or 2 * n_workers
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for batch in _batches(documents, batch_size):
+            pending.append(executor.submit(block_fn, _batch_payload(batch)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def extract_features_parallel(
+    documents: Iterable[Any],
+    n_workers: Optional[int] = None,
+    expected_rows: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> np.ndarray:
+    """
+    Feature matrix (n_documents, len(FEATURE_NAMES)) for a report stream,
+    rows in stream order. Documents may be dicts or RawBSONDocuments.
+    """
+    builder = ChunkedMatrixBuilder(len(FEATURE_NAMES), expected_rows)
+    for block in iter_feature_blocks(documents, n_workers, batch_size):
+        builder.append(block)
+
+    logger.info(f"Extracted {len(builder)} reports with {n_workers or default_workers()} workers")
+    return builder.result()
@@ -0,0 +1,132 @@
+"""
+Bounded LRU/TTL cache for single-profile predictions
+Many users submit identical or near-identical questionnaire answers. Their
+feature vectors are quantized into a cache key, and the inference result is
+kept for a limited time, so a repeat profile is answered without
+preprocessing or a neighbor search. Entries belong to one model version:
+the first lookup or store under a newer version (after a hot-swap or a
+rollback) drops them all.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with a per-entry time to live and hit/miss
+    counters. max_entries=0 disables caching.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        decimals: Optional[int] = None
+    ):
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv("KNN_PREDICTION_CACHE_SIZE", "10000")
+        )
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.getenv("KNN_PREDICTION_CACHE_TTL", "300")
+        )
+        self.decimals = decimals if decimals is not None else int(
+            os.getenv("KNN_PREDICTION_CACHE_DECIMALS", "4")
+        )
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, features: np.ndarray) -> Hashable:
+        """
+        Cache key of a feature array: numbers rounded to `decimals` places
+        (so near-identical vectors share a key), strings as they are
+        """
+        if features.dtype == object:
+            return features.shape, tuple(
+                value if isinstance(value, str) else round(float(value), self.decimals)
+                for value in features.flat
+            )
+        # Adding 0.0 turns -0.0 into 0.0, so both round to the same bytes
+        quantized = np.round(features.astype(np.float64), self.decimals) + 0.0
+        return features.shape, quantized.tobytes()
+
+    def _sync_version(self, version: int) -> bool:
+        """Drop every entry when version is newer; False for a stale version"""
+        if self._version is None or version > self._version:
+            if self._entries:
+                self._invalidations += 1
+                self._entries.clear()
+            self._version = version
+        return version == self._version
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        """Cached value for key under model version, or None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key) if self._sync_version(version) else None
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+
+            if entry is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, version: int, value: Any):
+        """Store value for key; results of an older model version are ignored"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of size, hit rate and eviction counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "decimals": self.decimals,
+                "entries": len(self._entries),
+                "model_version": self._version,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations
+            }
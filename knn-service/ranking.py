@@ -0,0 +1,81 @@
+"""
+Top-k ranking of class probabilities
+Picks the k most probable classes of every row in a batch at once and turns
+them into recommendation dicts. Ties rank the lower class index first,
+exactly like a stable descending argsort, whichever selection is used: with
+many classes only the top k are selected with argpartition and sorted; with
+few, one stable sort of the whole row is cheaper.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Rows up to this many classes are sorted whole, and a single row up to
+# SORT_MAX_COLUMNS_SINGLE_ROW: one sort call has the least fixed overhead,
+# while argpartition only pays off on wide batches
+SORT_MAX_COLUMNS = 64
+SORT_MAX_COLUMNS_SINGLE_ROW = 1024
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k highest scores in every row, highest first"""
+    scores = np.atleast_2d(scores)
+    n_rows, n_columns = scores.shape
+    k = max(0, min(k, n_columns))
+    max_sorted = SORT_MAX_COLUMNS_SINGLE_ROW if n_rows == 1 else SORT_MAX_COLUMNS
+    if n_columns <= max_sorted or k == n_columns:
+        return np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    if k == 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+
+    rows = np.arange(n_rows)[:, None]
+    candidates = np.sort(np.argpartition(scores, n_columns - k, axis=1)[:, n_columns - k:], axis=1)
+
+    # argpartition breaks a tie at the k-th place arbitrarily; rows where it
+    # had to leave out columns with the k-th score take the first ones instead
+    candidate_scores = scores[rows, candidates]
+    kth = candidate_scores.min(axis=1, keepdims=True)
+    redo = np.flatnonzero(
+        np.count_nonzero(scores == kth, axis=1) > np.count_nonzero(candidate_scores == kth, axis=1)
+    )
+    if len(redo):
+        # 2 above the k-th score, 1 tied with it; a stable sort of these small
+        # integers keeps the tied columns in column order
+        tiers = (scores[redo] >= kth[redo]).view(np.int8) + (scores[redo] > kth[redo]).view(np.int8)
+        candidates[redo] = np.sort(np.argsort(-tiers, axis=1, kind='stable')[:, :k], axis=1)
+        candidate_scores = scores[rows, candidates]
+
+    # Candidates are in column order, so a stable sort keeps ties in that order
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return candidates[rows, order]
+
+def rank_classes(
+    probabilities: np.ndarray,
+    classes: np.ndarray,
+    k: int = 5,
+    min_probability: float = 0.0,
+    top_indices: Optional[np.ndarray] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Per row, up to k {"niche", "probability", "rank"} dicts, most probable
+    first, leaving out classes below min_probability. Pass top_indices when
+    the ranking is already known (e.g. InferenceResult.top_indices).
+    """
+    probabilities = np.atleast_2d(probabilities)
+    if top_indices is None or top_indices.shape[1] < min(k, probabilities.shape[1]):
+        top_indices = top_k_indices(probabilities, k)
+    top_indices = top_indices[:, :k]
+
+    top_probabilities = probabilities[np.arange(len(probabilities))[:, None], top_indices]
+    counts = (top_probabilities >= min_probability).sum(axis=1).tolist()
+    niches = np.asarray(classes)[top_indices]
+    if niches.dtype.kind != 'U':
+        niches = niches.astype(str)
+
+    return [
+        [
+            {"niche": niche, "probability": probability, "rank": rank}
+            for rank, niche, probability in zip(range(1, count + 1), niche_row, probability_row)
+        ]
+        for count, niche_row, probability_row in zip(counts, niches.tolist(), top_probabilities.tolist())
+    ]
@@ -0,0 +1,147 @@
+"""
+Columnar feature extraction for report documents
+Reports are processed in batches: every column is filled with one pass over
+the batch (per-item work runs in C through map/operator where possible),
+keyword presence is one substring pass per keyword over the whole batch,
+and values are written straight into a fixed-schema float32 matrix
+"""
+
+from itertools import repeat
+from operator import contains, eq, methodcaller
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+BUSINESS_KEYWORDS = ['empresa', 'negócio', 'mercado', 'cliente', 'produto', 'serviço']
+TECH_KEYWORDS = ['tecnologia', 'digital', 'software', 'app', 'web']
+FINANCE_KEYWORDS = ['financeiro', 'investimento', 'lucro', 'custo']
+
+KEYWORD_GROUPS = {
+    'business_keyword_density': BUSINESS_KEYWORDS,
+    'tech_keyword_density': TECH_KEYWORDS,
+    'finance_keyword_density': FINANCE_KEYWORDS
+}
+
+# report.<field> lists whose length becomes a feature
+LIST_COUNT_FEATURES = {
+    'opportunities_count': 'opportunities',
+    'challenges_count': 'challenges',
+    'recommendations_count': 'recommendations',
+    'customer_segments_count': 'customerSegments',
+    'key_players_count': 'keyPlayers',
+    'strengths_count': 'strengths',
+    'weaknesses_count': 'weaknesses',
+    'sources_count': 'sources'
+}
+
+# Fixed column order of the report feature matrix
+FEATURE_NAMES = sorted(
+    ['title_length', 'query_length', 'description_length',
+     'target_audience_size', 'target_audience_diversity', 'data_quality_score']
+    + list(KEYWORD_GROUPS)
+    + list(LIST_COUNT_FEATURES)
+)
+COLUMNS = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+# Report fields read by the extractor, for MongoDB projections
+REPORT_PROJECTION = {
+    '_id': 0,
+    'title': 1,
+    'searchQuery': 1,
+    'report.description': 1,
+    'report.targetAudience': 1,
+    'report.dataQuality': 1,
+    **{f'report.{field}': 1 for field in LIST_COUNT_FEATURES.values()}
+}
+
+# (keyword, group index) for every keyword
+_KEYWORD_GROUP_PAIRS = [
+    (keyword, group_index)
+    for group_index, keywords in enumerate(KEYWORD_GROUPS.values())
+    for keyword in keywords
+]
+_KEYWORD_COLUMNS = np.array([COLUMNS[name] for name in KEYWORD_GROUPS])
+
+def _field(documents: Sequence[Dict[str, Any]], field: str, default: Any = None) -> list:
+    """documents[i].get(field, default) for every document"""
+    return list(map(methodcaller('get', field, default), documents))
+
+def _list_lengths(values: Sequence[Any]) -> np.ndarray:
+    """len(value) for lists, 0 for anything else"""
+    if set(map(type, values)) <= {list}:
+        lengths = map(len, values)
+    else:
+        lengths = (len(value) if isinstance(value, list) else 0 for value in values)
+    return np.fromiter(lengths, dtype=np.float32, count=len(values))
+
+def keyword_group_counts(texts: Sequence[str]) -> np.ndarray:
+    """
+    Number of distinct keywords of each group present in each (lowercased)
+    text, shape (len(texts), len(KEYWORD_GROUPS))
+    """
+    n = len(texts)
+    counts = np.zeros((n, len(KEYWORD_GROUPS)), dtype=np.float32)
+    for keyword, group in _KEYWORD_GROUP_PAIRS:
+        counts[:, group] += np.fromiter(map(contains, texts, repeat(keyword)), dtype=bool, count=n)
+    return counts
+
+def extract_features_batch(
+    reports: Sequence[Dict[str, Any]],
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Feature matrix (len(reports), len(FEATURE_NAMES)) for a batch of report
+    documents. Pass `out` to write into a preallocated float32 block.
+    """
+    n = len(reports)
+    matrix = out if out is not None else np.empty((n, len(FEATURE_NAMES)), dtype=np.float32)
+
+    bodies = _field(reports, 'report', {})
+    if not set(map(type, bodies)) <= {dict}:
+        bodies = [body if isinstance(body, dict) else {} for body in bodies]
+    titles = list(map(str, _field(reports, 'title', '')))
+    queries = list(map(str, _field(reports, 'searchQuery', '')))
+    descriptions = list(map(str, _field(bodies, 'description', '')))
+
+    # Length features
+    matrix[:, COLUMNS['title_length']] = np.fromiter(map(len, titles), dtype=np.float32, count=n)
+    matrix[:, COLUMNS['query_length']] = np.fromiter(map(len, queries), dtype=np.float32, count=n)
+    matrix[:, COLUMNS['description_length']] = np.fromiter(map(len, descriptions), dtype=np.float32, count=n)
+
+    # Keyword presence over "title query description"
+    texts = list(map(str.lower, map(' '.join, zip(titles, queries, descriptions))))
+    matrix[:, _KEYWORD_COLUMNS] = keyword_group_counts(texts)
+
+    # Report structure features
+    for name, field in LIST_COUNT_FEATURES.items():
+        matrix[:, COLUMNS[name]] = _list_lengths(_field(bodies, field, []))
+
+    audiences = _field(bodies, 'targetAudience', [])
+    matrix[:, COLUMNS['target_audience_size']] = _list_lengths(audiences)
+    matrix[:, COLUMNS['target_audience_diversity']] = np.fromiter(
+        [len({str(item).lower() for item in ta}) if isinstance(ta, list) else 0 for ta in audiences],
+        dtype=np.float32, count=n
+    )
+    matrix[:, COLUMNS['data_quality_score']] = np.fromiter(
+        map(eq, repeat('verified'), _field(bodies, 'dataQuality', 'no_evidence')),
+        dtype=np.float32, count=n
+    )
+
+    return matrix
+
+def synthetic_labels(features: np.ndarray) -> np.ndarray:
+    """
+    Synthetic labels from content analysis, applied column-wise.
+    This is a simplified approach - in production use real labels
+    """
+    tech = features[:, COLUMNS['tech_keyword_density']]
+    business = features[:, COLUMNS['business_keyword_density']]
+    finance = features[:, COLUMNS['finance_keyword_density']]
+    segments = features[:, COLUMNS['customer_segments_count']]
+
+    # Assigned from lowest to highest priority
+    labels = np.full(len(features), 'general', dtype=object)
+    labels[segments > 2] = 'b2b'
+    labels[finance > 1] = 'finance'
+    labels[tech > business] = 'technology'
+    return labels
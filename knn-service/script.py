@@ -1,6 +1,7 @@
 import numpy as np
 import pymongo
 import requests
+from seeding import insert_training_rows
 
 # === 1. Gera dados sintéticos ===
 X = np.array([
@@ -57,11 +58,7 @@ try:
     collection = db["training_data"]
 
     collection.delete_many({})
-    for features, label in zip(X, y):
-        collection.insert_one({
-            "features": features.tolist(),
-            "label": label
-        })
+    insert_training_rows(collection, X, y, int_features=0)
     print("✅ Dados inseridos com sucesso no MongoDB!")
 
 except Exception as e:
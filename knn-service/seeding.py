@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Shared synthetic data seeding for the training_data collection
+Rows are generated in one vectorized NumPy pass and written with unordered
+insert_many batches, so millions of rows take seconds instead of one round
+trip per document
+
+Usage:
+    python seeding.py --per-niche 20                 # reference niches
+    python seeding.py --source profiles --per-niche 30
+    python seeding.py --per-niche 100000 --no-clear  # load testing
+"""
+
+import argparse
+import os
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pymongo
+
+# Feature order: education, audience, investment, time, creativity, tech
+INT_FEATURES = 4
+
+# Cada entrada: (label, média) para cada feature
+NICHE_PROFILES: List[Tuple[str, List[float]]] = [
+    ("Loja de Produtos Naturais",       [2, 2, 500, 40, 0.4, 0.6]),
+    ("Padaria",                         [3, 3, 50000, 60, 0.3, 0.5]),
+    ("Agência de Viagens",             [4, 3, 10000, 30, 0.2, 0.4]),
+    ("Eventos Comunitários",           [2, 1, 200, 10, 0.3, 0.3]),
+    ("Mercearia",                      [5, 4, 15000, 50, 0.2, 0.5]),
+    ("Consultoria Empresarial",        [6, 5, 1000, 20, 0.1, 0.7]),
+    ("Papelaria",                      [3, 2, 10000, 45, 0.1, 0.6]),
+    ("Distribuidora de Bebidas",      [4, 5, 30000, 60, 0.1, 0.5]),
+    ("Consultoria Financeira",        [3, 3, 0, 25, 0.1, 0.7]),
+    ("Presentes e Decoração",         [2, 2, 10000, 50, 0.6, 0.3]),
+    ("Brechó",                         [1, 2, 500, 10, 0.7, 0.2]),
+    ("Criação de Filtros AR",         [4, 4, 0, 30, 0.8, 0.2]),
+    ("Produtos Customizados",         [3, 2, 500, 25, 0.6, 0.4]),
+    ("Lanchonete",                     [3, 2, 20000, 60, 0.3, 0.6]),
+    ("Podcast",                        [2, 2, 100, 10, 0.5, 0.5]),
+    ("Narração e Locução",            [4, 3, 200, 15, 0.4, 0.5]),
+    ("Manutenção de PCs",             [2, 4, 300, 20, 0.4, 0.4]),
+    ("Redes e Conectividade",         [3, 5, 100, 15, 0.3, 0.3]),
+    ("Dashboards Inteligentes",       [4, 5, 0, 20, 0.5, 0.2]),
+    ("Consultoria de Software",       [5, 5, 0, 15, 0.3, 0.5])
+]
+
+def generate_profile_variations(
+    profiles: Sequence[Tuple[str, Sequence[float]]],
+    per_niche: int,
+    rng: Optional[np.random.Generator] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Noisy variations around each niche's mean profile.
+    Returns (X, labels) with per_niche rows per niche.
+    """
+    rng = rng or np.random.default_rng()
+    names = [name for name, _ in profiles]
+    base = np.repeat(np.asarray([mean for _, mean in profiles], dtype=float), per_niche, axis=0)
+    n = len(base)
+
+    X = np.empty((n, 6))
+    X[:, 0] = np.clip(rng.normal(base[:, 0], 0.5), 1, 6)                     # education
+    X[:, 1] = np.clip(rng.normal(base[:, 1], 0.5), 1, 6)                     # audience
+    X[:, 2] = np.clip(rng.normal(base[:, 2], base[:, 2] * 0.3), 0, 50000)    # investimento
+    X[:, 3] = np.clip(rng.normal(base[:, 3], 5), 5, 60)                      # tempo
+    X[:, 4] = np.clip(rng.normal(base[:, 4], 0.1), 0, 1)                     # criatividade
+    X[:, 5] = np.clip(rng.normal(base[:, 5], 0.1), 0, 1)                     # tech
+    X[:, :INT_FEATURES] = np.trunc(X[:, :INT_FEATURES])
+
+    return X, np.repeat(np.asarray(names, dtype=object), per_niche)
+
+def generate_generic_features(
+    niches: Sequence[str],
+    per_niche: int,
+    rng: Optional[np.random.Generator] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Niche-independent synthetic profiles, used when only niche names are
+    known (e.g. niches collected from the profiles collection)
+    """
+    rng = rng or np.random.default_rng()
+    n = len(niches) * per_niche
+
+    X = np.empty((n, 6))
+    X[:, 0] = np.clip(rng.normal(3, 1, n), 1, 6)
+    X[:, 1] = np.clip(rng.normal(3, 1, n), 1, 6)
+    X[:, 2] = np.clip(rng.normal(10000, 5000, n), 0, 50000)
+    X[:, 3] = np.clip(rng.normal(30, 10, n), 5, 60)
+    X[:, 4] = np.clip(rng.beta(2, 2, n), 0, 1)
+    X[:, 5] = np.clip(rng.beta(2, 2, n), 0, 1)
+    X[:, :INT_FEATURES] = np.trunc(X[:, :INT_FEATURES])
+
+    return X, np.repeat(np.asarray(niches, dtype=object), per_niche)
+
+def insert_training_rows(
+    collection,
+    X: np.ndarray,
+    labels: Sequence[str],
+    batch_size: int = 10000,
+    int_features: int = INT_FEATURES
+) -> int:
+    """
+    Write {features, label} documents with unordered insert_many batches.
+    The first int_features columns are stored as integers.
+    Returns the number of inserted documents.
+    """
+    inserted = 0
+    for start in range(0, len(X), batch_size):
+        chunk = X[start:start + batch_size]
+        int_part = chunk[:, :int_features].astype(np.int64).tolist()
+        float_part = chunk[:, int_features:].tolist()
+
+        documents = [
+            {"features": ints + floats, "label": label}
+            for ints, floats, label in zip(int_part, float_part, labels[start:start + batch_size])
+        ]
+        result = collection.insert_many(documents, ordered=False)
+        inserted += len(result.inserted_ids)
+
+    return inserted
+
+def niches_from_profiles(db) -> List[str]:
+    """All niche names saved in Profile.niches"""
+    names = []
+    for profile in db["profiles"].find({}, projection={"niches.niche": 1, "_id": 0}):
+        for niche in profile.get("niches", []):
+            names.append(niche["niche"])
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the training_data collection with synthetic rows")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://mongo:27017"))
+    parser.add_argument("--source", choices=["niches", "profiles"], default="niches",
+                        help="reference niche profiles or niche names from the profiles collection")
+    parser.add_argument("--per-niche", type=int, default=20, help="rows generated per niche")
+    parser.add_argument("--batch-size", type=int, default=10000, help="documents per insert_many")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-clear", action="store_true", help="keep existing training_data documents")
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(args.mongo_uri)
+    db = client["compath"]
+    collection = db["training_data"]
+    rng = np.random.default_rng(args.seed)
+
+    start = time.perf_counter()
+    if args.source == "profiles":
+        X, labels = generate_generic_features(niches_from_profiles(db), args.per_niche, rng)
+    else:
+        X, labels = generate_profile_variations(NICHE_PROFILES, args.per_niche, rng)
+    generated_at = time.perf_counter()
+
+    if not args.no_clear:
+        collection.delete_many({})
+    inserted = insert_training_rows(collection, X, labels, batch_size=args.batch_size)
+    finished_at = time.perf_counter()
+
+    print(f"✅ {inserted} documentos inseridos "
+          f"(geração {generated_at - start:.2f}s, inserção {finished_at - generated_at:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -7,15 +7,51 @@ Demonstrates the improvements over basic KNN
 import numpy as np
 import pandas as pd
 from sklearn.datasets import make_classification, load_iris
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import GridSearchCV, ParameterGrid, StratifiedKFold, cross_val_score, train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.feature_selection import SelectKBest, f_classif
 from sklearn.metrics import classification_report, confusion_matrix
 import matplotlib.pyplot as plt
 import seaborn as sns
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
 import time
 import logging
-
-from enhanced_knn import EnhancedKNNService
+import asyncio
+import threading
+import bson
+from bson import ObjectId
+from datetime import datetime, timedelta
+from bson.raw_bson import RawBSONDocument
+from fastapi.testclient import TestClient
+
+import enhanced_main
+from enhanced_knn import RUNTIME_MAX_BATCH, EnhancedKNNService, ModelBundle
 from knn import KNNService  # Original KNN for comparison
+from feature_encoding import FeatureEncoder, stable_hash
+from feature_store import ReportFeatureStore
+from import_report import import_report, parse_importtime
+from inference_pool import InferencePool, PoolSaturatedError
+from neighbor_graph_search import NeighborGraphSearch
+from neighbor_index import (
+    BruteForceIndex,
+    ExactIndex,
+    IndexedKNeighborsClassifier,
+    IVFIndex,
+    SharedIndexBaggingClassifier,
+    load_index
+)
+from mongo_loader import ChunkedMatrixBuilder, load_training_matrix
+from parallel_features import extract_features_parallel
+from prediction_cache import PredictionCache
+from ranking import rank_classes, top_k_indices
+from seeding import NICHE_PROFILES, generate_generic_features, generate_profile_variations, insert_training_rows
+from runtime_model import BRUTE_MAX_ELEMENTS, FusedTransform, load_runtime_model
+from report_features import FEATURE_NAMES, extract_features_batch
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -212,6 +248,1070 @@ def test_cross_validation(X, y):
 
     return cv_results
 
+def make_temp_service(workdir, **kwargs):
+    """Enhanced KNN service whose artifacts live in workdir"""
+    return EnhancedKNNService(
+        model_path=os.path.join(workdir, "model.joblib"),
+        scaler_path=os.path.join(workdir, "scaler.joblib"),
+        feature_selector_path=os.path.join(workdir, "selector.joblib"),
+        **kwargs
+    )
+
+@contextlib.contextmanager
+def serving_client(knn_service, **overrides):
+    """
+    TestClient for the serving app with knn_service as its model and any
+    other enhanced_main globals (inference_pool, MAX_BATCH_SIZE, ...)
+    replaced for the duration; startup events are not run
+    """
+    overrides['enhanced_knn'] = knn_service
+    overrides.setdefault('prediction_cache', PredictionCache(max_entries=0))
+    saved = {name: getattr(enhanced_main, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(enhanced_main, name, value)
+    try:
+        yield TestClient(enhanced_main.app)
+    finally:
+        for name, value in saved.items():
+            setattr(enhanced_main, name, value)
+
+class StubCollection:
+    """
+    In-memory stand-in for a pymongo collection: equality, $gte, $exists
+    and $or queries, inclusion projections (dotted paths included), cursor
+    limit, raw BSON codec options and insert_many
+    """
+
+    def __init__(self, documents=(), raw=False, count_offset=0):
+        self.documents = list(documents)
+        self.raw = raw
+        # Added to count_documents, to mimic counts that are off
+        self.count_offset = count_offset
+
+    @staticmethod
+    def _matches(document, query):
+        for field, condition in query.items():
+            if field == '$or':
+                if not any(StubCollection._matches(document, branch) for branch in condition):
+                    return False
+            elif isinstance(condition, dict):
+                value = document.get(field)
+                if '$exists' in condition and (field in document) != condition['$exists']:
+                    return False
+                if '$gte' in condition and (value is None or value < condition['$gte']):
+                    return False
+            elif document.get(field) != condition:
+                return False
+        return True
+
+    @staticmethod
+    def _project(document, projection):
+        if not projection:
+            return dict(document)
+        result = {'_id': document['_id']} if projection.get('_id', 1) and '_id' in document else {}
+        for path in (field for field, include in projection.items() if include and field != '_id'):
+            *parents, leaf = path.split('.')
+            source, target = document, result
+            for part in parents:
+                if not isinstance(source, dict) or part not in source:
+                    break
+                source, target = source[part], target.setdefault(part, {})
+            else:
+                if isinstance(source, dict) and leaf in source:
+                    target[leaf] = source[leaf]
+        return result
+
+    def with_options(self, codec_options=None):
+        return StubCollection(self.documents, raw=codec_options is not None, count_offset=self.count_offset)
+
+    def find(self, query=None, projection=None, batch_size=None):
+        documents = [self._project(d, projection) for d in self.documents if self._matches(d, query or {})]
+        if self.raw:
+            documents = [RawBSONDocument(bson.encode(d)) for d in documents]
+        return StubCursor(documents)
+
+    def count_documents(self, query, limit=None):
+        count = sum(1 for d in self.documents if self._matches(d, query)) + self.count_offset
+        return min(count, limit) if limit else count
+
+    def insert_many(self, documents, ordered=True):
+        documents = list(documents)
+        self.documents.extend(documents)
+        return type('InsertManyResult', (), {'inserted_ids': list(range(len(documents)))})()
+
+class StubCursor(list):
+    def limit(self, n):
+        return StubCursor(self[:n])
+
+def test_fused_inference():
+    """Fused inference must match separate predict/predict_proba calls"""
+    logger.info("Testing Fused Inference...")
+
+    X, y = generate_synthetic_data(n_samples=300, n_features=8, n_classes=4)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        knn_service = make_temp_service(workdir)
+        knn_service.train_enhanced(X, y, use_grid_search=False)
+
+        for weights in ['uniform', 'distance']:
+            knn_service.model.set_params(weights=weights)
+            # The published runtime model is a snapshot; export it again
+            knn_service.publish(knn_service.bundle._replace(runtime=None))
+            result = knn_service.infer(X[:50], top_k=3)
+            X_processed = knn_service.preprocess_data(X[:50], fit=False)
+
+            assert np.array_equal(result.predictions, knn_service.model.predict(X_processed))
+            assert np.allclose(result.probabilities, knn_service.model.predict_proba(X_processed))
+            assert np.array_equal(result.classes[result.top_indices[:, 0]], result.predictions)
+
+    logger.info("Fused inference matches predict/predict_proba ✓")
+
+def test_neighbor_graph_search():
+    """Neighbor-graph tuning must reproduce GridSearchCV scores exactly"""
+    logger.info("Testing Neighbor Graph Search...")
+
+    X, y = generate_synthetic_data(n_samples=400, n_features=10, n_classes=3)
+    param_grid = EnhancedKNNService().param_grid
+    cv_strategy = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+
+    grid_search = GridSearchCV(
+        KNeighborsClassifier(), param_grid, cv=cv_strategy, scoring='f1_macro', refit=False
+    ).fit(X, y)
+    graph_search = NeighborGraphSearch(param_grid, cv_strategy, scoring='f1_macro').fit(X, y)
+
+    assert np.allclose(grid_search.cv_results_['mean_test_score'], graph_search.cv_results_['mean_test_score'])
+    assert grid_search.best_params_ == graph_search.best_params_
+    # one neighbor search per (fold, metric), not per candidate
+    assert graph_search.cache_.searches == 5 * len(param_grid['metric'])
+
+    logger.info("Neighbor graph search matches GridSearchCV ✓")
+
+def test_parallel_feature_extraction():
+    """Process-pool extraction must return the serial feature rows, in order"""
+    logger.info("Testing Parallel Feature Extraction...")
+
+    rng = np.random.default_rng(0)
+    words = ['empresa', 'app', 'lucro', 'web', 'custo', 'loja']
+    reports = [
+        {
+            'title': ' '.join(rng.choice(words, 3)),
+            'searchQuery': f"consulta {i}",
+            'report': {'description': ' '.join(rng.choice(words, 10)), 'opportunities': ['o'] * (i % 4)}
+        }
+        for i in range(1000)
+    ]
+    raw_reports = [RawBSONDocument(bson.encode(report)) for report in reports]
+
+    X_parallel = extract_features_parallel(raw_reports, n_workers=2, expected_rows=len(reports), batch_size=64)
+    assert np.array_equal(X_parallel, extract_features_batch(reports))
+
+    logger.info("Parallel feature extraction matches serial extraction ✓")
+
+def test_feature_store_upsert():
+    """Feature store keeps one row per report id and survives a reload"""
+    logger.info("Testing Feature Store...")
+
+    n_features = len(FEATURE_NAMES)
+    ids = np.array([b'a', b'b', b'c'])
+    versions = np.array(['2026-01-01', '2026-01-02', '2026-01-03'], dtype='datetime64[ms]')
+    features = np.arange(3 * n_features, dtype=np.float32).reshape(3, n_features)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = ReportFeatureStore(workdir)
+        assert store.delta_query() == {}
+        assert store.upsert(ids, versions, features) == (3, 0)
+        store.save()
+
+        reloaded = ReportFeatureStore(workdir)
+        assert reloaded.load() and len(reloaded) == 3
+        assert np.array_equal(reloaded.features, features)
+
+        # 'b' changed, 'c' re-read unchanged, 'd' is new
+        delta_ids = np.array([b'b', b'c', b'd'])
+        delta_versions = np.array(['2026-02-01', '2026-01-03', '2026-02-02'], dtype='datetime64[ms]')
+        delta_features = np.full((3, n_features), -1, dtype=np.float32)
+        assert reloaded.upsert(delta_ids, delta_versions, delta_features) == (1, 1)
+
+        rows = {key: i for i, key in enumerate(reloaded.ids)}
+        assert np.all(reloaded.features[rows[b'b']] == -1)
+        assert np.array_equal(reloaded.features[rows[b'c']], features[2])
+        assert str(reloaded.high_water_mark.date()) == '2026-02-02'
+        assert reloaded.remove_missing(np.array([b'b', b'c', b'd'])) == 1
+
+    logger.info("Feature store upserts by id ✓")
+
+def test_categorical_encoding():
+    """String features are encoded identically after a save/load round trip"""
+    logger.info("Testing Categorical Encoding...")
+
+    # CRC-32 buckets do not depend on the process hash seed
+    assert np.allclose(stable_hash(['alta', 'alta', 'baixa']), [0.722, 0.722, stable_hash(['baixa'])[0]])
+
+    rng = np.random.default_rng(0)
+    levels = rng.choice(['alta', 'media', 'baixa'], 300)
+    X = np.empty((300, 3), dtype=object)
+    X[:, 0] = rng.normal(size=300)
+    X[:, 1] = levels
+    X[:, 2] = rng.normal(size=300)
+    y = np.where(levels == 'alta', 'competitive', 'open')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        knn_service = make_temp_service(workdir)
+        knn_service.train_enhanced(X, y, use_grid_search=False)
+        assert knn_service.encoder.vocabularies == {1: ['alta', 'baixa', 'media']}
+
+        loaded = make_temp_service(workdir)
+        loaded.load_model()
+        rows = [[0.0, 'alta', 0.0], [0.5, 'desconhecido', 0.5]]
+        assert np.array_equal(loaded.encoder.transform(rows), knn_service.encoder.transform(rows))
+        assert loaded.encoder.transform(rows)[1, 1] == 3  # unseen values share one code
+        assert np.array_equal(loaded.predict(rows), knn_service.predict(rows))
+
+    assert FeatureEncoder().fit(np.ones((5, 2))).is_identity
+
+    logger.info("Categorical encoding is deterministic ✓")
+
+def test_neighbor_index():
+    """IVF probing every list is exact; indexes survive a save/load round trip"""
+    logger.info("Testing Neighbor Index...")
+
+    X, y = generate_synthetic_data(n_samples=2000, n_features=8, n_classes=3)
+    queries = X[:100]
+
+    exact = KNeighborsClassifier(n_neighbors=7, weights='distance').fit(X, y)
+    expected_distances, expected_indices = exact.kneighbors(queries)
+
+    index = IVFIndex(n_lists=16).fit(X)
+    index.n_probe = 16
+    distances, indices = index.kneighbors(queries, 7)
+    assert np.allclose(distances, expected_distances)
+    assert np.array_equal(np.sort(indices, axis=1), np.sort(expected_indices, axis=1))
+
+    approximate = IndexedKNeighborsClassifier(
+        n_neighbors=7, weights='distance', index='ivf', index_params={'n_lists': 16, 'n_probe': 16}
+    ).fit(X, y)
+    assert np.allclose(approximate.predict_proba(queries), exact.predict_proba(queries))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "index.joblib")
+        index.save(path)
+        assert np.array_equal(load_index(path).kneighbors(queries, 7)[1], indices)
+        assert np.array_equal(load_index(path, mmap_mode='r').kneighbors(queries, 7)[1], indices)
+
+    logger.info("IVF index matches exact search at full probe ✓")
+
+def test_mmap_model_loading():
+    """A memory-mapped model predicts exactly like one loaded into memory"""
+    logger.info("Testing Memory-Mapped Model Loading...")
+
+    X, y = generate_synthetic_data(n_samples=400, n_features=8, n_classes=3)
+    queries = X[:25]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for neighbor_index in ['exact', 'ivf']:
+            make_temp_service(workdir).train_enhanced(
+                X, y, use_grid_search=False, neighbor_index=neighbor_index
+            )
+
+            mapped = make_temp_service(workdir, mmap_mode='r')
+            in_memory = make_temp_service(workdir, mmap_mode=None)
+            mapped.load_model()
+            in_memory.load_model()
+            mapped_result, in_memory_result = mapped.infer(queries), in_memory.infer(queries)
+            assert np.array_equal(mapped_result.predictions, in_memory_result.predictions)
+            assert np.allclose(mapped_result.probabilities, in_memory_result.probabilities)
+
+        # The training matrix stays on disk instead of being copied
+        assert isinstance(mapped.model.index_.vectors, np.memmap)
+
+    logger.info("Memory-mapped models match in-memory models ✓")
+
+def test_compact_model():
+    """float32 models pass the parity check and stay float32 through a reload"""
+    logger.info("Testing Compact Model...")
+
+    X, y = generate_synthetic_data(n_samples=500, n_features=10, n_classes=3)
+
+    # Brute-force search agrees with scikit-learn's exact search
+    brute, exact = BruteForceIndex().fit(X), ExactIndex().fit(X)
+    assert np.array_equal(brute.kneighbors(X[:20], 5)[1], exact.kneighbors(X[:20], 5)[1])
+
+    with tempfile.TemporaryDirectory() as workdir:
+        knn_service = make_temp_service(workdir)
+        results = knn_service.train_enhanced(X, y, use_grid_search=False, compact=True)
+        assert results['compact']['enabled']
+        assert results['compact']['prediction_agreement'] >= 0.99
+        assert knn_service.model.index == 'brute' and knn_service.model.index_.dtype == np.float32
+
+        loaded = make_temp_service(workdir)
+        loaded.load_model()
+        assert loaded.get_model_info()['compact']
+        assert np.array_equal(loaded.predict(X[:50]), knn_service.predict(X[:50]))
+
+        # float32 rows, as the MongoDB loaders return them, train in float64
+        # unless compact is requested
+        knn_service.train_enhanced(X.astype(np.float32), y, use_grid_search=False, persist=False)
+        assert knn_service.model._fit_X.dtype == np.float64
+        assert not knn_service.get_model_info()['compact']
+
+        # Ensembles are compacted as their shared index, after the same check
+        results = knn_service.train_enhanced(X, y, use_grid_search=False, use_ensemble=True, compact=True, persist=False)
+        assert results['compact']['enabled'] and results['compact']['prediction_agreement'] >= 0.99
+        assert isinstance(knn_service.model, SharedIndexBaggingClassifier)
+        assert knn_service.model.index_.dtype == np.float32 and knn_service.get_model_info()['compact']
+
+    logger.info("Compact model matches float64 accuracy ✓")
+
+def test_shared_index_ensemble():
+    """Shared-index bagging votes exactly like one KNN per bootstrap bag"""
+    logger.info("Testing Shared-Index Ensemble...")
+
+    X, y = generate_synthetic_data(n_samples=400, n_features=8, n_classes=3)
+    queries = X[:50] + 0.01
+
+    for weights in ['uniform', 'distance']:
+        ensemble = SharedIndexBaggingClassifier(n_neighbors=7, weights=weights).fit(X, y)
+        expected = np.zeros((len(queries), 3))
+        for counts in ensemble.bootstrap_counts_:
+            rows = np.repeat(np.arange(len(X)), counts)
+            bag = KNeighborsClassifier(n_neighbors=7, weights=weights).fit(X[rows], y[rows])
+            expected[:, bag.classes_] += bag.predict_proba(queries)
+        assert np.allclose(ensemble.predict_proba(queries), expected / ensemble.n_estimators)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        knn_service = make_temp_service(workdir)
+        knn_service.train_enhanced(X, y, use_grid_search=False, use_ensemble=True)
+        assert isinstance(knn_service.model, SharedIndexBaggingClassifier)
+
+        loaded = make_temp_service(workdir)
+        loaded.load_model()
+        assert loaded.get_model_info()['ensemble']
+        assert np.allclose(loaded.infer(queries).probabilities, knn_service.infer(queries).probabilities)
+
+    logger.info("Shared-index ensemble matches per-bag KNNs ✓")
+
+def test_prediction_cache():
+    """Prediction cache is LRU-bounded, expires entries and empties on a model swap"""
+    logger.info("Testing Prediction Cache...")
+
+    cache = PredictionCache(max_entries=2, ttl_seconds=60, decimals=4)
+
+    # Near-identical vectors share a key; strings are kept as they are
+    assert cache.key(np.array([[0.12341, -0.00001]])) == cache.key(np.array([[0.12339, 0.0]]))
+    assert cache.key(np.array([[1.0, 'alta']], dtype=object)) != cache.key(np.array([[1.0, 'baixa']], dtype=object))
+
+    cache.put('a', 1, 'result a')
+    cache.put('b', 1, 'result b')
+    assert cache.get('a', 1) == 'result a'
+    cache.put('c', 1, 'result c')  # evicts 'b', the least recently used
+    assert cache.get('b', 1) is None and cache.get('c', 1) == 'result c'
+
+    # A newer model version drops every entry; results of an older one are not stored
+    assert cache.get('a', 2) is None
+    cache.put('a', 1, 'stale')
+    assert cache.get('a', 2) is None
+
+    metrics = cache.metrics()
+    assert (metrics['hits'], metrics['misses'], metrics['evictions'], metrics['invalidations']) == (2, 3, 1, 1)
+    assert metrics['hit_rate'] == 0.4
+
+    expiring = PredictionCache(max_entries=10, ttl_seconds=0.01)
+    expiring.put('a', 1, 'result a')
+    time.sleep(0.02)
+    assert expiring.get('a', 1) is None and expiring.metrics()['expirations'] == 1
+
+    logger.info("Prediction cache evicts, expires and invalidates ✓")
+
+def test_top_k_ranking():
+    """argpartition top-k ranks exactly like a stable descending argsort"""
+    logger.info("Testing Top-k Ranking...")
+
+    # Few distinct values, so ties are everywhere, including at the k-th place
+    # (wide rows take the argpartition path, narrow ones a full sort)
+    rng = np.random.default_rng(0)
+    for n_columns in [12, 300, 1500]:
+        scores = rng.integers(0, 4, size=(200, n_columns)) / 4.0
+        for k in [1, 3, 5, 12, n_columns]:
+            expected = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+            assert np.array_equal(top_k_indices(scores, k), expected)
+            assert np.array_equal(top_k_indices(scores[:1], k), expected[:1])
+
+    probabilities = np.array([[0.1, 0.5, 0.4], [0.2, 0.2, 0.6]])
+    ranked = rank_classes(probabilities, np.array(['a', 'b', 'c']), k=2, min_probability=0.3)
+    assert ranked == [
+        [{"niche": "b", "probability": 0.5, "rank": 1}, {"niche": "c", "probability": 0.4, "rank": 2}],
+        [{"niche": "c", "probability": 0.6, "rank": 1}]
+    ]
+
+    logger.info("Top-k ranking matches argsort ✓")
+
+def test_lazy_imports():
+    """The serving entry point does not import plotting, dataframe or tuning modules"""
+    logger.info("Testing Lazy Imports...")
+
+    entries = parse_importtime(
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   numpy.core\n"
+        "import time:      2809 |      81583 | numpy\n"
+    )
+    assert entries == [
+        {'module': 'numpy.core', 'self_us': 120, 'cumulative_us': 120, 'depth': 1},
+        {'module': 'numpy', 'self_us': 2809, 'cumulative_us': 81583, 'depth': 0}
+    ]
+
+    report = import_report('enhanced_main')
+    assert report['deferred_loaded'] == []
+    assert report['total_us'] > 0
+    assert report['slowest'][0]['module'] == 'enhanced_main'
+
+    logger.info(f"enhanced_main imports in {report['total_us'] / 1000:.0f}ms without deferred modules ✓")
+
+def test_runtime_model():
+    """The NumPy-only runtime model predicts exactly like the scikit-learn bundle"""
+    logger.info("Testing Runtime Model...")
+
+    X, y = generate_synthetic_data(n_samples=400, n_features=8, n_classes=4)
+    scaler = StandardScaler().fit(X)
+    selector = SelectKBest(score_func=f_classif, k=5).fit(scaler.transform(X), y)
+    X_processed = selector.transform(scaler.transform(X))
+
+    for metric in ['euclidean', 'manhattan', 'minkowski']:
+        for weights in ['uniform', 'distance']:
+            model = KNeighborsClassifier(n_neighbors=7, weights=weights, metric=metric).fit(X_processed[:300], y[:300])
+            runtime = EnhancedKNNService.export_runtime_model(ModelBundle(model, scaler, selector))
+            # Training rows included, so distance weights meet exact matches
+            assert np.array_equal(runtime.predict(X[250:]), model.predict(X_processed[250:]))
+            assert np.allclose(runtime.predict_proba(X[250:]), model.predict_proba(X_processed[250:]))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        knn_service = make_temp_service(workdir)
+        knn_service.train_enhanced(X, y, use_grid_search=False)
+        expected = knn_service.infer(X[:50])
+        assert knn_service.bundle.runtime is not None
+        assert os.path.exists(knn_service.runtime_path)
+
+        # The reloaded runtime model serves the same results over the
+        # model's own memory-mapped rows and tree, not a second mapping
+        restarted = make_temp_service(workdir)
+        restarted.load_model()
+        assert isinstance(restarted.bundle.model._fit_X, np.memmap)
+        assert np.shares_memory(restarted.bundle.runtime.vectors, restarted.bundle.model._fit_X)
+        assert restarted.bundle.runtime.tree is restarted.bundle.model._tree
+        result = restarted.infer(X[:50])
+        assert np.array_equal(result.probabilities, expected.probabilities)
+        assert restarted.get_model_info()["runtime_model"]
+        loaded = load_runtime_model(knn_service.runtime_path)
+        assert np.array_equal(loaded.predict_proba(X[:50]), expected.probabilities)
+
+        # Loading and predicting needs neither scikit-learn nor the other pickles
+        script = (
+            "import sys, numpy as np; from runtime_model import load_runtime_model; "
+            f"model = load_runtime_model({knn_service.runtime_path!r}, 'r'); "
+            f"model.predict(np.zeros((1, {X.shape[1]}))); print('sklearn' in sys.modules)"
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout
+        assert output.strip() == 'False'
+        assert loaded.tree is None
+
+        # Ensembles have no single-KNN equivalent and keep the scikit-learn path
+        knn_service.train_enhanced(X, y, use_grid_search=False, use_ensemble=True)
+        assert knn_service.bundle.runtime is None
+        assert not os.path.exists(knn_service.runtime_path)
+
+    # Training sets past the brute-force cutoff are searched with the tree
+    X_large, y_large = generate_synthetic_data(n_samples=3000, n_features=8, n_classes=4)
+    model = KNeighborsClassifier(n_neighbors=7, weights='distance').fit(X_large, y_large)
+    runtime = EnhancedKNNService.export_runtime_model(ModelBundle(model, None, None))
+    queries = X_large[:RUNTIME_MAX_BATCH] + 0.01
+    assert runtime.tree is model._tree and len(queries) * len(X_large) > BRUTE_MAX_ELEMENTS
+    assert np.allclose(runtime.predict_proba(queries), model.predict_proba(queries))
+    assert np.array_equal(runtime.kneighbors(queries)[1], model.kneighbors(queries)[1])
+
+    logger.info("Runtime model matches scikit-learn ✓")
+
+def test_fused_transform():
+    """The fused scaler/selector operator matches the two scikit-learn transforms exactly"""
+    logger.info("Testing Fused Transform...")
+
+    X, y = generate_synthetic_data(n_samples=300, n_features=8, n_classes=3)
+    scaler = StandardScaler().fit(X)
+    rows = np.random.default_rng(0).normal(size=(20, 8)) * 3
+
+    for k in ['all', 3]:
+        selector = SelectKBest(score_func=f_classif, k=k).fit(scaler.transform(X), y)
+        fused = FusedTransform.from_estimators(scaler, selector)
+        expected = selector.transform(scaler.transform(rows))
+        assert np.array_equal(fused(rows), expected)
+
+        buffer = np.empty((len(rows), fused.n_features_out))
+        assert fused(rows, out=buffer) is buffer
+        assert np.array_equal(buffer, expected)
+
+    for bad in [rows[:, :5], np.where(np.eye(20, 8) > 0, np.nan, rows)]:
+        try:
+            fused(bad)
+            assert False, "invalid input accepted"
+        except ValueError:
+            pass
+
+    # Precomputed once per published bundle and used by preprocess_data
+    with tempfile.TemporaryDirectory() as workdir:
+        knn_service = make_temp_service(workdir)
+        knn_service.train_enhanced(X, y, use_grid_search=False)
+        assert knn_service.bundle.transform is not None
+        assert np.array_equal(
+            knn_service.preprocess_data(rows, fit=False),
+            knn_service.feature_selector.transform(knn_service.scaler.transform(rows))
+        )
+
+    logger.info("Fused transform matches scikit-learn ✓")
+
+def test_multi_metric_cross_validation():
+    """cross_validate fits each fold once and scores like cross_val_score per metric"""
+    logger.info("Testing Multi-Metric Cross-Validation...")
+
+    X, y = generate_synthetic_data(n_samples=300, n_features=8, n_classes=3)
+    metrics = ['accuracy', 'precision_macro', 'recall_macro', 'f1_macro']
+
+    with tempfile.TemporaryDirectory() as workdir:
+        knn_service = make_temp_service(workdir)
+        knn_service.train_enhanced(X, y, use_grid_search=False, persist=False)
+
+        for n_jobs in [1, 2]:
+            cv_results = knn_service.cross_validate(X, y, cv=5, scoring=metrics, n_jobs=n_jobs)
+            assert list(cv_results) == metrics
+            for metric in metrics:
+                expected = cross_val_score(knn_service.model, X, y, cv=5, scoring=metric)
+                assert cv_results[metric]['scores'] == expected.tolist()
+                assert np.isclose(cv_results[metric]['mean'], expected.mean())
+                assert np.isclose(cv_results[metric]['std'], expected.std())
+
+        # Unknown metrics and metrics that fail on every fold are left out
+        cv_results = knn_service.cross_validate(X, y, cv=3, scoring=['accuracy', 'not_a_metric', 'roc_auc'], n_jobs=1)
+        assert list(cv_results) == ['accuracy']
+
+    logger.info("Multi-metric cross-validation matches per-metric scores ✓")
+
+def test_planned_training_pipeline():
+    """train_enhanced evaluates on a given test split and cross-validates from the tuning's graphs"""
+    logger.info("Testing Planned Training Pipeline...")
+
+    X, y = generate_synthetic_data(n_samples=400, n_features=10, n_classes=3)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    metrics = ['accuracy', 'precision_macro', 'recall_macro', 'f1_macro']
+
+    with tempfile.TemporaryDirectory() as workdir:
+        knn_service = make_temp_service(workdir)
+        results = knn_service.train_enhanced(
+            X_train, y_train, persist=False, validation_data=(X_test, y_test), cv_scoring=metrics
+        )
+        searches = knn_service.graph_cache.searches
+
+        # The whole training split is used and evaluation runs on the given rows
+        X_train_processed = knn_service.graph_cache.X
+        assert len(X_train_processed) == len(X_train)
+        assert results['evaluation']['accuracy'] == knn_service.evaluate_detailed(
+            knn_service.preprocess_data(X_test, fit=False), y_test
+        )['accuracy']
+
+        # Same scores as refitting every fold, without a new neighbor search
+        cv_strategy = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+        assert list(results['cross_validation']) == metrics
+        for metric in metrics:
+            expected = cross_val_score(
+                KNeighborsClassifier(**knn_service.best_params), X_train_processed, y_train,
+                cv=cv_strategy, scoring=metric
+            )
+            assert np.allclose(results['cross_validation'][metric]['scores'], expected)
+        assert knn_service.graph_cache.searches == searches
+
+        # Without tuning graphs the folds are refitted
+        knn_service.train_enhanced(X_train, y_train, use_grid_search=False, persist=False, cv_scoring=['accuracy'])
+        assert knn_service.graph_cache is None
+
+    logger.info("Planned training reuses its split and neighbor graphs ✓")
+
+def test_artifact_reload_on_stamp_change():
+    """Published artifacts are reread from disk only when the model file stamp changes"""
+    logger.info("Testing Artifact Reloading...")
+
+    X, y = generate_synthetic_data(n_samples=200, n_features=8, n_classes=3)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        make_temp_service(workdir).train_enhanced(X, y, use_grid_search=False)
+
+        serving = make_temp_service(workdir)
+        serving.load_model()
+        reads = []
+        read_bundle = serving._read_bundle
+        serving._read_bundle = lambda: reads.append(1) or read_bundle()
+
+        bundle = serving.current_bundle()
+        for _ in range(5):
+            serving.infer(X[:3])
+            assert serving.current_bundle() is bundle
+        assert reads == []
+
+        # A new stamp (another writer) triggers exactly one reload
+        stat = os.stat(serving.model_path)
+        os.utime(serving.model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        reloaded = serving.current_bundle()
+        assert reloaded is not bundle and reloaded.version == bundle.version + 1
+        serving.infer(X[:3])
+        assert serving.current_bundle() is reloaded
+        assert reads == [1]
+
+    logger.info("Artifacts are reloaded only on a stamp change ✓")
+
+def test_batch_endpoint():
+    """/predict/batch validates its rows and answers them in request order"""
+    logger.info("Testing Batch Endpoint...")
+
+    X, y = generate_synthetic_data(n_samples=300, n_features=8, n_classes=3)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        knn_service = make_temp_service(workdir)
+        knn_service.train_enhanced(X, y, use_grid_search=False, persist=False)
+
+        with serving_client(knn_service, MAX_BATCH_SIZE=20) as client:
+            rows = X[:20]
+            response = client.post("/predict/batch", json={"features": rows.tolist(), "top_k": 2})
+            assert response.status_code == 200
+            predictions = response.json()["predictions"]
+            assert response.json()["metadata"]["rows"] == len(rows)
+            for row, prediction in zip(rows, predictions):
+                expected = knn_service.infer(row[None, :], top_k=2)
+                assert prediction["recommendations"][0]["niche"] == str(expected.predictions[0])
+                assert np.allclose(prediction["confidence_scores"], expected.probabilities[0][expected.top_indices[0]])
+
+            # Too many rows and ragged rows are rejected before inference
+            response = client.post("/predict/batch", json={"features": X[:21].tolist()})
+            assert response.status_code == 400 and "20 rows" in response.json()["detail"]
+            response = client.post("/predict/batch", json={"features": [X[0].tolist(), X[1, :5].tolist()]})
+            assert response.status_code == 400
+
+            # Rows that do not fit the model are client errors, not server errors
+            response = client.post("/predict/batch", json={"features": X[:2, :5].tolist()})
+            assert response.status_code == 422 and "Expected 8 features" in response.json()["detail"]
+            bad_row = X[0].tolist()
+            bad_row[3] = "alta"
+            response = client.post("/predict/batch", json={"features": [X[1].tolist(), bad_row]})
+            assert response.status_code == 422
+            response = client.post("/predict", json={"features": bad_row})
+            assert response.status_code == 422
+
+    logger.info("Batch endpoint validates and keeps row order ✓")
+
+def test_inference_pool_saturation():
+    """A full inference pool rejects work at once; /predict answers 503 and /metrics counts it"""
+    logger.info("Testing Inference Pool Saturation...")
+
+    pool = InferencePool(max_workers=1, max_queue=2)
+    release = threading.Event()
+
+    async def fill():
+        await asyncio.gather(*[pool.run(release.wait, 10) for _ in range(pool.capacity)])
+
+    filler = threading.Thread(target=asyncio.run, args=(fill(),))
+    filler.start()
+    try:
+        deadline = time.monotonic() + 5
+        while pool.metrics()['running'] + pool.metrics()['queue_depth'] < pool.capacity:
+            assert time.monotonic() < deadline, "pool never filled"
+            time.sleep(0.01)
+
+        try:
+            asyncio.run(pool.run(len, []))
+            assert False, "saturated pool accepted work"
+        except PoolSaturatedError:
+            pass
+
+        # An untrained service: the request is rejected before it needs a model
+        with tempfile.TemporaryDirectory() as workdir, \
+                serving_client(make_temp_service(workdir), inference_pool=pool) as client:
+            started = time.perf_counter()
+            response = client.post("/predict", json={"features": [1.0, 2.0, 3.0]})
+            assert response.status_code == 503
+            assert time.perf_counter() - started < 1.0
+
+            metrics = client.get("/metrics").json()["inference_pool"]
+            assert (metrics['running'], metrics['queue_depth']) == (1, 2)
+            assert (metrics['rejected'], metrics['completed']) == (2, 0)
+    finally:
+        release.set()
+        filler.join()
+
+    metrics = pool.metrics()
+    assert (metrics['running'], metrics['queue_depth'], metrics['completed']) == (0, 0, pool.capacity)
+    pool.shutdown()
+
+    logger.info("Saturated pool rejects work fast ✓")
+
+def test_hot_swap_and_rollback():
+    """publish/rollback swap whole bundles; another writer's save is picked up by its stamp"""
+    logger.info("Testing Hot Swap and Rollback...")
+
+    X, y = generate_synthetic_data(n_samples=200, n_features=8, n_classes=3)
+    y_binary = np.where(y == 0, 'a', 'b')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        writer = make_temp_service(workdir)
+        writer.train_enhanced(X, y, use_grid_search=False)
+
+        # An unpersisted publish is not replaced by the older model file on disk
+        serving = make_temp_service(workdir)
+        serving.train_enhanced(X, y_binary, use_grid_search=False, persist=False)
+        first = serving.bundle
+        assert list(serving.infer(X[:3]).classes) == ['a', 'b']
+        assert serving.current_bundle() is first and first.version == 1
+
+        # Each publish keeps the previous bundle, up to max_history
+        for _ in range(4):
+            serving.publish(first._replace(runtime=None))
+        assert serving.bundle.version == 5
+        assert serving.get_model_info()['rollback_available'] == 3
+
+        # Rollback republishes the previous bundle and persists it
+        rolled_back = serving.rollback()
+        assert rolled_back.model is first.model and rolled_back.version == 6
+        assert serving.get_model_info()['rollback_available'] == 2
+        restarted = make_temp_service(workdir)
+        restarted.load_model()
+        assert list(restarted.infer(X[:3]).classes) == ['a', 'b']
+
+        # Another process saving new artifacts replaces the bundle on the next read
+        writer.train_enhanced(X, y, use_grid_search=False)
+        reloaded = serving.current_bundle()
+        assert reloaded.version == 7 and list(serving.infer(X[:3]).classes) == [0, 1, 2]
+        assert serving.get_model_info()['rollback_available'] == 3
+
+        with serving_client(serving) as client:
+            for _ in range(3):
+                response = client.post("/model/rollback")
+                assert response.status_code == 200
+            assert response.json()["rollback_available"] == 0
+            assert list(serving.infer(X[:3]).classes) == ['a', 'b']
+
+            response = client.post("/model/rollback")
+            assert response.status_code == 409
+
+    logger.info("Hot swap and rollback keep complete bundles ✓")
+
+def test_pruned_param_grid():
+    """The pruned 28-candidate grid finds the best score of the full 336-candidate grid"""
+    logger.info("Testing Pruned Parameter Grid...")
+
+    X, y, _, _ = load_iris_data()
+    full_grid = {
+        'n_neighbors': [3, 5, 7, 9, 11, 13, 15],
+        'weights': ['uniform', 'distance'],
+        'metric': ['euclidean', 'manhattan', 'minkowski'],
+        'p': [1, 2],
+        'algorithm': ['auto', 'ball_tree', 'kd_tree', 'brute']
+    }
+    cv_strategy = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+    full_search = GridSearchCV(
+        KNeighborsClassifier(), full_grid, cv=cv_strategy, scoring='f1_macro', refit=False
+    ).fit(X, y)
+    assert len(full_search.cv_results_['params']) == 336
+
+    knn_service = EnhancedKNNService()
+    tuning_results = knn_service.hyperparameter_tuning(X, y, cv=5, scoring='f1_macro')
+    assert tuning_results['candidates_evaluated'] == 28
+    assert np.isclose(tuning_results['best_score'], full_search.best_score_)
+
+    logger.info("Pruned grid matches the full grid's best score ✓")
+
+def test_search_strategies():
+    """Halving and random search: results, early stopping and the time budget"""
+    logger.info("Testing Search Strategies...")
+
+    X, y = generate_synthetic_data(n_samples=600, n_features=8, n_classes=3)
+    knn_service = EnhancedKNNService()
+    grid = knn_service.hyperparameter_tuning(X, y, strategy='grid')
+    candidates = list(ParameterGrid(knn_service.param_grid))
+
+    # Random search over the whole grid finds the grid's best score, with
+    # one neighbor search per (fold, metric) whatever order k is drawn in
+    random_search = knn_service.hyperparameter_tuning(X, y, strategy='random', patience=len(candidates))
+    assert random_search['candidates_evaluated'] == len(candidates) and not random_search['stopped_early']
+    assert np.isclose(random_search['best_score'], grid['best_score'])
+    assert knn_service.graph_cache.searches == 5 * len(knn_service.param_grid['metric'])
+
+    # Patience and the time budget stop it early
+    patient = knn_service.hyperparameter_tuning(X, y, strategy='random', patience=3)
+    assert patient['stopped_early'] and patient['candidates_evaluated'] < len(candidates)
+    results = knn_service.train_enhanced(
+        X, y, persist=False, search_strategy='random', search_time_budget=1e-9
+    )
+    assert results['search']['stopped_early'] and results['search']['candidates_evaluated'] == 1
+
+    # Halving scores every candidate on a subsample, then the best third on more rows
+    halving = knn_service.hyperparameter_tuning(X, y, strategy='halving')
+    resources = halving['cv_results']['n_resources']
+    assert np.all(np.diff(resources) >= 0) and resources[0] < len(X)
+    assert halving['best_params']['n_neighbors'] in knn_service.param_grid['n_neighbors']
+    assert halving['candidates_evaluated'] > len(candidates)
+
+    # Candidates that always tie keep the same leader, so halving stops
+    # after two stable rounds instead of reaching the full sample
+    knn_service.param_grid = {
+        'n_neighbors': [5], 'algorithm': ['ball_tree', 'kd_tree', 'brute'], 'leaf_size': [10, 20, 30, 40, 50]
+    }
+    stable = knn_service.hyperparameter_tuning(X, y, strategy='halving')
+    assert stable['stopped_early'] and stable['candidates_evaluated'] == 15 + 5 + 2
+    assert stable['cv_results']['n_resources'].max() < len(X)
+
+    logger.info("Search strategies stop early and match the grid ✓")
+
+def test_streaming_training_loader():
+    """Chunked loading returns the old list-based matrix, as float32 unless asked otherwise"""
+    logger.info("Testing Streaming Training Loader...")
+
+    rng = np.random.default_rng(0)
+    documents = [
+        {
+            '_id': i,
+            'features': [int(rng.integers(1, 7)), int(rng.integers(0, 50000)), float(rng.normal()), float(rng.beta(2, 2))],
+            'label': f"niche_{i % 7}"
+        }
+        for i in range(1234)
+    ]
+    collection = StubCollection(documents)
+
+    # The loader this replaced: whole collection as lists, then np.array
+    data = list(collection.find())
+    X_lists = np.array([document['features'] for document in data])
+    y_lists = np.array([document['label'] for document in data])
+
+    for batch_size in [100, 5000]:
+        X, y = load_training_matrix(collection, batch_size=batch_size)
+        assert X.dtype == np.float32
+        assert np.array_equal(X, X_lists.astype(np.float32)) and np.array_equal(y, y_lists)
+    X, _ = load_training_matrix(collection, dtype=np.float64)
+    assert X.dtype == np.float64 and np.array_equal(X, X_lists)
+
+    # An underestimated count grows the matrix; limit reads a prefix
+    X, y = load_training_matrix(StubCollection(documents, count_offset=-1000), batch_size=64)
+    assert np.array_equal(X, X_lists.astype(np.float32)) and np.array_equal(y, y_lists)
+    X, y = load_training_matrix(collection, limit=10)
+    assert np.array_equal(X, X_lists[:10].astype(np.float32)) and np.array_equal(y, y_lists[:10])
+    assert len(load_training_matrix(StubCollection([]))[0]) == 0
+
+    # Malformed documents and rows fail loudly
+    for bad in [StubCollection([{'_id': 0, 'features': [1, 2]}]), ChunkedMatrixBuilder(4)]:
+        try:
+            load_training_matrix(bad) if isinstance(bad, StubCollection) else bad.append([[1.0, 2.0]])
+            assert False, "malformed input accepted"
+        except ValueError:
+            pass
+
+    logger.info("Streaming loader matches the list-based loader ✓")
+
+class ReplayRng:
+    """
+    Generator stand-in that records its standard normal and beta draws, so
+    the per-row seeding loops can be replayed on the same random values
+    """
+
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.draws = []
+
+    def normal(self, loc, scale, size=None):
+        z = self.rng.standard_normal(size if size is not None else np.shape(loc))
+        self.draws.append(z)
+        return loc + scale * z
+
+    def beta(self, a, b, size=None):
+        draws = self.rng.beta(a, b, size)
+        self.draws.append(draws)
+        return draws
+
+def test_bulk_seeding():
+    """Vectorized seed rows and insert_many documents match the old per-row insert_one loops"""
+    logger.info("Testing Bulk Seeding...")
+
+    # training_data.py before the seeding module, with np.random.normal
+    # replaced by the recorded draws of the vectorized run
+    rng = ReplayRng(0)
+    X, labels = generate_profile_variations(NICHE_PROFILES, 20, rng)
+    z = rng.draws
+    expected = []
+    for n, (label, base) in enumerate(NICHE_PROFILES):
+        for j in range(20):
+            i = n * 20 + j
+            normal = iter([base[0] + 0.5 * z[0][i], base[1] + 0.5 * z[1][i], base[2] + base[2] * 0.3 * z[2][i],
+                           base[3] + 5 * z[3][i], base[4] + 0.1 * z[4][i], base[5] + 0.1 * z[5][i]])
+            variation = [
+                int(np.clip(next(normal), 1, 6)),     # education
+                int(np.clip(next(normal), 1, 6)),     # audience
+                int(np.clip(next(normal), 0, 50000)),  # investimento
+                int(np.clip(next(normal), 5, 60)),      # tempo
+                float(np.clip(next(normal), 0, 1)),   # criatividade
+                float(np.clip(next(normal), 0, 1))    # tech
+            ]
+            expected.append({"features": variation, "label": label})
+
+    # seed_training_data.py before the seeding module
+    niches = ["Padaria", "Podcast", "Brechó"]
+    rng = ReplayRng(1)
+    X_generic, generic_labels = generate_generic_features(niches, 30, rng)
+    z = rng.draws
+    expected_generic = []
+    for n, niche in enumerate(niches):
+        for j in range(30):
+            i = n * 30 + j
+            features = [
+                int(np.clip(3 + 1 * z[0][i], 1, 6)),
+                int(np.clip(3 + 1 * z[1][i], 1, 6)),
+                int(np.clip(10000 + 5000 * z[2][i], 0, 50000)),
+                int(np.clip(30 + 10 * z[3][i], 5, 60)),
+                float(np.clip(z[4][i], 0, 1)),
+                float(np.clip(z[5][i], 0, 1))
+            ]
+            expected_generic.append({"features": features, "label": niche})
+
+    for (X, labels, rows) in [(X, labels, expected), (X_generic, generic_labels, expected_generic)]:
+        collection = StubCollection()
+        assert insert_training_rows(collection, X, labels, batch_size=64) == len(rows)
+        assert collection.documents == rows
+        for document, row in zip(collection.documents, rows):
+            assert list(map(type, document['features'])) == list(map(type, row['features']))
+
+    logger.info("Bulk seeding matches the per-row seeding loops ✓")
+
+def reference_report_features(report):
+    """
+    The per-document extractor extract_features_batch replaced, as a row in
+    FEATURE_NAMES order
+    """
+    title = report.get('title', '')
+    search_query = report.get('searchQuery', '')
+    description = report.get('report', {}).get('description', '')
+    full_text = f"{title} {search_query} {description}".lower()
+    report_data = report.get('report', {})
+
+    def count(field):
+        value = report_data.get(field, [])
+        return len(value) if isinstance(value, list) else 0
+
+    target_audience = report_data.get('targetAudience', [])
+    features = {
+        'title_length': len(str(title)),
+        'query_length': len(str(search_query)),
+        'description_length': len(str(description)),
+        'business_keyword_density': sum(1 for kw in ['empresa', 'negócio', 'mercado', 'cliente', 'produto', 'serviço'] if kw in full_text),
+        'tech_keyword_density': sum(1 for kw in ['tecnologia', 'digital', 'software', 'app', 'web'] if kw in full_text),
+        'finance_keyword_density': sum(1 for kw in ['financeiro', 'investimento', 'lucro', 'custo'] if kw in full_text),
+        'opportunities_count': count('opportunities'),
+        'challenges_count': count('challenges'),
+        'recommendations_count': count('recommendations'),
+        'customer_segments_count': count('customerSegments'),
+        'key_players_count': count('keyPlayers'),
+        'target_audience_size': len(target_audience) if isinstance(target_audience, list) else 0,
+        'target_audience_diversity': len(set(str(ta).lower() for ta in target_audience)) if isinstance(target_audience, list) else 0,
+        'strengths_count': count('strengths'),
+        'weaknesses_count': count('weaknesses'),
+        'data_quality_score': 1 if report_data.get('dataQuality', 'no_evidence') == 'verified' else 0,
+        'sources_count': count('sources')
+    }
+    return [float(features.get(name, 0)) for name in FEATURE_NAMES]
+
+def test_report_feature_parity():
+    """Batch report extraction matches the per-document extractor on unusual documents"""
+    logger.info("Testing Report Feature Parity...")
+
+    rng = np.random.default_rng(0)
+    texts = ['', 'Empresa de SOFTWARE', 'app web digital', 'Lucro e custo do negócio', 'ÁPP Mercado',
+             'serviço ao cliente, produto', 'investimento financeiro', '🚀 tecnologia', None, 42, 3.5, ['app']]
+    lists = [[], ['a'], ['A', 'a', ' a'], [None, 1, 1.0, {'x': 1}], 'not a list', None, 7, ('a', 'b'), {'a': 1}]
+    qualities = ['verified', 'Verified', 'no_evidence', None, 1, ['verified']]
+    list_fields = ['opportunities', 'challenges', 'recommendations', 'customerSegments',
+                   'keyPlayers', 'strengths', 'weaknesses', 'sources', 'targetAudience']
+
+    def maybe(document, key, pool):
+        # Each field is missing about a quarter of the time
+        if rng.random() < 0.75:
+            document[key] = pool[rng.integers(len(pool))]
+
+    reports = []
+    for _ in range(3000):
+        body = {}
+        maybe(body, 'description', texts)
+        maybe(body, 'dataQuality', qualities)
+        for field in list_fields:
+            maybe(body, field, lists)
+        report = {'report': body} if rng.random() < 0.9 else {}
+        maybe(report, 'title', texts)
+        maybe(report, 'searchQuery', texts)
+        reports.append(report)
+
+    expected = np.array([reference_report_features(report) for report in reports], dtype=np.float32)
+    assert np.array_equal(extract_features_batch(reports), expected)
+
+    # Writes into a preallocated block, in chunks
+    out = np.full((len(reports), len(FEATURE_NAMES)), -1, dtype=np.float32)
+    for start in range(0, len(reports), 700):
+        extract_features_batch(reports[start:start + 700], out=out[start:start + 700])
+    assert np.array_equal(out, expected)
+
+    logger.info("Batch extraction matches the per-document extractor ✓")
+
+def test_feature_store_refresh():
+    """Incremental refresh tracks added, updated and deleted reports like a full extraction"""
+    logger.info("Testing Feature Store Refresh...")
+
+    start = datetime(2026, 1, 1)
+    titles = ['Empresa de software', 'App digital', 'Lucro e custo', 'Mercado local', '']
+    reports = []
+    for i in range(50):
+        report = {
+            '_id': ObjectId(),
+            'title': titles[i % len(titles)],
+            'searchQuery': f"nicho {i}",
+            'report': {'opportunities': ['x'] * (i % 4), 'targetAudience': ['A', 'a', 'b'][:i % 3]},
+            'createdAt': start + timedelta(minutes=i)
+        }
+        if i % 5 == 0:
+            report['updatedAt'] = report['createdAt'] + timedelta(seconds=30)
+        reports.append(report)
+    collection = StubCollection(reports)
+
+    def assert_matches_full_extraction(store):
+        rows = {key: i for i, key in enumerate(store.ids)}
+        order = [rows[str(report['_id']).encode()] for report in collection.documents]
+        assert len(store) == len(collection.documents)
+        assert np.array_equal(store.features[order], extract_features_batch(collection.documents))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        stats = ReportFeatureStore(workdir).refresh(collection, n_workers=1, batch_size=16)
+        assert stats == {'read': 50, 'added': 50, 'updated': 0, 'removed': 0, 'rows': 50}
+
+        # One added, one updated, one deleted
+        later = start + timedelta(days=2)
+        collection.documents.append({'_id': ObjectId(), 'title': 'Consultoria financeira', 'createdAt': later})
+        collection.documents[3] = {**collection.documents[3], 'title': 'Tecnologia web', 'updatedAt': later}
+        del collection.documents[7]
+
+        # Only reports within the overlap of the high-water mark are read:
+        # the two newest, the added one and the updated one
+        store = ReportFeatureStore(workdir)
+        stats = store.refresh(collection, n_workers=1, batch_size=16)
+        assert stats == {'read': 4, 'added': 1, 'updated': 1, 'removed': 1, 'rows': 50}
+        assert_matches_full_extraction(store)
+
+        # Unchanged collection: the overlap is re-read, nothing changes
+        store = ReportFeatureStore(workdir)
+        stats = store.refresh(collection, n_workers=1, batch_size=16)
+        assert stats == {'read': 2, 'added': 0, 'updated': 0, 'removed': 0, 'rows': 50}
+        assert_matches_full_extraction(store)
+
+    logger.info("Incremental refresh matches full extraction ✓")
+
 def main():
     """Main test function"""
     logger.info("Starting Enhanced KNN Testing Suite")
@@ -289,6 +1389,162 @@ def main():
     consistency = np.array_equal(original_preds, loaded_preds)
     logger.info(f"Model persistence consistency: {'✓' if consistency else '✗'}")
 
+    # Test 7: Fused Inference
+    logger.info("\nTest 7: Fused Inference")
+    logger.info("-" * 25)
+
+    test_fused_inference()
+
+    # Test 8: Neighbor Graph Search
+    logger.info("\nTest 8: Neighbor Graph Search")
+    logger.info("-" * 31)
+
+    test_neighbor_graph_search()
+
+    # Test 9: Parallel Feature Extraction
+    logger.info("\nTest 9: Parallel Feature Extraction")
+    logger.info("-" * 37)
+
+    test_parallel_feature_extraction()
+
+    # Test 10: Feature Store
+    logger.info("\nTest 10: Feature Store")
+    logger.info("-" * 24)
+
+    test_feature_store_upsert()
+
+    # Test 11: Categorical Encoding
+    logger.info("\nTest 11: Categorical Encoding")
+    logger.info("-" * 31)
+
+    test_categorical_encoding()
+
+    # Test 12: Neighbor Index
+    logger.info("\nTest 12: Neighbor Index")
+    logger.info("-" * 25)
+
+    test_neighbor_index()
+
+    # Test 13: Memory-Mapped Model Loading
+    logger.info("\nTest 13: Memory-Mapped Model Loading")
+    logger.info("-" * 37)
+
+    test_mmap_model_loading()
+
+    # Test 14: Compact Model
+    logger.info("\nTest 14: Compact Model")
+    logger.info("-" * 22)
+
+    test_compact_model()
+
+    # Test 15: Shared-Index Ensemble
+    logger.info("\nTest 15: Shared-Index Ensemble")
+    logger.info("-" * 30)
+
+    test_shared_index_ensemble()
+
+    # Test 16: Prediction Cache
+    logger.info("\nTest 16: Prediction Cache")
+    logger.info("-" * 25)
+
+    test_prediction_cache()
+
+    # Test 17: Top-k Ranking
+    logger.info("\nTest 17: Top-k Ranking")
+    logger.info("-" * 22)
+
+    test_top_k_ranking()
+
+    # Test 18: Lazy Imports
+    logger.info("\nTest 18: Lazy Imports")
+    logger.info("-" * 21)
+
+    test_lazy_imports()
+
+    # Test 19: Runtime Model
+    logger.info("\nTest 19: Runtime Model")
+    logger.info("-" * 22)
+
+    test_runtime_model()
+
+    # Test 20: Fused Transform
+    logger.info("\nTest 20: Fused Transform")
+    logger.info("-" * 24)
+
+    test_fused_transform()
+
+    # Test 21: Multi-Metric Cross-Validation
+    logger.info("\nTest 21: Multi-Metric Cross-Validation")
+    logger.info("-" * 38)
+
+    test_multi_metric_cross_validation()
+
+    # Test 22: Planned Training Pipeline
+    logger.info("\nTest 22: Planned Training Pipeline")
+    logger.info("-" * 34)
+
+    test_planned_training_pipeline()
+
+    # Test 23: Artifact Reloading
+    logger.info("\nTest 23: Artifact Reloading")
+    logger.info("-" * 27)
+
+    test_artifact_reload_on_stamp_change()
+
+    # Test 24: Batch Endpoint
+    logger.info("\nTest 24: Batch Endpoint")
+    logger.info("-" * 23)
+
+    test_batch_endpoint()
+
+    # Test 25: Inference Pool Saturation
+    logger.info("\nTest 25: Inference Pool Saturation")
+    logger.info("-" * 34)
+
+    test_inference_pool_saturation()
+
+    # Test 26: Hot Swap and Rollback
+    logger.info("\nTest 26: Hot Swap and Rollback")
+    logger.info("-" * 30)
+
+    test_hot_swap_and_rollback()
+
+    # Test 27: Pruned Parameter Grid
+    logger.info("\nTest 27: Pruned Parameter Grid")
+    logger.info("-" * 30)
+
+    test_pruned_param_grid()
+
+    # Test 28: Search Strategies
+    logger.info("\nTest 28: Search Strategies")
+    logger.info("-" * 26)
+
+    test_search_strategies()
+
+    # Test 29: Streaming Training Loader
+    logger.info("\nTest 29: Streaming Training Loader")
+    logger.info("-" * 34)
+
+    test_streaming_training_loader()
+
+    # Test 30: Bulk Seeding
+    logger.info("\nTest 30: Bulk Seeding")
+    logger.info("-" * 21)
+
+    test_bulk_seeding()
+
+    # Test 31: Report Feature Parity
+    logger.info("\nTest 31: Report Feature Parity")
+    logger.info("-" * 30)
+
+    test_report_feature_parity()
+
+    # Test 32: Feature Store Refresh
+    logger.info("\nTest 32: Feature Store Refresh")
+    logger.info("-" * 30)
+
+    test_feature_store_refresh()
+
     # Generate comparison plots
     try:
         plot_comparison(benchmark_results, 'knn_comparison.png')
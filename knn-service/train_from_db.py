@@ -5,24 +5,25 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 import numpy as np
 import os
+from mongo_loader import load_training_matrix
 
-def train_model_from_db():
+def load_training_data(batch_size: int = 5000):
+    """Stream (X, y) from the training_data collection as float32 features"""
     client = MongoClient(os.getenv("MONGO_URI", "mongodb://compath-mongo:27017/"))
-    db = client["compath"]
-    collection = db["training_data"]
-
-    data = list(collection.find())
+    try:
+        collection = client["compath"]["training_data"]
+        X, y = load_training_matrix(collection, batch_size=batch_size)
+    finally:
+        client.close()
 
-    if not data:
+    if len(X) == 0:
         raise ValueError("Nenhum dado de treinamento encontrado no banco de dados.")
 
-    if not all("features" in d and "label" in d for d in data):
-        raise ValueError("Alguns documentos não possuem 'features' ou 'label'.")
+    print(f"Total de amostras carregadas do MongoDB: {len(X)}")
+    return X, y
 
-    print(f"Total de amostras carregadas do MongoDB: {len(data)}")
-
-    X = np.array([d["features"] for d in data])
-    y = np.array([d["label"] for d in data])
+def train_model_from_db():
+    X, y = load_training_data()
 
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)